@@ -0,0 +1,282 @@
+from flask import Blueprint, Response, request, abort, stream_with_context
+from werkzeug.exceptions import HTTPException
+from datamanager.sqlite_data_manager import DEFAULT_PAGE_SIZE
+from movie_data_api import get_movie_data
+from data_models import User, Movie
+import json
+
+# Fields a client can pick with ?fields=title,year, all of them by default
+USER_FIELDS = ('id', 'name')
+MOVIE_FIELDS = ('id', 'title', 'director', 'year', 'rating', 'poster', 'user_rating')
+CATALOG_FIELDS = ('id', 'title', 'director', 'year', 'rating', 'poster',
+                  'rating_count', 'average_rating')
+OMDB_FIELDS = ('title', 'director', 'year', 'rating', 'poster')
+JOB_FIELDS = ('id', 'kind', 'movie_id', 'title', 'batch', 'status', 'attempts', 'error')
+
+# Rows encoded per chunk of a streamed list
+STREAM_CHUNK_ROWS = 500
+
+# Query parameters which switch a collection from streaming to keyset pages
+PAGE_PARAMETERS = ('limit', 'after', 'before', 'sort')
+
+
+def encode(value):
+    """Encodes a value as compact JSON."""
+    return json.dumps(value, separators=(',', ':'))
+
+
+def select_fields(available):
+    """
+    Returns the fields requested with ?fields=, all available fields
+    without the parameter. Aborts with 400 on unknown fields.
+    :param available: Fields of the resource in their default order.
+    """
+    requested = request.args.get('fields')
+    if requested is None:
+        return available
+    fields = tuple(dict.fromkeys(field.strip() for field in requested.split(',')
+                                 if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if not fields:
+        abort(400, description=f"No fields requested. Available fields: {', '.join(available)}.")
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}. "
+                               f"Available fields: {', '.join(available)}.")
+    return fields
+
+
+def serialize(row, fields):
+    """Returns the selected fields of a column row or a dict as dict."""
+    if isinstance(row, dict):
+        return {field: row[field] for field in fields}
+    return {field: getattr(row, field) for field in fields}
+
+
+def stream_json(key, rows, fields):
+    """
+    Streams rows as a JSON object {key: [...]} in chunks of
+    STREAM_CHUNK_ROWS rows, large lists are never held in memory.
+    """
+    def chunks():
+        yield f'{{"{key}":['
+        separator, batch = '', []
+        for row in rows:
+            batch.append(encode(serialize(row, fields)))
+            if len(batch) == STREAM_CHUNK_ROWS:
+                yield separator + ','.join(batch)
+                separator, batch = ',', []
+        if batch:
+            yield separator + ','.join(batch)
+        yield ']}'
+
+    return Response(stream_with_context(chunks()), mimetype='application/json')
+
+
+def page_json(page, fields):
+    """Returns a keyset page of the data manager with its cursors as JSON dict."""
+    return {'movies': [serialize(row, fields) for row in page['movies']],
+            'next': page['next'], 'prev': page['prev']}
+
+
+def json_body():
+    """Returns the JSON object of the request body, aborts with 400 otherwise."""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, description='Request body must be a JSON object.')
+    return body
+
+
+def parse_number(value, name):
+    """Returns a JSON number as float or None, aborts with 400 on other types."""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        abort(400, description=f'{name} has to be a number.')
+    return float(value)
+
+
+def omdb_movie(data):
+    """Converts an OMDb result to the field names of the movie resources, 'N/A' becomes None."""
+    def value(key):
+        return None if data.get(key) in (None, 'N/A') else data[key]
+
+    year, rating = value('Year'), value('imdbRating')
+    try:
+        rating = float(rating) if rating is not None else None
+    except ValueError:
+        rating = None
+    return {'title': value('Title'), 'director': value('Director'),
+            'year': int(year) if year and year.isdigit() else year,
+            'rating': rating, 'poster': value('Poster')}
+
+
+def create_api(data_manager, on_movie_added=None):
+    """
+    Creates the blueprint of the versioned JSON API on top of a data
+    manager. Reads are serialized straight from column rows, no ORM
+    objects are loaded for them and no templates are rendered.
+    :param data_manager: DataManagerInterface implementation used by the routes.
+    :param on_movie_added: Optional callback taking the movie ID and the
+                           Movie after a movie was added, e.g. to queue
+                           its OMDb enrichment.
+    :return: Blueprint to register under /api/v1.
+    """
+    api = Blueprint('api_v1', __name__)
+
+    def http_error(error):
+        """Returns HTTP errors of the API as JSON instead of the HTML error page."""
+        return {'error': error.description}, error.code
+
+    # status codes with an HTML handler on the app need their own entry,
+    # code handlers take precedence over the HTTPException handler
+    for code in (400, 404, 409, 500):
+        api.register_error_handler(code, http_error)
+    api.register_error_handler(HTTPException, http_error)
+
+    @api.route('/users', methods=['GET'])
+    def list_users():
+        """Streams all users."""
+        fields = select_fields(USER_FIELDS)
+        rows, result = data_manager.stream_users()
+        if result != 200:
+            return rows, result
+        return stream_json('users', rows, fields)
+
+    @api.route('/users/search', methods=['GET'])
+    def search_users():
+        """Returns the users whose name starts with ?q= for the autocomplete."""
+        fields = select_fields(USER_FIELDS)
+        users, result = data_manager.search_users(request.args.get('q', ''),
+                                                  request.args.get('limit', 10, type=int))
+        if result != 200:
+            return users, result
+        return {'users': [serialize(row, fields) for row in users]}
+
+    @api.route('/users', methods=['POST'])
+    def create_user():
+        """Creates a user from {"name": ...}."""
+        name = json_body().get('name')
+        if not isinstance(name, str) or not name.strip():
+            abort(400, description='Username is required.')
+        user = User(name=name.strip())
+        added, result = data_manager.add_user(user)
+        if result != 200:
+            return added, result
+        return {'id': added['user_id'], 'name': user.name}, 201
+
+    @api.route('/users/<int:user_id>', methods=['DELETE'])
+    def delete_user(user_id):
+        """Deletes a user and the user's collection."""
+        return data_manager.delete_user(user_id)
+
+    @api.route('/users/<int:user_id>/movies', methods=['GET'])
+    def list_user_movies(user_id):
+        """
+        Streams the whole collection of a user, or returns one keyset page
+        if one of the parameters limit, after, before or sort is given.
+        """
+        fields = select_fields(MOVIE_FIELDS)
+        if any(parameter in request.args for parameter in PAGE_PARAMETERS):
+            page, result = data_manager.get_user_movies_page(
+                user_id, request.args.get('sort', 'title'),
+                after=request.args.get('after'), before=request.args.get('before'),
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+            if result != 200:
+                return page, result
+            return page_json(page, fields)
+        rows, result = data_manager.stream_user_movies(user_id)
+        if result != 200:
+            return rows, result
+        return stream_json('movies', rows, fields)
+
+    @api.route('/users/<int:user_id>/movies', methods=['POST'])
+    def add_user_movie(user_id):
+        """Adds a movie from {"title", "director", "year", "rating", "poster"} to a collection."""
+        body = json_body()
+        title, director, year = body.get('title'), body.get('director'), body.get('year')
+        if (not isinstance(title, str) or not title.strip()
+                or not isinstance(director, str) or not director.strip()
+                or isinstance(year, bool) or not isinstance(year, int)):
+            abort(400, description='Movie needs a title, a director and a year.')
+        poster = body.get('poster')
+        if poster is not None and not isinstance(poster, str):
+            abort(400, description='Poster has to be a URL.')
+        movie = Movie(title=title.strip(), director=director.strip(), year=year,
+                      rating=parse_number(body.get('rating'), 'Rating'), poster=poster)
+        added, result = data_manager.add_movie(movie, user_id)
+        if result != 200:
+            return added, result
+        if on_movie_added is not None:
+            on_movie_added(added['movie_id'], movie)
+        return {'message': 'Movie added', 'movie_id': added['movie_id']}, 201
+
+    @api.route('/users/<int:user_id>/movies/<int:movie_id>', methods=['PATCH'])
+    def rate_user_movie(user_id, movie_id):
+        """Sets the user's personal rating of a movie from {"rating": ...}."""
+        rating = parse_number(json_body().get('rating'), 'Rating')
+        if rating is None or not 0.0 < rating < 10.0:
+            abort(400, description='Rating must be between 0 and 10.')
+        error, result = data_manager.update_movie(user_id, movie_id, rating)
+        if result != 200:
+            return error, result
+        return {'movie_id': movie_id, 'user_rating': rating}
+
+    @api.route('/users/<int:user_id>/movies/<int:movie_id>', methods=['DELETE'])
+    def delete_user_movie(user_id, movie_id):
+        """Removes a movie from a user's collection."""
+        return data_manager.delete_movie(user_id, movie_id)
+
+    @api.route('/movies', methods=['GET'])
+    def list_movies():
+        """Returns one keyset page of the catalog with the average user ratings."""
+        fields = select_fields(CATALOG_FIELDS)
+        page, result = data_manager.get_all_movies_page(
+            request.args.get('sort', 'title'),
+            after=request.args.get('after'), before=request.args.get('before'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+        if result != 200:
+            return page, result
+        return page_json(page, fields)
+
+    @api.route('/movies/search', methods=['GET'])
+    def search_movies():
+        """Searches the local catalog by title and director prefixes with ?q=."""
+        fields = select_fields(CATALOG_FIELDS)
+        movies, result = data_manager.search_movies(request.args.get('q', ''),
+                                                    request.args.get('limit', 20, type=int))
+        if result != 200:
+            return movies, result
+        return {'movies': [serialize(row, fields) for row in movies]}
+
+    @api.route('/movies/<int:movie_id>/ratings', methods=['GET'])
+    def movie_ratings(movie_id):
+        """Returns the count, mean and histogram of a movie's user ratings."""
+        return data_manager.get_movie_rating(movie_id)
+
+    @api.route('/omdb', methods=['GET'])
+    def search_omdb():
+        """Looks up a movie by ?title= in OMDb, answers are cached."""
+        fields = select_fields(OMDB_FIELDS)
+        title = request.args.get('title', '').strip()
+        if not title:
+            abort(400, description="Parameter 'title' is required.")
+        data = get_movie_data(title)
+        if 'error' in data:
+            return data, 404 if data['error'] == 'Movie not found!' else 502
+        return serialize(omdb_movie(data), fields)
+
+    @api.route('/jobs/<int:job_id>', methods=['GET'])
+    def job_status(job_id):
+        """Returns the status of a background job."""
+        fields = select_fields(JOB_FIELDS)
+        job, result = data_manager.get_job(job_id)
+        if result != 200:
+            return job, result
+        return serialize(job, fields)
+
+    @api.route('/jobs/batches/<batch>', methods=['GET'])
+    def batch_progress(batch):
+        """Returns the number of jobs of a batch per status."""
+        return data_manager.get_job_progress(batch)
+
+    return api
@@ -1,50 +1,353 @@
-from flask import Flask, request, render_template, redirect, url_for, abort
-from datamanager.sqlite_data_manager import SQLiteDataManager
+from flask import (Flask, Response, request, render_template, redirect, url_for, abort,
+                   stream_with_context, make_response, send_file)
+from datamanager.sqlite_data_manager import SQLiteDataManager, DEFAULT_PAGE_SIZE
+from datamanager.cached_data_manager import CachedDataManager, MemoryCacheBackend, RedisCacheBackend
 from db_validation import validate_database
-from movie_data_api import get_movie_data
-from data_models import User, Movie
+from api import create_api
+from jobs import JobWorker, run_worker_processes
+from movie_data_api import get_movie_data, get_cached_movie_data, get_cache, get_client
+from instrumentation import init_instrumentation, instrument_session, instrument_fragment_cache
+from omdb_cache import normalize_title
+from poster_cache import PosterCache, is_poster_url, url_digest
+from render_cache import FragmentCache, precompile_templates, template_digest
+from data_models import db, User, Movie, DataVersion, Job
+from datetime import datetime, timedelta, timezone
+import hashlib
+import click
+import json
+import zlib
+import csv
+import io
 import os
 
 app = Flask(__name__)
 
 # Database configuration
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'data', 'movies.db')
+DB_PATH = os.getenv('MOVIWEB_DB_PATH', os.path.join(BASE_DIR, 'data', 'movies.db'))
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + DB_PATH
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_PROFILE'] = os.getenv('MOVIWEB_SQLITE_PROFILE', 'wal')
+# MOVIWEB_GROUP_COMMIT=1 commits concurrent writes together every MOVIWEB_GROUP_COMMIT_MS
+app.config['SQLITE_GROUP_COMMIT'] = bool(os.getenv('MOVIWEB_GROUP_COMMIT'))
+app.config['SQLITE_GROUP_COMMIT_DELAY'] = float(os.getenv('MOVIWEB_GROUP_COMMIT_MS', 2)) / 1000
 
-# Initialize data manager
+# Initialize data manager, MOVIWEB_CACHE=memory or a redis:// URL enables the read cache,
+# collections are validated against their version counter, other entries live MOVIWEB_CACHE_TTL seconds
 data_manager = SQLiteDataManager(app)
+CACHE = os.getenv('MOVIWEB_CACHE', '')
+if CACHE == 'memory':
+    data_manager = CachedDataManager(data_manager, MemoryCacheBackend(
+        ttl=float(os.getenv('MOVIWEB_CACHE_TTL', 30))))
+elif CACHE.startswith(('redis://', 'rediss://', 'unix://')):
+    data_manager = CachedDataManager(data_manager, RedisCacheBackend.from_url(CACHE))
 
 # Validate or create database
 validate_database(app)
 
+# Background jobs, MOVIWEB_JOBS=thread runs workers in this process, MOVIWEB_JOBS=external
+# expects workers started with 'flask jobs-worker', without it OMDb is called in the request
+JOBS = os.getenv('MOVIWEB_JOBS', '')
+job_worker = JobWorker.from_env(app, data_manager) if JOBS == 'thread' else None
+
+
+@app.before_request
+def start_job_worker():
+    """
+    Starts the in-process job workers with the first request, so only
+    serving processes run them and CLI commands or the reloader never do.
+    """
+    if job_worker is not None:
+        job_worker.start()
+
+
+def enqueue_enrichment(movie_id, movie):
+    """Queues an OMDb enrichment job for a movie saved without IMDb rating or poster."""
+    if JOBS and (movie.rating is None or not is_poster_url(movie.poster)):
+        data_manager.enqueue_job('enrich', movie_id=movie_id)
+
+
+# Versioned JSON API for non-browser clients
+API_PREFIX = '/api/v1'
+app.register_blueprint(create_api(data_manager, on_movie_added=enqueue_enrichment),
+                       url_prefix=API_PREFIX)
+
+# Rendered movie cards of the collection pages, keyed by all values a card shows
+fragment_cache = FragmentCache.from_env()
+
+# Request instrumentation, MOVIWEB_METRICS=1 enables it and the /metrics endpoint,
+# which answers local clients only unless MOVIWEB_METRICS_TOKEN sets a bearer token
+if os.getenv('MOVIWEB_METRICS'):
+    with app.app_context():
+        metrics = init_instrumentation(
+            app, db.engine,
+            slow_query_seconds=float(os.getenv('MOVIWEB_SLOW_QUERY_MS', 100)) / 1000,
+            token=os.getenv('MOVIWEB_METRICS_TOKEN'))
+    instrument_session(metrics, get_client().session)
+    instrument_fragment_cache(metrics, fragment_cache)
+    metrics.add_gauges('omdb_cache', 'OMDb response cache statistics.',
+                       lambda: get_cache().stats())
+    if isinstance(data_manager, CachedDataManager):
+        metrics.add_gauges('data_cache', 'Read-through data cache statistics.',
+                           data_manager.stats)
+    metrics.add_gauges('fragment_cache', 'Rendered movie card cache statistics.',
+                       fragment_cache.stats)
+
+# Poster thumbnails are cached on disk and served by the poster route,
+# MOVIWEB_POSTER_HOSTS=host,... limits the hosts posters are downloaded from
+POSTER_HOSTS = os.getenv('MOVIWEB_POSTER_HOSTS', '')
+poster_cache = PosterCache(os.getenv('MOVIWEB_POSTER_DIR',
+                                     os.path.join(BASE_DIR, 'data', 'posters')),
+                           allowed_hosts=([host.strip() for host in POSTER_HOSTS.split(',')]
+                                          if POSTER_HOSTS else None))
+POSTER_MAX_AGE = 365 * 24 * 3600
+POSTER_PLACEHOLDER = os.path.join(app.static_folder, 'poster_placeholder.svg')
+
+# Templates are compiled at startup, their bytecode is shared with further worker
+# processes through MOVIWEB_TEMPLATE_CACHE_DIR, an empty value keeps it in memory only
+precompile_templates(app, os.getenv('MOVIWEB_TEMPLATE_CACHE_DIR',
+                                    os.path.join(BASE_DIR, 'data', 'template_cache')))
+# Part of every page ETag, MOVIWEB_BUILD can add a release identifier
+BUILD_VERSION = f"{os.getenv('MOVIWEB_BUILD', '')}:{template_digest(app)}"
+
+# Streaming export formats: mimetype and file extension
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+EXPORT_FIELDS = ('user', 'title', 'director', 'year', 'rating', 'poster', 'user_rating')
+EXPORT_CHUNK_ROWS = 500
+
+
+def parse_rating(rating):
+    """
+    Parses a rating form or file value, 'N/A' and empty values become None.
+    :raises TypeError: If the value is no string or number, booleans included.
+    :raises ValueError: If a string is no number.
+    """
+    if rating is None or isinstance(rating, float):
+        return rating
+    if isinstance(rating, bool) or not isinstance(rating, (str, int)):
+        raise TypeError(f'Rating must be a number, not {type(rating).__name__}.')
+    if isinstance(rating, int):
+        return float(rating)
+    if rating.strip().lower() in ("", "n/a"):
+        return None
+    return float(rating.replace(",", "."))
+
+
+def parse_movie_import(upload):
+    """
+    Parses an uploaded CSV, JSON or NDJSON file into movie dicts for
+    bulk_add_movies. CSV files need a header with the columns title,
+    director, year and optionally rating, poster and user_rating. JSON
+    files contain a list of objects with the same keys, NDJSON files one
+    object per line, so both export formats can be imported again.
+    :param upload: Uploaded file from request.files.
+    :return: List of movie dicts.
+    :raises ValueError: If the file can not be parsed.
+    """
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig')
+    filename = upload.filename.lower()
+    if filename.endswith('.ndjson') or upload.mimetype == 'application/x-ndjson':
+        entries = [json.loads(line) for line in stream if line.strip()]
+    elif filename.endswith('.json') or upload.mimetype == 'application/json':
+        entries = json.load(stream)
+        if isinstance(entries, dict):
+            entries = entries.get('movies')
+        if not isinstance(entries, list):
+            raise ValueError('JSON file must contain a list of movies.')
+    else:
+        entries = list(csv.DictReader(stream))
+
+    movies = []
+    for number, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f'Movie {number} is not an object.')
+        try:
+            movies.append({
+                'title': str(entry.get('title') or '').strip(),
+                'director': str(entry.get('director') or '').strip(),
+                'year': int(entry.get('year')),
+                'rating': parse_rating(entry.get('rating')),
+                'poster': entry.get('poster') or None,
+                'user_rating': parse_rating(entry.get('user_rating')),
+            })
+        except (ValueError, TypeError):
+            raise ValueError(f'Invalid rating or year format in movie {number}.')
+    return movies
+
+
+def serialize_export(rows, export_format):
+    """
+    Serializes export rows lazily as CSV or NDJSON.
+    :param rows: Iterator over export rows.
+    :param export_format: 'csv' or 'ndjson'.
+    :return: Generator of text chunks of EXPORT_CHUNK_ROWS rows each.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+    for count, row in enumerate(rows, start=1):
+        if export_format == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n')
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Compresses a stream of text chunks into a gzip stream."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(user_id, filename):
+    """
+    Builds a streaming download of the movies of one user or all users.
+    The format is chosen by ?format=csv|ndjson, ?gzip=1 compresses the file.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        abort(400, description=f"Unknown export format '{export_format}'.")
+    rows, result = data_manager.export_movies(user_id)
+    if result != 200:
+        abort(result, description=rows['error'])
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f'{filename}.{extension}'
+    chunks = serialize_export(rows, export_format)
+    if request.args.get('gzip', type=int):
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.template_global()
+def poster_url(movie):
+    """
+    Returns the local thumbnail URL of a movie's poster. The URL contains
+    a digest of the poster URL, so it changes whenever the poster does
+    and the thumbnail can be cached by browsers forever.
+    """
+    if not is_poster_url(movie.poster):
+        return None
+    return url_for('poster', movie_id=movie.id, v=url_digest(movie.poster)[:12])
+
+
+def page_validators(version_key):
+    """
+    Computes the strong ETag and Last-Modified time of a page from the
+    version counter of the view it renders, the requested URL and the
+    build version, so changed templates produce new ETags.
+    :param version_key: DataVersion key of the view.
+    :return: Tuple of ETag and Last-Modified datetime, (None, None) on errors.
+    """
+    version, result = data_manager.get_data_version(version_key)
+    if result != 200:
+        return None, None
+    tag = f"{BUILD_VERSION}:{version_key}:{version['version']}:{request.full_path}"
+    updated_at = version['updated_at']
+    if updated_at is not None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return hashlib.sha1(tag.encode('utf-8')).hexdigest(), updated_at
+
+
+def not_modified(etag, last_modified):
+    """
+    Returns a 304 response if the client's cached copy is still current,
+    checked before anything is loaded or rendered, otherwise None.
+    If-Modified-Since is only used when no If-None-Match header is sent.
+    """
+    if etag is None:
+        return None
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = (last_modified is not None and request.if_modified_since is not None
+                 and last_modified.replace(microsecond=0) <= request.if_modified_since)
+    if not fresh:
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def conditional_page(body, etag, last_modified):
+    """Adds the validators to a rendered page, browsers revalidate it on every use."""
+    response = make_response(body)
+    if etag is not None:
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+    return response
+
+
+def movie_cards(user_id, movies):
+    """
+    Returns the rendered cards of a collection page. Cards are rendered
+    once per user and movie row and served from the fragment cache until
+    the row changes, e.g. after a new rating or an OMDb refresh.
+    :param movies: Rows with the columns of USER_MOVIE_COLUMNS.
+    :return: List of card HTML as Markup.
+    """
+    card = app.jinja_env.get_template('movie_card.html')
+    return [fragment_cache.get_or_render((user_id, *movie),
+                                         lambda movie=movie: card.render(movie=movie,
+                                                                         user_id=user_id),
+                                         card.name)
+            for movie in movies]
+
 
 @app.route('/', methods=['GET', 'POST'])
 def home():
-    """Home page route."""
-    users, result = data_manager.get_all_users()
-    if result != 200:
-        abort(result, description=users['error'])
-
+    """
+    Home page route. Users are found with the autocomplete of the
+    username field instead of listing all of them.
+    """
     if request.method == 'POST':
-        username = request.form.get('username')
+        username = request.form.get('username', '').strip()
         if username:
             user, result = data_manager.get_user_by_name(username)
             if result != 200:
-                return render_template('home.html', users=users,
-                                       error=user['error'])
+                return render_template('home.html', error=user['error'], username=username)
             return redirect(url_for('user_movies', user_id=user.id))
-    return render_template('home.html', users=users)
+    return render_template('home.html')
 
 
 @app.route('/users/<int:user_id>')
 def user_movies(user_id):
     """Displays all movies associated with a specific user."""
-    movies, result = data_manager.get_user_movies(user_id)
+    etag, last_modified = page_validators(DataVersion.user(user_id))
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
+    order_by = request.args.get('sort', 'title')
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    page, result = data_manager.get_user_movies_page(user_id, order_by,
+                                                     after=request.args.get('after'),
+                                                     before=request.args.get('before'),
+                                                     limit=limit)
     if result != 200:
-        abort(result, description=movies['error'])
-    return render_template('user_movies.html', movies=movies, user_id=user_id)
+        abort(result, description=page['error'])
+    return conditional_page(
+        render_template('user_movies.html', cards=movie_cards(user_id, page['movies']),
+                        user_id=user_id,
+                        next_cursor=page['next'], prev_cursor=page['prev'],
+                        sort=order_by, limit=limit),
+        etag, last_modified)
 
 
 @app.route('/add_user', methods=['GET', 'POST'])
@@ -64,32 +367,40 @@ def add_user():
 
 @app.route('/users/<int:user_id>/update_movie/<int:movie_id>', methods=['GET', 'POST'])
 def update_movie(user_id, movie_id):
-    """Route to update the rating of a movie for a given user."""
+    """Route to update the personal rating of a movie for a given user."""
     movie, result = data_manager.get_movie(movie_id)
     if result != 200:
         abort(result, description=movie['error'])
+    user_rating, result = data_manager.get_user_rating(user_id, movie_id)
+    if result != 200:
+        abort(result, description=user_rating['error'])
+    ratings, result = data_manager.get_movie_rating(movie_id)
+    if result != 200:
+        abort(result, description=ratings['error'])
+
+    def edit_page(error=None):
+        return render_template('edit_movie.html', movie=movie, user_id=user_id,
+                               user_rating=user_rating, ratings=ratings, error=error)
 
     if request.method == 'POST':
         rating = request.form.get('rating')
         if not rating:
-            return render_template('edit_movie.html', movie=movie)
+            return edit_page()
         rating_str = rating.replace(',', '.')
 
         try:
             rating_float = float(rating_str)
             if not 0.0 < rating_float < 10.0:
-                return render_template('edit_movie.html', movie=movie,
-                                       error="Rating must be between 0 and 10")
+                return edit_page(error="Rating must be between 0 and 10")
         except (ValueError, TypeError):
-            return render_template('edit_movie.html', movie=movie,
-                                   error="Please enter a valid rating between 0 and 10.")
+            return edit_page(error="Please enter a valid rating between 0 and 10.")
 
-        error, result = data_manager.update_movie(movie, rating_float)
+        error, result = data_manager.update_movie(user_id, movie_id, rating_float)
         if result == 200:
             return redirect(url_for('user_movies', user_id=user_id))
-        return render_template('edit_movie.html', movie=movie, error=error)
+        return edit_page(error=error['error'])
 
-    return render_template('edit_movie.html', movie=movie)
+    return edit_page()
 
 
 @app.route('/users/<int:user_id>/add_movie', methods=['POST'])
@@ -104,22 +415,77 @@ def add_movie(user_id):
     if all([title, director, year]):
         try:
             year = int(year)
-
-            if rating is None or rating.strip().lower() == "n/a":
-                rating = None
-            else:
-                rating = float(rating.replace(",", "."))
+            rating = parse_rating(rating)
         except (ValueError, TypeError):
             abort(400, description="Invalid rating or year format.")
 
         new_movie = Movie(title=title, director=director, year=year, rating=rating, poster=poster)
-        error, result = data_manager.add_movie(new_movie, user_id)
+        added, result = data_manager.add_movie(new_movie, user_id)
         if result == 200:
+            enqueue_enrichment(added['movie_id'], new_movie)
+            poster_cache.prefetch(poster)
             return redirect(url_for('user_movies', user_id=user_id))
-        abort(result, description=error['error'])
+        abort(result, description=added['error'])
     return render_template('error.html', error="Missing movie data")
 
 
+@app.route('/posters/<int:movie_id>')
+def poster(movie_id):
+    """
+    Serves a movie's poster thumbnail from the disk cache. Uncached
+    posters are downloaded in the background, until then a placeholder
+    is served which browsers must not keep.
+    """
+    movie, result = data_manager.get_movie(movie_id)
+    if result != 200:
+        abort(result, description=movie['error'])
+    if not is_poster_url(movie.poster):
+        abort(404, description='Movie has no poster.')
+    path = poster_cache.cached_path(movie.poster)
+    if path is None:
+        poster_cache.prefetch(movie.poster)
+        response = send_file(POSTER_PLACEHOLDER, mimetype='image/svg+xml', max_age=0)
+        response.cache_control.no_store = True
+        return response
+    response = send_file(path, mimetype='image/jpeg', max_age=POSTER_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route('/users/<int:user_id>/import_movies', methods=['GET', 'POST'])
+def import_movies(user_id):
+    """Imports many movies from an uploaded CSV or JSON file into a user's collection."""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return render_template('import_movies.html', user_id=user_id,
+                                   error='Please choose a CSV or JSON file.')
+        try:
+            movies = parse_movie_import(upload)
+        except (ValueError, UnicodeDecodeError, csv.Error) as error:
+            abort(400, description=str(error))
+        summary, result = data_manager.bulk_add_movies(user_id, movies)
+        if result != 200:
+            abort(result, description=summary['error'])
+        return render_template('import_movies.html', user_id=user_id,
+                               message=f"{summary['added']} movies imported, "
+                                       f"{summary['skipped']} skipped.")
+    return render_template('import_movies.html', user_id=user_id)
+
+
+@app.route('/users/<int:user_id>/export')
+def export_user_movies(user_id):
+    """Streams a user's collection as a CSV or NDJSON download."""
+    return export_response(user_id, f'user_{user_id}_movies')
+
+
+@app.route('/export')
+def export_all_movies():
+    """Streams the collections of all users as a CSV or NDJSON download."""
+    return export_response(None, 'all_movies')
+
+
 @app.route('/users/<int:user_id>/delete_movie/<int:movie_id>', methods=['POST'])
 def delete_movie(user_id, movie_id):
     """Deletes a movie from a user's collection."""
@@ -138,25 +504,204 @@ def delete_user(user_id):
     return redirect(url_for('home'))
 
 
+def find_catalog_movie(title):
+    """
+    Looks a title up in the local catalog.
+    :return: Movie data in the OMDb format of get_movie_data or None.
+    """
+    matches, result = data_manager.search_movies(title, limit=5)
+    if result != 200:
+        return None
+    for movie in matches:
+        if normalize_title(movie.title) == normalize_title(title):
+            return {
+                'Title': movie.title,
+                'Director': movie.director,
+                'Year': movie.year,
+                'imdbRating': movie.rating if movie.rating is not None else 'N/A',
+                'Poster': movie.poster
+            }
+    return None
+
+
+@app.route('/search')
+def search_movies():
+    """Searches the local movie catalog by title and director prefixes."""
+    user_id = request.args.get('user_id', type=int)
+    search = request.args.get('q', '').strip()
+    movies = []
+    if search:
+        movies, result = data_manager.search_movies(search)
+        if result != 200:
+            abort(result, description=movies['error'])
+    return render_template('search_movies.html', movies=movies, search=search,
+                           user_id=user_id)
+
+
 @app.route('/fetch_movie', methods=['GET', 'POST'])
 def fetch_movie():
-    """Fetches movie data from an external API (OMDb)."""
+    """
+    Fetches movie data for a title. Titles already in the local catalog
+    are answered by the full-text search, others by the OMDb API. With
+    background jobs enabled, uncached titles are looked up by a worker
+    and the page polls the job instead of waiting for OMDb.
+    """
     user_id = request.args.get('user_id', type=int)  # für GET
 
     if request.method == 'POST':
         user_id = request.form.get('user_id', type=int) or user_id
         movie_title = request.form.get('title')
         if movie_title:
-            movie_data = get_movie_data(movie_title)
+            movie_data = find_catalog_movie(movie_title)
+            if movie_data is None and JOBS:
+                movie_data = get_cached_movie_data(movie_title)
+                if movie_data is None:
+                    job, result = data_manager.enqueue_job('lookup', title=movie_title)
+                    if result != 200:
+                        abort(result, description=job['error'])
+                    return redirect(url_for('fetch_movie', user_id=user_id, job=job['job_id']))
+            if movie_data is None:
+                movie_data = get_movie_data(movie_title)
             if 'error' in movie_data:
                 return render_template('fetch_movie.html',
                                        error=movie_data['error'], user_id=user_id)
             return render_template('fetch_movie.html',
                                    movie=movie_data, user_id=user_id)
 
+    job_id = request.args.get('job', type=int)
+    if job_id:
+        job, result = data_manager.get_job(job_id)
+        if result != 200:
+            abort(result, description=job['error'])
+        if job.status in (Job.QUEUED, Job.RUNNING):
+            return render_template('fetch_movie.html', pending=job.title, user_id=user_id)
+        if job.status == Job.FAILED:
+            return render_template('fetch_movie.html', error=job.error, user_id=user_id)
+        movie_data = get_cached_movie_data(job.title) or get_movie_data(job.title)
+        if 'error' in movie_data:
+            return render_template('fetch_movie.html',
+                                   error=movie_data['error'], user_id=user_id)
+        return render_template('fetch_movie.html', movie=movie_data, user_id=user_id)
+
     return render_template('fetch_movie.html', user_id=user_id)
 
 
+def stats_response(key, rows, status):
+    """Returns statistics rows as JSON object under key, errors as JSON with their status."""
+    if status != 200:
+        return rows, status
+    return {key: [row._asdict() for row in rows]}
+
+
+@app.route('/api/stats/most-collected')
+def stats_most_collected():
+    """Returns the movies in the most collections as JSON."""
+    limit = request.args.get('limit', 10, type=int)
+    return stats_response('movies', *data_manager.get_most_collected_movies(limit))
+
+
+@app.route('/api/stats/top-rated')
+def stats_top_rated():
+    """Returns the movies with the best average user rating as JSON."""
+    limit = request.args.get('limit', 10, type=int)
+    min_ratings = request.args.get('min_ratings', 1, type=int)
+    return stats_response('movies', *data_manager.get_top_rated_movies(limit, min_ratings))
+
+
+@app.route('/api/stats/directors')
+def stats_directors():
+    """Returns the directors with the most movies as JSON."""
+    limit = request.args.get('limit', 10, type=int)
+    return stats_response('directors', *data_manager.get_top_directors(limit))
+
+
+@app.route('/api/stats/years')
+def stats_years():
+    """Returns the number of movies per release year as JSON."""
+    return stats_response('years', *data_manager.get_movies_per_year())
+
+
+@app.route('/api/stats/users')
+def stats_users():
+    """Returns the users with the largest collections as JSON."""
+    limit = request.args.get('limit', 10, type=int)
+    return stats_response('users', *data_manager.get_largest_collections(limit))
+
+
+@app.route('/api/stats/users/<int:user_id>')
+def stats_user(user_id):
+    """Returns the collection size of a user as JSON."""
+    size, result = data_manager.get_collection_size(user_id)
+    if result != 200:
+        return size, result
+    return {'user_id': user_id, 'movie_count': size}
+
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats():
+    """Recomputes the statistics summary tables and rating aggregates from scratch."""
+    result, status = data_manager.rebuild_summaries()
+    print(result['message'] if status == 200 else result['error'])
+
+
+@app.cli.command('jobs-worker')
+@click.option('--processes', default=1, help='Number of worker processes.')
+@click.option('--threads', default=None, type=int,
+              help='Worker threads per process, defaults to MOVIWEB_JOB_THREADS.')
+@click.option('--until-empty', is_flag=True, help='Exit as soon as no job is due.')
+def jobs_worker(processes, threads, until_empty):
+    """Processes background jobs, e.g. as a service next to the web server."""
+    threads = threads or int(os.getenv('MOVIWEB_JOB_THREADS', 2))
+    if processes > 1:
+        processed = run_worker_processes(processes, threads, until_empty)
+    else:
+        worker = JobWorker.from_env(app, data_manager)
+        worker.threads = threads
+        processed = worker.run_threads(until_empty)
+    print(f'{processed} jobs processed')
+
+
+@app.cli.command('refresh-movies')
+@click.option('--days', default=30, help='Refresh movies not refreshed for this many days.')
+@click.option('--batch', default=None, help='Name of the batch, defaults to the current time.')
+def refresh_movies(days, batch):
+    """Queues OMDb refresh jobs for stale movies, run it e.g. from cron."""
+    batch = batch or datetime.now(timezone.utc).strftime('refresh-%Y%m%d%H%M%S')
+    result, status = data_manager.enqueue_refresh(batch, timedelta(days=days))
+    if status != 200:
+        print(result['error'])
+        return
+    print(f"{result['queued']} movies queued in batch '{batch}'")
+
+
+@app.cli.command('jobs-status')
+@click.argument('batch')
+def jobs_status(batch):
+    """Shows the progress of a batch of background jobs."""
+    progress, status = data_manager.get_job_progress(batch)
+    if status != 200:
+        print(progress['error'])
+        return
+    finished = progress[Job.DONE] + progress[Job.FAILED]
+    print(f"{finished}/{progress['total']} finished: " + ', '.join(
+        f'{progress[key]} {key}' for key in (Job.QUEUED, Job.RUNNING, Job.DONE, Job.FAILED)))
+
+
+@app.cli.command('jobs-purge')
+@click.option('--days', default=7, help='Delete jobs finished more than this many days ago.')
+def jobs_purge(days):
+    """Deletes finished background jobs."""
+    result, status = data_manager.delete_finished_jobs(timedelta(days=days))
+    print(result['message'] if status == 200 else result['error'])
+
+
+@app.cli.command('vacuum-orphans')
+def vacuum_orphans():
+    """Deletes movies no user has in the collection, run it e.g. from cron."""
+    result, status = data_manager.delete_orphan_movies()
+    print(result['message'] if status == 200 else result['error'])
+
+
 @app.errorhandler(400)
 def bad_request(error):
     """Handles 400 Bad Request errors."""
@@ -165,7 +710,12 @@ def bad_request(error):
 
 @app.errorhandler(404)
 def not_found(error):
-    """Handles 404 Not Found errors."""
+    """
+    Handles 404 Not Found errors. Unknown URLs below the API prefix match
+    no blueprint route, so the API's JSON handler never sees them.
+    """
+    if request.path == API_PREFIX or request.path.startswith(API_PREFIX + '/'):
+        return {'error': error.description}, 404
     return render_template('error.html', error=error)
 
 
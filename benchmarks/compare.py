@@ -0,0 +1,60 @@
+"""
+Compares two JSON reports of benchmarks.run, e.g. of two commits.
+Exits with status 1 if a scenario's p50 or p95 got slower than the threshold.
+Usage: python -m benchmarks.compare baseline.json current.json [--threshold 0.1]
+"""
+from argparse import ArgumentParser
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+CHECKED_METRICS = ('p50_ms', 'p95_ms')
+
+
+def load_report(path):
+    """Loads a benchmark report from a JSON file."""
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare(baseline, current, threshold):
+    """
+    Prints the relative change of every scenario found in both reports.
+    :return: List of (scenario, metric, change) entries slower than the threshold.
+    """
+    regressions = []
+    print(f"{'scenario':<26}" + ''.join(f'{metric:>24}' for metric in METRICS))
+    for scenario, result in current['results'].items():
+        base = baseline['results'].get(scenario)
+        if base is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            change = (result[metric] - base[metric]) / base[metric] if base[metric] else 0.0
+            marker = ''
+            if metric in CHECKED_METRICS and change > threshold:
+                regressions.append((scenario, metric, change))
+                marker = ' !'
+            cells.append(f'{base[metric]:8.2f} -> {result[metric]:8.2f} {change:+6.0%}{marker:2}')
+        print(f'{scenario:<26}' + ''.join(f'{cell:>24}' for cell in cells))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='Compare two benchmark reports.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed relative slowdown, 0.1 means 10 percent')
+    args = parser.parse_args()
+
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    print(f"baseline {baseline['meta'].get('commit')}  current {current['meta'].get('commit')}")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regressions above {args.threshold:.0%}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
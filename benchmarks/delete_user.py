@@ -0,0 +1,71 @@
+"""
+Benchmark of SQLiteDataManager.delete_user on large synthetic users.
+
+Every run seeds a user with N movies, half of them shared with a second
+user, and reports the time and the number of SQL statements of the delete.
+Usage: python -m benchmarks.delete_user [--sizes 100 1000 5000]
+"""
+from datamanager.sqlite_data_manager import SQLiteDataManager
+from data_models import db, User, Movie
+from argparse import ArgumentParser
+from sqlalchemy import event
+from flask import Flask
+import tempfile
+import json
+import time
+import os
+
+
+def main():
+    parser = ArgumentParser(description='Measure delete_user on large collections.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='movies per deleted user')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp_dir, 'movies.db')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        data_manager = SQLiteDataManager(app)
+        with app.app_context():
+            db.create_all()
+            statements = [0]
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *_args: statements.__setitem__(0, statements[0] + 1))
+
+            for size in args.sizes:
+                data_manager.add_user(User(name=f'deleted {size}'))
+                data_manager.add_user(User(name=f'kept {size}'))
+                deleted_id, _ = data_manager.get_user_by_name(f'deleted {size}')
+                kept_id, _ = data_manager.get_user_by_name(f'kept {size}')
+                deleted_id, kept_id = deleted_id.id, kept_id.id
+                movies = [{'title': f'Movie {size}-{number}', 'director': 'Director',
+                           'year': 2000, 'rating': 5.0} for number in range(size)]
+                data_manager.bulk_add_movies(deleted_id, movies)
+                data_manager.bulk_add_movies(kept_id, movies[::2])
+                db.session.expire_all()
+
+                statements[0] = 0
+                start = time.perf_counter()
+                result, status = data_manager.delete_user(deleted_id)
+                elapsed = time.perf_counter() - start
+                assert status == 200, result
+                remaining = db.session.query(Movie).filter(
+                    Movie.title.like(f'Movie {size}-%')).count()
+                assert remaining == len(movies[::2]), 'shared movies must be kept'
+
+                results.append({'movies': size, 'seconds': elapsed,
+                                'statements': statements[0]})
+                print(f'{size:>7} movies   {elapsed * 1000:8.1f} ms   '
+                      f'{statements[0]:>4} statements')
+            db.engine.dispose()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({'benchmark': 'delete_user', 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of concurrent writes with one commit per call against the
+group commit writer. Writer threads rate movies and add movies through
+the SQLiteDataManager at the same time, latencies and the total write
+throughput are reported for both modes.
+Usage: python -m benchmarks.group_commit [--threads 16] [--operations 100] [--profile wal|default]
+"""
+from benchmarks.seed import seed_database
+from benchmarks.stats import summarize
+from benchmarks.run import sample_links
+from argparse import ArgumentParser
+import threading
+import itertools
+import tempfile
+import random
+import json
+import time
+import os
+
+
+def run_writers(web, links, threads, operations, prefix):
+    """
+    Runs writer threads which alternate movie additions and ratings, operations writes each.
+    :param prefix: Prefix of the added titles, unique per run.
+    :return: Dict with the latency summary, throughput and status counts.
+    """
+    from data_models import Movie
+    titles = itertools.count()
+    durations, statuses, lock = [], {}, threading.Lock()
+
+    def writer(number):
+        generator = random.Random(number)
+        with web.app.app_context():
+            for step in range(operations):
+                start = time.perf_counter()
+                if step % 2:
+                    user_id, movie_id = links[generator.randrange(len(links))]
+                    _result, status = web.data_manager.update_movie(
+                        user_id, movie_id, round(generator.uniform(1, 9), 1))
+                else:
+                    _result, status = web.data_manager.add_movie(
+                        Movie(title=f'{prefix} {next(titles)}', director='Bench',
+                              year=2022, rating=7.0),
+                        links[(number * operations + step) % len(links)][0])
+                with lock:
+                    durations.append(time.perf_counter() - start)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+    workers = [threading.Thread(target=writer, args=(number,)) for number in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    result = summarize(durations)
+    result.update({'writes': len(durations), 'seconds': elapsed,
+                   'writes_per_s': len(durations) / elapsed, 'statuses': statuses})
+    return result
+
+
+def main():
+    parser = ArgumentParser(description='Compare per-call commits with group commit.')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent writer threads')
+    parser.add_argument('--operations', type=int, default=100, help='writes per thread')
+    parser.add_argument('--profile', choices=('wal', 'default'), default='wal',
+                        help='SQLite tuning profile, default commits with a full fsync')
+    parser.add_argument('--delay-ms', type=float, default=2.0, help='group commit delay')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'movies.db')
+        seed_database(path, users=1_000, movies=20_000, links=100_000)
+        os.environ.update({
+            'MOVIWEB_DB_PATH': path,
+            'MOVIWEB_SQLITE_PROFILE': args.profile,
+            'MOVIWEB_POSTER_DIR': os.path.join(tmp_dir, 'posters'),
+            'MOVIWEB_TEMPLATE_CACHE_DIR': '',
+            'OMDB_CACHE_PATH': '',
+            'API_KEY': 'benchmark',
+        })
+        import app as web
+        from datamanager.group_commit import GroupCommitWriter
+        links = sample_links(path, max(args.operations, 1000), 1_000, random.Random(42))
+
+        results = {'benchmark': 'group_commit', 'profile': args.profile,
+                   'threads': args.threads, 'operations': args.operations}
+        print(f"{args.threads} threads x {args.operations} writes, profile '{args.profile}'")
+        for mode in ('per_call', 'group_commit'):
+            web.data_manager.group_commit = (
+                GroupCommitWriter(web.app, web.data_manager.db, max_delay=args.delay_ms / 1000)
+                if mode == 'group_commit' else None)
+            result = run_writers(web, links, args.threads, args.operations, mode)
+            if web.data_manager.group_commit is not None:
+                result['batches'] = web.data_manager.group_commit.stats()
+            results[mode] = result
+            print(f"{mode:<13} p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                  f"{result['writes_per_s']:8.1f} writes/s  statuses {result['statuses']}")
+        print(f"operations per group commit: "
+              f"{results['group_commit']['batches']['operations_per_batch']:.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
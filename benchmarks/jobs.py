@@ -0,0 +1,70 @@
+"""
+Benchmark of the background job workers: refreshes every movie of a
+seeded database through the local OMDb stub with 1, 2 and 4 worker
+processes and reports the jobs processed per second. The time includes
+starting the worker processes.
+Usage: python -m benchmarks.jobs [--movies 200] [--latency 0.05] [--processes 1 2 4] [--threads 1]
+"""
+from benchmarks.seed import seed_database
+from benchmarks.omdb_stub import start_stub
+from argparse import ArgumentParser
+import tempfile
+import json
+import time
+import os
+
+
+def main():
+    parser = ArgumentParser(description='Measure job throughput per number of worker processes.')
+    parser.add_argument('--movies', type=int, default=200, help='refresh jobs per run')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency in seconds')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=1, help='worker threads per process')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'movies.db')
+        seed_database(path, users=10, movies=args.movies, links=10)
+        server = start_stub(latency=args.latency)
+        os.environ.update({
+            'MOVIWEB_DB_PATH': path,
+            'MOVIWEB_JOBS': 'external',
+            'MOVIWEB_POSTER_DIR': os.path.join(tmp_dir, 'posters'),
+            'MOVIWEB_TEMPLATE_CACHE_DIR': os.path.join(tmp_dir, 'template_cache'),
+            'OMDB_BASE_URL': server.base_url,
+            'OMDB_CACHE_PATH': os.path.join(tmp_dir, 'omdb_cache.db'),
+            'OMDB_RATE_LIMIT': '0',
+            'API_KEY': 'benchmark',
+        })
+        import app as web
+        from jobs import run_worker_processes
+
+        results = {'benchmark': 'jobs', 'movies': args.movies, 'latency_s': args.latency,
+                   'threads': args.threads, 'runs': []}
+        print(f"{args.movies} refresh jobs, {args.latency * 1000:.0f} ms stub latency, "
+              f"{args.threads} threads per process")
+        for processes in args.processes:
+            batch = f'benchmark-{processes}'
+            with web.app.app_context():
+                queued, status = web.data_manager.enqueue_refresh(batch)
+            assert status == 200 and queued['queued'] == args.movies, queued
+            start = time.perf_counter()
+            processed = run_worker_processes(processes, args.threads, until_empty=True)
+            elapsed = time.perf_counter() - start
+            with web.app.app_context():
+                progress, _ = web.data_manager.get_job_progress(batch)
+            assert progress['done'] == args.movies, progress
+            run = {'processes': processes, 'seconds': elapsed, 'processed': processed,
+                   'jobs_per_s': processed / elapsed}
+            results['runs'].append(run)
+            print(f"{processes} processes  {elapsed:7.2f} s  {run['jobs_per_s']:8.1f} jobs/s")
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
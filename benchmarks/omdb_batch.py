@@ -0,0 +1,62 @@
+"""
+Benchmark of sequential get_movie_data calls against the concurrent
+get_movies_data batch lookup, both talking to the local OMDb stub.
+Usage: python -m benchmarks.omdb_batch [--titles 50] [--latency 0.2] [--workers 8]
+"""
+from argparse import ArgumentParser
+from benchmarks.omdb_stub import start_stub
+import json
+import time
+import os
+
+
+def main():
+    parser = ArgumentParser(description='Compare sequential and batched OMDb lookups.')
+    parser.add_argument('--titles', type=int, default=50, help='number of titles to resolve')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub latency in seconds')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent lookups')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    server = start_stub(latency=args.latency)
+    os.environ['OMDB_BASE_URL'] = server.base_url
+    os.environ['OMDB_CACHE_PATH'] = ''
+    os.environ.setdefault('API_KEY', 'benchmark')
+    import movie_data_api
+
+    titles = [f'Benchmark Movie {number}' for number in range(args.titles)]
+    titles += [f'missing {number}' for number in range(args.titles // 10)]
+
+    start = time.perf_counter()
+    sequential = [movie_data_api.get_movie_data(title) for title in titles]
+    sequential_time = time.perf_counter() - start
+
+    movie_data_api.get_cache().clear()
+    requests_before = server.request_count
+    start = time.perf_counter()
+    batched = movie_data_api.get_movies_data(titles + titles[:10], max_workers=args.workers)
+    batched_time = time.perf_counter() - start
+
+    assert batched[:len(titles)] == sequential, 'batch results differ from sequential lookups'
+    results = {
+        'benchmark': 'omdb_batch',
+        'titles': len(titles),
+        'latency_s': args.latency,
+        'workers': args.workers,
+        'sequential_s': sequential_time,
+        'batched_s': batched_time,
+        'batched_requests': server.request_count - requests_before,
+        'speedup': sequential_time / batched_time,
+    }
+    print(f"{len(titles)} titles, {args.latency * 1000:.0f} ms stub latency")
+    print(f"sequential  {sequential_time:7.2f} s")
+    print(f"batched     {batched_time:7.2f} s  ({args.workers} workers, "
+          f"{results['batched_requests']} requests, {results['speedup']:.1f}x)")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the OMDb API used by the benchmarks.
+
+Answers every title with a synthetic movie, titles starting with
+'missing' with OMDb's 'Movie not found!' answer. The poster URLs of the
+synthetic movies point to the stub as well and return a tiny image. Point the app at it
+with OMDB_BASE_URL=http://127.0.0.1:<port>/.
+Usage: python -m benchmarks.omdb_stub [--port 8765] [--latency 0.2]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from argparse import ArgumentParser
+import threading
+import hashlib
+import base64
+import json
+import time
+
+POSTER_IMAGE = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+class OmdbStubHandler(BaseHTTPRequestHandler):
+    """Answers OMDb title lookups with deterministic fake data."""
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle's algorithm every
+    # keep-alive answer would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        time.sleep(server.latency)
+        if self.path.startswith('/poster/'):
+            self._send(POSTER_IMAGE, 'image/gif')
+            return
+        title = parse_qs(urlsplit(self.path).query).get('t', [''])[0]
+        if title.lower().startswith('missing'):
+            body = {'Response': 'False', 'Error': 'Movie not found!'}
+        else:
+            digest = int(hashlib.sha1(title.encode('utf-8')).hexdigest(), 16)
+            body = {
+                'Response': 'True',
+                'Title': title,
+                'Director': f'Director {digest % 500}',
+                'Year': str(1950 + digest % 75),
+                'imdbRating': f'{1 + digest % 90 / 10:.1f}',
+                'Poster': f'http://127.0.0.1:{server.server_address[1]}/poster/{digest % 1000}.jpg',
+            }
+        self._send(json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _send(self, payload, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        """Keeps the benchmark output free of access logs."""
+
+
+def start_stub(port=0, latency=0.0):
+    """
+    Starts the stub server in a daemon thread.
+    :param port: Port to listen on, 0 picks a free port.
+    :param latency: Seconds every answer is delayed to simulate the network.
+    :return: The running server, its base URL is server.base_url.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), OmdbStubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.request_count = 0
+    server.lock = threading.Lock()
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}/'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = ArgumentParser(description='Run a local OMDb stub server.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per answer')
+    args = parser.parse_args()
+    server = start_stub(args.port, args.latency)
+    print(f'OMDb stub listening on {server.base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
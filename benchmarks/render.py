@@ -0,0 +1,90 @@
+"""
+Benchmark of the collection page rendering. Measures GET /users/<id>
+for growing page sizes with the movie card fragment cache disabled, cold
+(cleared before every request) and warm, and the time to compile all
+templates from source compared to loading them from the bytecode cache.
+Usage: python -m benchmarks.render [--sizes 10 50 100 200] [--iterations 50]
+"""
+from benchmarks.seed import seed_database
+from benchmarks.stats import summarize
+from argparse import ArgumentParser
+from flask import Flask
+import tempfile
+import time
+import json
+import os
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def measure_pages(web, size, iterations, mode):
+    """Returns the latency summary of rendering one page of size movie cards."""
+    client = web.app.test_client()
+    web.fragment_cache.max_size = 0 if mode == 'uncached' else 10000
+    web.fragment_cache.clear()
+    client.get(f'/users/1?limit={size}')
+    durations = []
+    for _ in range(iterations):
+        if mode == 'cold':
+            web.fragment_cache.clear()
+        start = time.perf_counter()
+        response = client.get(f'/users/1?limit={size}')
+        durations.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return summarize(durations)
+
+
+def measure_compile(directory):
+    """Returns the seconds to load all templates into a fresh app, from bytecode if cached."""
+    from render_cache import precompile_templates
+    app = Flask('app', root_path=BASE_DIR)
+    start = time.perf_counter()
+    precompile_templates(app, directory)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description='Measure page render time versus collection size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100, 200],
+                        help='movie cards per page, at most 200')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per measurement')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'movies.db')
+        largest = max(args.sizes)
+        seed_database(path, users=1, movies=largest, links=largest)
+        os.environ.update({
+            'MOVIWEB_DB_PATH': path,
+            'MOVIWEB_POSTER_DIR': os.path.join(tmp_dir, 'posters'),
+            'MOVIWEB_TEMPLATE_CACHE_DIR': os.path.join(tmp_dir, 'template_cache'),
+            'OMDB_CACHE_PATH': '',
+            'API_KEY': 'benchmark',
+        })
+        import app as web
+
+        results = {'benchmark': 'render', 'iterations': args.iterations, 'pages': []}
+        print(f"{'cards':>5}  {'uncached p50':>13}  {'cold p50':>10}  {'warm p50':>10}")
+        for size in args.sizes:
+            page = {'cards': size}
+            for mode in ('uncached', 'cold', 'warm'):
+                page[mode] = measure_pages(web, size, args.iterations, mode)
+            results['pages'].append(page)
+            print(f"{size:>5}  {page['uncached']['p50_ms']:10.2f} ms  "
+                  f"{page['cold']['p50_ms']:7.2f} ms  {page['warm']['p50_ms']:7.2f} ms")
+
+        bytecode_dir = os.path.join(tmp_dir, 'compile_cache')
+        results['compile_s'] = measure_compile(None)
+        measure_compile(bytecode_dir)
+        results['bytecode_load_s'] = measure_compile(bytecode_dir)
+        print(f"compile all templates {results['compile_s'] * 1000:.1f} ms, "
+              f"from bytecode {results['bytecode_load_s'] * 1000:.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
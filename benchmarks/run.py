@@ -0,0 +1,198 @@
+"""
+Benchmark suite for the Flask routes and the SQLiteDataManager methods.
+
+Seeds a synthetic database (see benchmarks.seed), replaces OMDb with the
+local stub and measures latency percentiles and throughput of the main
+routes through the Flask test client and of the data manager methods
+called directly. Results are written as JSON for benchmarks.compare.
+Usage: python -m benchmarks.run [--preset small|large] [--iterations 200] [--json out.json]
+"""
+from benchmarks.seed import seed_database, PRESETS
+from benchmarks.omdb_stub import start_stub
+from benchmarks.stats import summarize
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+import subprocess
+import itertools
+import platform
+import tempfile
+import sqlite3
+import random
+import json
+import time
+import sys
+import os
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def measure(name, operation, iterations, ok_statuses):
+    """
+    Runs an operation repeatedly and summarizes its latencies.
+    :param name: Name of the scenario.
+    :param operation: Callable taking the iteration number and returning a status code.
+    :param iterations: Number of calls.
+    :param ok_statuses: Status codes counted as successful.
+    :return: Dict with the latency summary, throughput and error count.
+    """
+    durations, errors = [], 0
+    for number in range(iterations):
+        start = time.perf_counter()
+        status = operation(number)
+        durations.append(time.perf_counter() - start)
+        if status not in ok_statuses:
+            errors += 1
+    result = summarize(durations)
+    result.update({'iterations': iterations, 'errors': errors,
+                   'throughput_per_s': iterations / sum(durations)})
+    print(f"{name:<28} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+          f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_per_s']:9.1f}/s"
+          + (f'  {errors} errors' if errors else ''))
+    return result
+
+
+def git_commit():
+    """Returns the current git commit of the repository or None."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sample_links(path, count, max_user_id, generator):
+    """Returns random (user_id, movie_id) links of users up to max_user_id."""
+    with sqlite3.connect(path) as connection:
+        total = connection.execute('SELECT max(id) FROM user_movies WHERE user_id <= ?',
+                                   (max_user_id,)).fetchone()[0]
+        ids = [generator.randrange(1, total + 1) for _ in range(count)]
+        return [connection.execute('SELECT user_id, movie_id FROM user_movies WHERE id = ?',
+                                   (link_id,)).fetchone() for link_id in ids]
+
+
+def run_suite(path, users, iterations, generator):
+    """Runs all route and data manager scenarios against a seeded database."""
+    import app as web
+    from data_models import Movie
+
+    client = web.app.test_client()
+    results = {}
+    # both delete_user scenarios remove users from the end of the id range,
+    # all other scenarios only touch the users below them
+    kept_users = users - 2 * iterations
+    random_user = lambda: generator.randrange(1, kept_users + 1)
+    deletable = iter(range(users, kept_users, -1))
+    titles = itertools.count()
+    links = sample_links(path, iterations * 2, kept_users, generator)
+
+    print('-- routes')
+    results['route.home'] = measure(
+        'GET /', lambda n: client.get('/').status_code, iterations, {200})
+    results['route.user_search'] = measure(
+        'GET user autocomplete', lambda n: client.get(
+            f'/api/v1/users/search?q=user{random_user() % 1000:03d}').status_code,
+        iterations, {200})
+    results['route.user_movies'] = measure(
+        'GET /users/<id>', lambda n: client.get(f'/users/{random_user()}').status_code,
+        iterations, {200})
+    results['route.api_user_movies'] = measure(
+        'GET /api/v1 user movies', lambda n: client.get(
+            f'/api/v1/users/{random_user()}/movies?limit=50').status_code, iterations, {200})
+    results['route.add_movie'] = measure(
+        'POST add_movie', lambda n: client.post(
+            f'/users/{random_user()}/add_movie',
+            data={'title': f'Benchmark Route Movie {next(titles)}', 'director': 'Bench',
+                  'year': '2020', 'rating': '7.5', 'poster': ''}).status_code,
+        iterations, {302})
+    results['route.update_movie'] = measure(
+        'POST update_movie', lambda n: client.post(
+            f'/users/{links[n][0]}/update_movie/{links[n][1]}',
+            data={'rating': f'{generator.uniform(1, 9):.1f}'}).status_code,
+        iterations, {302})
+    results['route.fetch_movie'] = measure(
+        'POST fetch_movie (stub)', lambda n: client.post(
+            '/fetch_movie', data={'title': f'Stub Movie {n % 50}', 'user_id': 1}).status_code,
+        iterations, {200})
+    results['route.stats_most_collected'] = measure(
+        'GET stats most-collected', lambda n: client.get(
+            '/api/stats/most-collected?limit=20').status_code, iterations, {200})
+    results['route.stats_top_rated'] = measure(
+        'GET stats top-rated', lambda n: client.get(
+            '/api/stats/top-rated?limit=20').status_code, iterations, {200})
+    results['route.delete_user'] = measure(
+        'GET delete_user', lambda n: client.get(f'/delete_user/{next(deletable)}').status_code,
+        iterations, {302})
+
+    print('-- data manager')
+    data_manager = web.data_manager
+    with web.app.app_context():
+        results['dm.get_all_users'] = measure(
+            'get_all_users', lambda n: data_manager.get_all_users()[1], iterations, {200})
+        results['dm.get_user_movies_page'] = measure(
+            'get_user_movies_page', lambda n: data_manager.get_user_movies_page(
+                random_user())[1], iterations, {200})
+        results['dm.add_movie'] = measure(
+            'add_movie', lambda n: data_manager.add_movie(
+                Movie(title=f'Benchmark Manager Movie {next(titles)}', director='Bench',
+                      year=2021, rating=6.0), random_user())[1],
+            iterations, {200})
+
+        results['dm.update_movie'] = measure(
+            'update_movie', lambda n: data_manager.update_movie(
+                *links[iterations + n], round(generator.uniform(1, 9), 1))[1],
+            iterations, {200})
+        results['dm.delete_user'] = measure(
+            'delete_user', lambda n: data_manager.delete_user(next(deletable))[1],
+            iterations, {200})
+    return results
+
+
+def main():
+    parser = ArgumentParser(description='Run the route and data manager benchmarks.')
+    parser.add_argument('--preset', choices=PRESETS, default='small')
+    parser.add_argument('--iterations', type=int, default=200, help='calls per scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+    sizes = PRESETS[args.preset]
+    if args.iterations * 3 >= sizes['users']:
+        parser.error('iterations must be below a third of the users of the preset')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'movies.db')
+        start = time.perf_counter()
+        seed_database(path, seed=args.seed, **sizes)
+        print(f"Seeded preset '{args.preset}' in {time.perf_counter() - start:.1f} s")
+
+        stub = start_stub()
+        os.environ.update({
+            'MOVIWEB_DB_PATH': path,
+            'MOVIWEB_POSTER_DIR': os.path.join(tmp_dir, 'posters'),
+            'MOVIWEB_TEMPLATE_CACHE_DIR': os.path.join(tmp_dir, 'template_cache'),
+            'OMDB_BASE_URL': stub.base_url,
+            'OMDB_CACHE_PATH': os.path.join(tmp_dir, 'omdb_cache.db'),
+            'API_KEY': 'benchmark',
+        })
+        results = run_suite(path, sizes['users'], args.iterations, random.Random(args.seed))
+        stub.shutdown()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'preset': args.preset,
+            'sizes': sizes,
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Generates a reproducible synthetic database for the benchmarks.
+
+Users, movies and user-movie links are written in large executemany
+batches through the data_models tables, the schema including the
+search index is created by db_validation.migrate_database.
+Usage: python -m benchmarks.seed --path bench.db [--preset small|large]
+       python -m benchmarks.seed --path bench.db --users 1000 --movies 20000 --links 100000
+"""
+from db_validation import migrate_database
+from data_models import db, User, Movie, UserMovies
+from argparse import ArgumentParser
+from flask import Flask
+import random
+import time
+import os
+
+PRESETS = {
+    'small': {'users': 1_000, 'movies': 20_000, 'links': 100_000},
+    'large': {'users': 100_000, 'movies': 200_000, 'links': 1_000_000},
+}
+BATCH_SIZE = 20_000
+
+
+def movie_title(number):
+    """Returns the title of the synthetic movie with the given number."""
+    return f'Synthetic Movie {number:07d}'
+
+
+def seed_database(path, users, movies, links, seed=42):
+    """
+    Creates a database file with synthetic users, movies and links.
+    Every user gets links // users distinct random movies.
+    :param path: Path of the SQLite file, an existing file is replaced.
+    :param users: Number of users.
+    :param movies: Number of movies.
+    :param links: Total number of user-movie links.
+    :param seed: Seed of the random generator, equal seeds give equal data.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    migrate_database(app)
+    generator = random.Random(seed)
+    links_per_user = min(movies, links // users)
+
+    with app.app_context():
+        insert_batches(User, ({'id': number, 'name': f'user{number:06d}'}
+                              for number in range(1, users + 1)))
+        insert_batches(Movie, ({'id': number, 'title': movie_title(number),
+                                'director': f'Director {generator.randrange(5000)}',
+                                'year': generator.randrange(1920, 2025),
+                                'rating': round(generator.uniform(1, 10), 1),
+                                'poster': None}
+                               for number in range(1, movies + 1)))
+        insert_batches(UserMovies, ({'user_id': user_id, 'movie_id': movie_id}
+                                    for user_id in range(1, users + 1)
+                                    for movie_id in generator.sample(range(1, movies + 1),
+                                                                     links_per_user)))
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def insert_batches(model, rows):
+    """Inserts rows into the table of a model in executemany batches."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(db.insert(model), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(model), batch)
+    db.session.commit()
+
+
+def main():
+    parser = ArgumentParser(description='Create a synthetic benchmark database.')
+    parser.add_argument('--path', required=True, help='SQLite file to create')
+    parser.add_argument('--preset', choices=PRESETS, default='small')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--movies', type=int)
+    parser.add_argument('--links', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = dict(PRESETS[args.preset])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    start = time.perf_counter()
+    seed_database(args.path, seed=args.seed, **sizes)
+    print(f"Seeded {sizes['users']} users, {sizes['movies']} movies and "
+          f"{sizes['links']} links in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Mixed read / write throughput of SQLiteDataManager per SQLite tuning profile.
+
+Every profile gets a fresh database file with a seeded collection. Reader
+threads page through collections while writer threads add movies, errors
+are failed operations, e.g. 'database is locked'.
+Usage: python -m benchmarks.sqlite_profile [--seconds 5] [--readers 6] [--writers 2]
+"""
+from datamanager.sqlite_data_manager import SQLiteDataManager, SQLITE_PROFILES
+from data_models import db, User, Movie
+from argparse import ArgumentParser
+from flask import Flask
+import itertools
+import threading
+import tempfile
+import json
+import time
+import os
+
+USERS = 20
+MOVIES_PER_USER = 500
+
+
+def create_app(path, profile):
+    """Creates a Flask app with a seeded database using the given profile."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_PROFILE'] = profile
+    data_manager = SQLiteDataManager(app)
+    with app.app_context():
+        db.create_all()
+        for user_number in range(USERS):
+            data_manager.add_user(User(name=f'user {user_number}'))
+            data_manager.bulk_add_movies(user_number + 1, [
+                {'title': f'Seed {user_number}-{number}', 'director': 'Seed Director',
+                 'year': 1950 + number % 70, 'rating': float(number % 10)}
+                for number in range(MOVIES_PER_USER)])
+    return app, data_manager
+
+
+def run_profile(profile, seconds, readers, writers):
+    """
+    Runs the mixed workload against one profile.
+    :return: Dict with read / write operation counts, errors and throughput.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app, data_manager = create_app(os.path.join(tmp_dir, 'movies.db'), profile)
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        titles = itertools.count()
+
+        def reader(number):
+            with app.app_context():
+                while not stop.is_set():
+                    user_id = number % USERS + 1
+                    _, status = data_manager.get_user_movies_page(user_id, 'year', limit=50)
+                    with lock:
+                        counts['reads' if status == 200 else 'errors'] += 1
+
+        def writer(number):
+            with app.app_context():
+                while not stop.is_set():
+                    movie = Movie(title=f'Write {number}-{next(titles)}', director='Writer',
+                                  year=2000, rating=5.0)
+                    _, status = data_manager.add_movie(movie, number % USERS + 1)
+                    with lock:
+                        counts['writes' if status == 200 else 'errors'] += 1
+
+        threads = ([threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+                   + [threading.Thread(target=writer, args=(n,)) for n in range(writers)])
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+
+    counts['profile'] = profile
+    counts['reads_per_s'] = counts['reads'] / seconds
+    counts['writes_per_s'] = counts['writes'] / seconds
+    return counts
+
+
+def main():
+    parser = ArgumentParser(description='Compare SQLite tuning profiles under mixed load.')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration per profile')
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    for profile in SQLITE_PROFILES:
+        result = run_profile(profile, args.seconds, args.readers, args.writers)
+        results.append(result)
+        print(f"{profile:<8} reads {result['reads_per_s']:8.1f}/s   "
+              f"writes {result['writes_per_s']:7.1f}/s   errors {result['errors']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({'benchmark': 'sqlite_profile', 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold start benchmark for the Flask app.
+
+Imports app.py in N fresh interpreters against a temporary database and
+reports how long the import and the whole interpreter run took.
+Usage: python -m benchmarks.startup [--runs 20] [--json results.json]
+"""
+from benchmarks.stats import summarize
+from argparse import ArgumentParser
+import subprocess
+import tempfile
+import json
+import time
+import sys
+import os
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+IMPORT_SNIPPET = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "print('IMPORT_SECONDS', time.perf_counter() - start)\n"
+)
+
+
+def run_import(env):
+    """
+    Imports the app once in a fresh interpreter.
+    :return: Tuple of import time and total process time in seconds.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=BASE_DIR,
+                               env=env, capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    for line in completed.stdout.splitlines():
+        if line.startswith('IMPORT_SECONDS'):
+            return float(line.split()[1]), total
+    raise RuntimeError(f'Import did not finish:\n{completed.stdout}{completed.stderr}')
+
+
+def main():
+    parser = ArgumentParser(description='Measure the cold start time of app.py.')
+    parser.add_argument('--runs', type=int, default=20, help='number of fresh interpreters')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, MOVIWEB_DB_PATH=os.path.join(tmp_dir, 'movies.db'))
+        subprocess.run([sys.executable, 'db_creation.py'], cwd=BASE_DIR, env=env,
+                       capture_output=True, check=True)
+        run_import(env)  # warm up the OS file cache and bytecode files
+        imports, totals = [], []
+        for _ in range(args.runs):
+            import_time, total_time = run_import(env)
+            imports.append(import_time)
+            totals.append(total_time)
+
+    results = {
+        'benchmark': 'startup',
+        'runs': args.runs,
+        'import_app': summarize(imports),
+        'interpreter_total': summarize(totals),
+    }
+    for name in ('import_app', 'interpreter_total'):
+        stats = results[name]
+        print(f"{name:<18} p50 {stats['p50_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms   "
+              f"max {stats['max_ms']:8.1f} ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Shared statistics helpers of the benchmark scripts."""
+import statistics
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at the given fraction of the sorted values.
+    :param values: List of measurements.
+    :param fraction: Fraction between 0 and 1, e.g. 0.95 for p95.
+    :return: Measurement at that position.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarize(values):
+    """Returns min, p50, mean, p95, p99 and max of durations in seconds as milliseconds."""
+    return {
+        'min_ms': min(values) * 1000,
+        'p50_ms': statistics.median(values) * 1000,
+        'mean_ms': statistics.mean(values) * 1000,
+        'p95_ms': percentile(values, 0.95) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': max(values) * 1000,
+    }
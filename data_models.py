@@ -14,7 +14,7 @@ class User(db.Model):
     __tablename__ = 'user'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), unique=True, index=True, nullable=False)
 
     user_movies = db.relationship('UserMovies', back_populates='user', cascade='all, delete')
 
@@ -28,6 +28,11 @@ class User(db.Model):
         return f"{self.name}"
 
 
+# Case-insensitive index for the prefix search of the user autocomplete,
+# SQLite turns "name LIKE 'x%'" into a range scan of it
+db.Index('ix_user_name_nocase', User.name.collate('NOCASE'))
+
+
 class Movie(db.Model):
     """
     Represents a movie.
@@ -36,7 +41,9 @@ class Movie(db.Model):
         title (string): movie name
         director (sting): director from the movie
         year (integer): year of the book's first publication year
-        rating (integer): rating of the movie
+        rating (integer): IMDb rating of the movie, the ratings of the
+                          users are stored on their UserMovies links
+        refreshed_at (datetime): UTC time of the last OMDb refresh, None if never
     """
     __tablename__ = 'movies'
 
@@ -46,6 +53,10 @@ class Movie(db.Model):
     year = db.Column(db.Integer, nullable=False)
     rating = db.Column(db.Float, nullable=True)
     poster = db.Column(db.String(300))
+    refreshed_at = db.Column(db.DateTime, nullable=True)
+
+    # Catalog pages sorted by year seek in this index, title is unique anyway
+    __table_args__ = (db.Index('ix_movies_year_id', 'year', 'id'),)
 
     user_movies = db.relationship('UserMovies', back_populates='movies',
                                   cascade='all, delete')
@@ -61,6 +72,28 @@ class Movie(db.Model):
         return f"{self.title} ({self.year}) by {self.director}"
 
 
+# Full-text index over movie titles and directors. The FTS5 table only
+# references the movies table (external content) and is kept in sync by
+# triggers, db_validation.migrate_database creates it.
+MOVIE_SEARCH_TABLE = 'movies_fts'
+MOVIE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5("
+    "title, director, content='movies', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN "
+    "INSERT INTO movies_fts(rowid, title, director) "
+    "VALUES (new.id, new.title, new.director); END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, director) "
+    "VALUES ('delete', old.id, old.title, old.director); END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title, director ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, director) "
+    "VALUES ('delete', old.id, old.title, old.director); "
+    "INSERT INTO movies_fts(rowid, title, director) "
+    "VALUES (new.id, new.title, new.director); END",
+)
+
+
 class UserMovies(db.Model):
     """
     This table is the link of the user from the user table
@@ -69,12 +102,29 @@ class UserMovies(db.Model):
         id (integer): primary key, auto-incrementing unique identifier
         user_id (integer): user id key, foreign key
         movie_id (integer): movie id key, foreign key
+        rating (float): personal rating of the user, None if not rated yet
+        title (string): copy of the movie title, kept by LINK_SORT_DDL
+        year (integer): copy of the movie year, kept by LINK_SORT_DDL
+    Each movie can be linked to a user only once. Title and year are
+    copied onto the link, so the pages of a collection are read in
+    order from the (user_id, title / year, movie_id) indexes instead of
+    sorting the whole collection.
     """
     __tablename__ = 'user_movies'
+    __table_args__ = (
+        db.Index('ix_user_movies_user_movie', 'user_id', 'movie_id', unique=True),
+        db.Index('ix_user_movies_movie_id', 'movie_id'),
+        db.Index('ix_user_movies_user_added', 'user_id', 'id'),
+        db.Index('ix_user_movies_user_title', 'user_id', 'title', 'movie_id'),
+        db.Index('ix_user_movies_user_year', 'user_id', 'year', 'movie_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
+    rating = db.Column(db.Float, nullable=True)
+    title = db.Column(db.String(100), nullable=True)
+    year = db.Column(db.Integer, nullable=True)
 
     user = db.relationship('User', back_populates='user_movies')
     movies = db.relationship('Movie', back_populates='user_movies')
@@ -82,5 +132,326 @@ class UserMovies(db.Model):
     def __repr__(self):
         """Returns a concise, unambiguous representation
         of the UserMovie instance for debugging"""
-        return (f"<user_movie_id(id={self.id}, user_id='{self.user_i}', "
-                f"movie_id={self.movie_id}, user_rating={self.user_rating})>")
+        return (f"<UserMovies(id={self.id}, user_id={self.user_id}, "
+                f"movie_id={self.movie_id}, rating={self.rating})>")
+
+
+# Triggers copying title and year of a movie onto its links, for every
+# insert including bulk statements and for every change of the movie.
+# db_validation.migrate_database creates them and fills existing links.
+LINK_SORT_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS link_sort_insert AFTER INSERT ON user_movies BEGIN "
+    "UPDATE user_movies SET "
+    "title = (SELECT title FROM movies WHERE id = new.movie_id), "
+    "year = (SELECT year FROM movies WHERE id = new.movie_id) "
+    "WHERE id = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS link_sort_update AFTER UPDATE OF title, year ON movies BEGIN "
+    "UPDATE user_movies SET title = new.title, year = new.year "
+    "WHERE movie_id = new.id; END",
+)
+LINK_SORT_BACKFILL = (
+    "UPDATE user_movies SET "
+    "title = (SELECT title FROM movies WHERE movies.id = user_movies.movie_id), "
+    "year = (SELECT year FROM movies WHERE movies.id = user_movies.movie_id)")
+
+
+class MovieRating(db.Model):
+    """
+    Precomputed aggregate of the user ratings of a movie, updated in the
+    same transaction as every rating change so catalog views never have
+    to scan the links. Movies without ratings have no row.
+    Attributes:
+        movie_id (integer): primary key, foreign key of the movie
+        rating_count (integer): number of users who rated the movie
+        rating_sum (float): sum of all user ratings
+    """
+    __tablename__ = 'movie_ratings'
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    @property
+    def mean(self):
+        """Returns the average user rating or None without ratings."""
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the MovieRating instance for debugging"""
+        return (f"<MovieRating(movie_id={self.movie_id}, rating_count={self.rating_count}, "
+                f"rating_sum={self.rating_sum})>")
+
+
+class MovieRatingBucket(db.Model):
+    """
+    Rating histogram of a movie, one row per non-empty bucket.
+    Bucket n counts the ratings from n up to n + 1, ratings of 10 fall
+    into the last bucket.
+    Attributes:
+        movie_id (integer): primary key, foreign key of the movie
+        bucket (integer): primary key, bucket number from 0 to 9
+        rating_count (integer): number of ratings in the bucket
+    """
+    __tablename__ = 'movie_rating_buckets'
+
+    BUCKETS = 10
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def of(cls, rating):
+        """Returns the bucket number of a rating."""
+        return min(max(int(rating), 0), cls.BUCKETS - 1)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the MovieRatingBucket instance for debugging"""
+        return (f"<MovieRatingBucket(movie_id={self.movie_id}, bucket={self.bucket}, "
+                f"rating_count={self.rating_count})>")
+
+
+class Job(db.Model):
+    """
+    Background job processed by the workers in jobs.py. Workers claim a
+    job by setting it to running with a lease, jobs of crashed workers are
+    claimed again once their lease expired.
+    Attributes:
+        id (integer): primary key, auto-incrementing unique identifier
+        kind (string): 'lookup', 'enrich' or 'refresh'
+        movie_id (integer): movie to enrich or refresh
+        title (string): title to look up
+        batch (string): groups the jobs of one request for progress reporting
+        status (string): 'queued', 'running', 'done' or 'failed'
+        attempts (integer): number of started runs
+        error (string): error of the last failed run
+        run_after (datetime): UTC time before which the job is not claimed
+        locked_until (datetime): UTC end of the lease of a running job
+        created_at (datetime): UTC time the job was queued
+        finished_at (datetime): UTC time the job was done or failed
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+        db.Index('ix_jobs_movie_id', 'movie_id'),
+        db.Index('ix_jobs_batch_status', 'batch', 'status'),
+    )
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(20), nullable=False)
+    movie_id = db.Column(db.Integer, nullable=True)
+    title = db.Column(db.String(100), nullable=True)
+    batch = db.Column(db.String(50), nullable=True)
+    status = db.Column(db.String(10), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(300), nullable=True)
+    run_after = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the Job instance for debugging"""
+        return (f"<Job(id={self.id}, kind='{self.kind}', movie_id={self.movie_id}, "
+                f"title='{self.title}', status='{self.status}', attempts={self.attempts})>")
+
+
+class RateLimit(db.Model):
+    """
+    Token bucket shared by all worker threads and processes, e.g. to stay
+    within the OMDb API quota.
+    Attributes:
+        name (string): primary key, name of the limited resource
+        tokens (float): tokens left at updated_at
+        updated_at (float): Unix time of the last refill
+    """
+    __tablename__ = 'rate_limits'
+
+    name = db.Column(db.String(50), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the RateLimit instance for debugging"""
+        return f"<RateLimit(name='{self.name}', tokens={self.tokens}, updated_at={self.updated_at})>"
+
+
+class DataVersion(db.Model):
+    """
+    Version counter of a view which is served with an ETag, bumped in the
+    same transaction as every write changing the view.
+    Attributes:
+        key (string): primary key, 'user:<id>' for the collection of a user
+        version (integer): incremented on every change
+        updated_at (datetime): UTC time of the last change
+    """
+    __tablename__ = 'data_versions'
+
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def user(user_id):
+        """Returns the version key of a user's collection."""
+        return f'user:{user_id}'
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the DataVersion instance for debugging"""
+        return f"<DataVersion(key='{self.key}', version={self.version}, updated_at={self.updated_at})>"
+
+
+class MovieSummary(db.Model):
+    """
+    Number of users who collected a movie, maintained by the summary
+    triggers. Movies nobody collected have no row.
+    Attributes:
+        movie_id (integer): primary key, foreign key of the movie
+        collector_count (integer): number of collections containing the movie
+    """
+    __tablename__ = 'summary_movies'
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), primary_key=True)
+    collector_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the MovieSummary instance for debugging"""
+        return f"<MovieSummary(movie_id={self.movie_id}, collector_count={self.collector_count})>"
+
+
+class UserSummary(db.Model):
+    """
+    Collection size of a user, maintained by the summary triggers.
+    Users with an empty collection have no row.
+    Attributes:
+        user_id (integer): primary key, foreign key of the user
+        movie_count (integer): number of movies in the collection
+    """
+    __tablename__ = 'summary_users'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    movie_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the UserSummary instance for debugging"""
+        return f"<UserSummary(user_id={self.user_id}, movie_count={self.movie_count})>"
+
+
+class YearSummary(db.Model):
+    """
+    Number of catalog movies per release year, maintained by the summary triggers.
+    Attributes:
+        year (integer): primary key, release year
+        movie_count (integer): number of movies released in the year
+    """
+    __tablename__ = 'summary_years'
+
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    movie_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the YearSummary instance for debugging"""
+        return f"<YearSummary(year={self.year}, movie_count={self.movie_count})>"
+
+
+class DirectorSummary(db.Model):
+    """
+    Number of catalog movies per director, maintained by the summary triggers.
+    Attributes:
+        director (string): primary key, name of the director
+        movie_count (integer): number of movies of the director
+    """
+    __tablename__ = 'summary_directors'
+
+    director = db.Column(db.String(100), primary_key=True)
+    movie_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """Returns a concise, unambiguous representation
+        of the DirectorSummary instance for debugging"""
+        return f"<DirectorSummary(director='{self.director}', movie_count={self.movie_count})>"
+
+
+# Indexes matching the ORDER BY of the top-N queries, so they read the
+# first rows of the index instead of sorting the whole table
+db.Index('ix_movie_ratings_mean',
+         (MovieRating.rating_sum / MovieRating.rating_count).desc(), MovieRating.movie_id)
+db.Index('ix_summary_movies_collectors',
+         MovieSummary.collector_count.desc(), MovieSummary.movie_id)
+db.Index('ix_summary_users_movies', UserSummary.movie_count.desc(), UserSummary.user_id)
+db.Index('ix_summary_directors_movies',
+         DirectorSummary.movie_count.desc(), DirectorSummary.director)
+
+# Triggers keeping the summary tables in sync inside the transaction of
+# every write to movies and user_movies, including bulk and set-based
+# statements. Rows whose count drops to zero are removed.
+# db_validation.migrate_database creates them.
+SUMMARY_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS summary_links_insert AFTER INSERT ON user_movies BEGIN "
+    "INSERT INTO summary_movies(movie_id, collector_count) VALUES (new.movie_id, 1) "
+    "ON CONFLICT(movie_id) DO UPDATE SET collector_count = collector_count + 1; "
+    "INSERT INTO summary_users(user_id, movie_count) VALUES (new.user_id, 1) "
+    "ON CONFLICT(user_id) DO UPDATE SET movie_count = movie_count + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS summary_links_delete AFTER DELETE ON user_movies BEGIN "
+    "UPDATE summary_movies SET collector_count = collector_count - 1 "
+    "WHERE movie_id = old.movie_id; "
+    "DELETE FROM summary_movies WHERE movie_id = old.movie_id AND collector_count <= 0; "
+    "UPDATE summary_users SET movie_count = movie_count - 1 WHERE user_id = old.user_id; "
+    "DELETE FROM summary_users WHERE user_id = old.user_id AND movie_count <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS summary_movies_insert AFTER INSERT ON movies BEGIN "
+    "INSERT INTO summary_years(year, movie_count) VALUES (new.year, 1) "
+    "ON CONFLICT(year) DO UPDATE SET movie_count = movie_count + 1; "
+    "INSERT INTO summary_directors(director, movie_count) VALUES (new.director, 1) "
+    "ON CONFLICT(director) DO UPDATE SET movie_count = movie_count + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS summary_movies_delete AFTER DELETE ON movies BEGIN "
+    "UPDATE summary_years SET movie_count = movie_count - 1 WHERE year = old.year; "
+    "DELETE FROM summary_years WHERE year = old.year AND movie_count <= 0; "
+    "UPDATE summary_directors SET movie_count = movie_count - 1 WHERE director = old.director; "
+    "DELETE FROM summary_directors WHERE director = old.director AND movie_count <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS summary_movies_update AFTER UPDATE OF year, director ON movies BEGIN "
+    "UPDATE summary_years SET movie_count = movie_count - 1 WHERE year = old.year; "
+    "DELETE FROM summary_years WHERE year = old.year AND movie_count <= 0; "
+    "UPDATE summary_directors SET movie_count = movie_count - 1 WHERE director = old.director; "
+    "DELETE FROM summary_directors WHERE director = old.director AND movie_count <= 0; "
+    "INSERT INTO summary_years(year, movie_count) VALUES (new.year, 1) "
+    "ON CONFLICT(year) DO UPDATE SET movie_count = movie_count + 1; "
+    "INSERT INTO summary_directors(director, movie_count) VALUES (new.director, 1) "
+    "ON CONFLICT(director) DO UPDATE SET movie_count = movie_count + 1; END",
+)
+
+# Recomputes all summary tables and the rating aggregates from scratch,
+# e.g. after writes which bypassed the data manager
+SUMMARY_REBUILD = (
+    "DELETE FROM summary_movies",
+    "INSERT INTO summary_movies(movie_id, collector_count) "
+    "SELECT movie_id, count(*) FROM user_movies GROUP BY movie_id",
+    "DELETE FROM summary_users",
+    "INSERT INTO summary_users(user_id, movie_count) "
+    "SELECT user_id, count(*) FROM user_movies GROUP BY user_id",
+    "DELETE FROM summary_years",
+    "INSERT INTO summary_years(year, movie_count) SELECT year, count(*) FROM movies GROUP BY year",
+    "DELETE FROM summary_directors",
+    "INSERT INTO summary_directors(director, movie_count) "
+    "SELECT director, count(*) FROM movies GROUP BY director",
+    "DELETE FROM movie_ratings",
+    "INSERT INTO movie_ratings(movie_id, rating_count, rating_sum) "
+    "SELECT movie_id, count(*), sum(rating) FROM user_movies "
+    "WHERE rating IS NOT NULL GROUP BY movie_id",
+    "DELETE FROM movie_rating_buckets",
+    "INSERT INTO movie_rating_buckets(movie_id, bucket, rating_count) "
+    f"SELECT movie_id, min(max(CAST(rating AS INTEGER), 0), {MovieRatingBucket.BUCKETS - 1}), "
+    "count(*) FROM user_movies WHERE rating IS NOT NULL GROUP BY 1, 2",
+)
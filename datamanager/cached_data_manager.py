@@ -0,0 +1,381 @@
+from datamanager.data_manager_interface import DataManagerInterface
+from data_models import User, UserMovies, DataVersion
+from collections import OrderedDict
+import threading
+import pickle
+import time
+
+USERS_KEY = 'users'
+CATALOG_KEY = 'catalog'
+
+
+def user_key(user_id):
+    """Returns the invalidation key of a user's collection."""
+    return f'user:{user_id}'
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache backend. Generation counters are kept apart
+    from the LRU entries, so evicting an entry never resets a generation.
+    Generations only see the writes of this process, entries expire after
+    ttl seconds so writes of other workers show up after a bounded delay.
+    """
+
+    def __init__(self, max_size=2048, ttl=30):
+        """
+        :param max_size: Maximum number of cached results.
+        :param ttl: Seconds a cached result lives.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Stores a value with the configured TTL and evicts the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def generation(self, key):
+        """Returns the current generation of an invalidation key."""
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def bump(self, key):
+        """Starts a new generation, entries of older generations are never read again."""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Cache backend for any Redis compatible server, shared by all workers.
+    Values are pickled and expire after ttl seconds, the server's
+    eviction policy bounds the memory.
+    """
+
+    def __init__(self, client, ttl=300, prefix='moviweb:'):
+        """
+        :param client: Client with the redis-py get / set / incr methods.
+        :param ttl: Seconds a cached result lives.
+        :param prefix: Prefix of all keys written by the cache.
+        """
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Creates a backend connected to the server at a redis:// URL."""
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for the Redis cache backend.')
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        """Returns the cached value or None."""
+        payload = self.client.get(self.prefix + key)
+        return pickle.loads(payload) if payload is not None else None
+
+    def set(self, key, value):
+        """Stores a value with the configured TTL."""
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def generation(self, key):
+        """Returns the current generation of an invalidation key."""
+        return int(self.client.get(f'{self.prefix}gen:{key}') or 0)
+
+    def bump(self, key):
+        """Starts a new generation, entries of older generations expire unread."""
+        self.client.incr(f'{self.prefix}gen:{key}')
+
+
+class CachedDataManager(DataManagerInterface):
+    """
+    Read-through cache in front of another data manager. The user list,
+    user collections and catalog pages are cached, every write method
+    invalidates the keys it touches by bumping their generation.
+    Collection entries are also keyed by the version counter of the
+    collection, which every writer bumps in its transaction, so writes of
+    other processes never leave a stale collection next to a new ETag.
+    """
+
+    def __init__(self, data_manager, backend=None):
+        """
+        :param data_manager: Data manager all calls are delegated to.
+        :param backend: Cache backend, defaults to an in-process LRU.
+        """
+        self.data_manager = data_manager
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def stats(self):
+        """Returns the hit / miss / invalidation counters and the hit ratio."""
+        with self._lock:
+            stats = dict(self._counters)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+        return stats
+
+    def _cached(self, scope, key, load, version_key=None):
+        """
+        Returns a cached successful result or loads and caches it.
+        :param scope: Invalidation key the entry belongs to.
+        :param key: Key of the entry inside its scope.
+        :param load: Callable returning a (result, status) tuple.
+        :param version_key: DataVersion key whose version is part of the cache key.
+        """
+        cache_key = f'{scope}:{self.backend.generation(scope)}:{key}'
+        if version_key is not None:
+            version, status = self.data_manager.get_data_version(version_key)
+            if status != 200:
+                return load()
+            cache_key = f"{cache_key}:v{version['version']}"
+        value = self.backend.get(cache_key)
+        if value is not None:
+            self._count('hits')
+            return value, 200
+        self._count('misses')
+        result, status = load()
+        if status == 200:
+            self.backend.set(cache_key, result)
+        return result, status
+
+    def _invalidate(self, *scopes):
+        """Invalidates all entries of the given scopes."""
+        for scope in scopes:
+            self.backend.bump(scope)
+            self._count('invalidations')
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get_all_users(self):
+        """Returns a list of all usernames as tuples or an error dict."""
+        return self._cached(USERS_KEY, 'all', self.data_manager.get_all_users)
+
+    def search_users(self, prefix, limit=10):
+        """Finds users by name prefix, results are cached until a user is added or deleted."""
+        return self._cached(USERS_KEY, f'search:{limit}:{prefix}',
+                            lambda: self.data_manager.search_users(prefix, limit))
+
+    def get_user_movies(self, user_id, order_by='added'):
+        """Returns all movies associated with a given user ID."""
+        return self._cached(user_key(user_id), f'all:{order_by}',
+                            lambda: self.data_manager.get_user_movies(user_id, order_by),
+                            DataVersion.user(user_id))
+
+    def get_user_movies_page(self, user_id, order_by='title', after=None,
+                             before=None, limit=50):
+        """Returns one keyset paginated page of a user's movies."""
+        return self._cached(user_key(user_id), f'page:{order_by}:{after}:{before}:{limit}',
+                            lambda: self.data_manager.get_user_movies_page(
+                                user_id, order_by, after, before, limit),
+                            DataVersion.user(user_id))
+
+    def search_movies(self, search, limit=20):
+        """Searches the local movie catalog, results are cached until the catalog changes."""
+        return self._cached(CATALOG_KEY, f'search:{limit}:{search}',
+                            lambda: self.data_manager.search_movies(search, limit))
+
+    def export_movies(self, user_id=None):
+        """Streams the movies of one user or of all users, never cached."""
+        return self.data_manager.export_movies(user_id)
+
+    def stream_users(self):
+        """Streams all users, never cached."""
+        return self.data_manager.stream_users()
+
+    def stream_user_movies(self, user_id):
+        """Streams the movies of a user, never cached."""
+        return self.data_manager.stream_user_movies(user_id)
+
+    def add_user(self, user):
+        """Adds a new user object to the database."""
+        result, status = self.data_manager.add_user(user)
+        if status == 200:
+            self._invalidate(USERS_KEY)
+        return result, status
+
+    def delete_user(self, user_id):
+        """Deletes a user and all related user-movie associations."""
+        result, status = self.data_manager.delete_user(user_id)
+        if status == 200:
+            self._invalidate(USERS_KEY, user_key(user_id), CATALOG_KEY)
+        return result, status
+
+    def delete_orphan_movies(self):
+        """Deletes all movies which are not linked to any user."""
+        result, status = self.data_manager.delete_orphan_movies()
+        if status == 200 and result['deleted']:
+            self._invalidate(CATALOG_KEY)
+        return result, status
+
+    def get_all_movies(self):
+        """Returns a list of all movie entries, never cached as they are ORM objects."""
+        return self.data_manager.get_all_movies()
+
+    def get_all_movies_page(self, order_by='title', after=None, before=None, limit=50):
+        """Returns one keyset paginated page of all movies."""
+        return self._cached(CATALOG_KEY, f'page:{order_by}:{after}:{before}:{limit}',
+                            lambda: self.data_manager.get_all_movies_page(
+                                order_by, after, before, limit))
+
+    def add_movie(self, movie, user_id):
+        """Adds a movie to the database."""
+        result, status = self.data_manager.add_movie(movie, user_id)
+        if status == 200:
+            self._invalidate(user_key(user_id), CATALOG_KEY)
+        return result, status
+
+    def bulk_add_movies(self, user_id, movies):
+        """Adds many movies to a user's collection in a single transaction."""
+        result, status = self.data_manager.bulk_add_movies(user_id, movies)
+        if status == 200:
+            self._invalidate(user_key(user_id), CATALOG_KEY)
+        return result, status
+
+    def update_movie(self, user_id, movie_id, rating):
+        """Updates a user's rating, the catalog shows the changed average rating."""
+        result, status = self.data_manager.update_movie(user_id, movie_id, rating)
+        if status == 200:
+            self._invalidate(user_key(user_id), CATALOG_KEY)
+        return result, status
+
+    def delete_movie(self, user_id, movie_id):
+        """Deletes a movie from the database for a user."""
+        result, status = self.data_manager.delete_movie(user_id, movie_id)
+        if status == 200:
+            self._invalidate(user_key(user_id), CATALOG_KEY)
+        return result, status
+
+    def add_element(self, element):
+        """Adds a generic element to the session and commits it."""
+        result, status = self.data_manager.add_element(element)
+        if status == 200:
+            if isinstance(element, User):
+                self._invalidate(USERS_KEY)
+            elif isinstance(element, UserMovies):
+                self._invalidate(user_key(element.user_id))
+            self._invalidate(CATALOG_KEY)
+        return result, status
+
+    def commit_only(self):
+        """Commits the current database session."""
+        return self.data_manager.commit_only()
+
+    def get_movie(self, movie_id):
+        """Gets a movie by movie ID, never cached as it is an ORM object."""
+        return self.data_manager.get_movie(movie_id)
+
+    def get_user_rating(self, user_id, movie_id):
+        """Gets a user's personal rating of a movie, never cached as None marks a miss."""
+        return self.data_manager.get_user_rating(user_id, movie_id)
+
+    def get_movie_rating(self, movie_id):
+        """Gets the rating aggregate of a movie, cached until the catalog changes."""
+        return self._cached(CATALOG_KEY, f'rating:{movie_id}',
+                            lambda: self.data_manager.get_movie_rating(movie_id))
+
+    def get_most_collected_movies(self, limit=10):
+        """Returns the most collected movies, never cached as the summary tables answer directly."""
+        return self.data_manager.get_most_collected_movies(limit)
+
+    def get_top_rated_movies(self, limit=10, min_ratings=1):
+        """Returns the best rated movies, never cached as the summary tables answer directly."""
+        return self.data_manager.get_top_rated_movies(limit, min_ratings)
+
+    def get_top_directors(self, limit=10):
+        """Returns the directors with the most movies, never cached."""
+        return self.data_manager.get_top_directors(limit)
+
+    def get_largest_collections(self, limit=10):
+        """Returns the users with the largest collections, never cached."""
+        return self.data_manager.get_largest_collections(limit)
+
+    def get_movies_per_year(self):
+        """Returns the number of movies per release year, never cached."""
+        return self.data_manager.get_movies_per_year()
+
+    def get_collection_size(self, user_id):
+        """Returns the number of movies in a user's collection, never cached."""
+        return self.data_manager.get_collection_size(user_id)
+
+    def rebuild_summaries(self):
+        """Recomputes the summary tables, the catalog shows the rebuilt averages."""
+        result, status = self.data_manager.rebuild_summaries()
+        if status == 200:
+            self._invalidate(CATALOG_KEY)
+        return result, status
+
+    def update_movie_metadata(self, movie_id, rating=None, poster=None):
+        """Updates a movie with OMDb data, all collections containing it show the new data."""
+        result, status = self.data_manager.update_movie_metadata(movie_id, rating, poster)
+        if status == 200:
+            self._invalidate(CATALOG_KEY, *(user_key(user_id) for user_id in result['user_ids']))
+        return result, status
+
+    def enqueue_job(self, kind, movie_id=None, title=None, batch=None):
+        """Queues a background job, passed through."""
+        return self.data_manager.enqueue_job(kind, movie_id, title, batch)
+
+    def enqueue_refresh(self, batch, older_than=None):
+        """Queues refresh jobs, passed through."""
+        return self.data_manager.enqueue_refresh(batch, older_than)
+
+    def claim_job(self, lease_seconds=120, max_attempts=3):
+        """Claims the next due job, passed through."""
+        return self.data_manager.claim_job(lease_seconds, max_attempts)
+
+    def finish_job(self, job_id, lease, error=None, retry_in=None):
+        """Finishes a claimed job, passed through."""
+        return self.data_manager.finish_job(job_id, lease, error, retry_in)
+
+    def get_job(self, job_id):
+        """Gets a job, never cached as clients poll it for progress."""
+        return self.data_manager.get_job(job_id)
+
+    def get_job_progress(self, batch):
+        """Counts the jobs of a batch, never cached as clients poll it for progress."""
+        return self.data_manager.get_job_progress(batch)
+
+    def delete_finished_jobs(self, older_than):
+        """Deletes finished jobs, passed through."""
+        return self.data_manager.delete_finished_jobs(older_than)
+
+    def take_rate_token(self, name, rate, burst):
+        """Takes a rate limit token, passed through."""
+        return self.data_manager.take_rate_token(name, rate, burst)
+
+    def get_user_by_name(self, username):
+        """Gets a user by name, never cached as it is an ORM object."""
+        return self.data_manager.get_user_by_name(username)
+
+    def get_data_version(self, key):
+        """Returns the version counter of a view, never cached as it validates the caches."""
+        return self.data_manager.get_data_version(key)
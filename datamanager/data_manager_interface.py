@@ -1,7 +1,12 @@
 from data_models import User, Movie, UserMovies
-from typing import List, Tuple, Union
+from sqlalchemy import Row
+from typing import Iterator, List, Optional, Tuple, Union
+from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
 
+# Value of update_movie_metadata which removes a stored value, None keeps it
+CLEAR = object()
+
 
 class DataManagerInterface(ABC):
 
@@ -11,8 +16,41 @@ class DataManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def get_user_movies(self, user_id: int) -> Tuple[Union[List[Movie], dict], int]:
-        """Returns all movies associated with a given user ID."""
+    def search_users(self, prefix: str, limit: int = 10) -> Tuple[Union[List[Row], dict], int]:
+        """Finds users whose name starts with a prefix for the autocomplete."""
+        pass
+
+    @abstractmethod
+    def get_user_movies(self, user_id: int,
+                        order_by: str = 'added') -> Tuple[Union[List[Row], dict], int]:
+        """Returns all movies associated with a given user ID as column rows."""
+        pass
+
+    @abstractmethod
+    def get_user_movies_page(self, user_id: int, order_by: str = 'title',
+                             after: Optional[str] = None, before: Optional[str] = None,
+                             limit: int = 50) -> Tuple[dict, int]:
+        """Returns one keyset paginated page of a user's movies with next / prev cursors."""
+        pass
+
+    @abstractmethod
+    def search_movies(self, search: str, limit: int = 20) -> Tuple[Union[List[Row], dict], int]:
+        """Searches the local movie catalog by title and director prefixes."""
+        pass
+
+    @abstractmethod
+    def export_movies(self, user_id: Optional[int] = None) -> Tuple[Union[Iterator[Row], dict], int]:
+        """Streams the movies of one user or of all users as column rows."""
+        pass
+
+    @abstractmethod
+    def stream_users(self) -> Tuple[Iterator[Row], int]:
+        """Streams the ID and name of all users as column rows."""
+        pass
+
+    @abstractmethod
+    def stream_user_movies(self, user_id: int) -> Tuple[Union[Iterator[Row], dict], int]:
+        """Streams the movies of a user as column rows."""
         pass
 
     @abstractmethod
@@ -25,19 +63,36 @@ class DataManagerInterface(ABC):
         """Deletes a user and all related user-movie associations."""
         pass
 
+    @abstractmethod
+    def delete_orphan_movies(self) -> Tuple[dict, int]:
+        """Deletes all movies which are not linked to any user."""
+        pass
+
     @abstractmethod
     def get_all_movies(self) -> Tuple[Union[List[Movie], dict], int]:
         """Returns a list of all movie entries."""
         pass
 
+    @abstractmethod
+    def get_all_movies_page(self, order_by: str = 'title', after: Optional[str] = None,
+                            before: Optional[str] = None, limit: int = 50) -> Tuple[dict, int]:
+        """Returns one keyset paginated page of all movies with next / prev cursors."""
+        pass
+
     @abstractmethod
     def add_movie(self, movie: Movie, user_id: int) -> Tuple[dict, int]:
         """Adds a movie to the database."""
         pass
 
     @abstractmethod
-    def update_movie(self, movie: Movie, rating: float) -> Tuple[Union[str, dict], int]:
-        """Updates the rating of an existing movie in the database."""
+    def bulk_add_movies(self, user_id: int, movies: List[dict]) -> Tuple[dict, int]:
+        """Adds many movies to a user's collection in a single transaction."""
+        pass
+
+    @abstractmethod
+    def update_movie(self, user_id: int, movie_id: int,
+                     rating: float) -> Tuple[Union[str, dict], int]:
+        """Updates a user's personal rating of a movie and the movie's rating aggregate."""
         pass
 
     @abstractmethod
@@ -60,6 +115,108 @@ class DataManagerInterface(ABC):
         """Gets a movie by movie ID."""
         pass
 
+    @abstractmethod
+    def get_user_rating(self, user_id: int, movie_id: int) -> Tuple[Union[float, None, dict], int]:
+        """Gets a user's personal rating of a movie, None if not rated yet."""
+        pass
+
+    @abstractmethod
+    def get_movie_rating(self, movie_id: int) -> Tuple[dict, int]:
+        """Gets the precomputed count, mean and histogram of a movie's user ratings."""
+        pass
+
+    @abstractmethod
+    def get_most_collected_movies(self, limit: int = 10) -> Tuple[Union[List[Row], dict], int]:
+        """Returns the movies in the most collections from the summary table."""
+        pass
+
+    @abstractmethod
+    def get_top_rated_movies(self, limit: int = 10,
+                             min_ratings: int = 1) -> Tuple[Union[List[Row], dict], int]:
+        """Returns the movies with the best average user rating."""
+        pass
+
+    @abstractmethod
+    def get_top_directors(self, limit: int = 10) -> Tuple[Union[List[Row], dict], int]:
+        """Returns the directors with the most movies in the catalog."""
+        pass
+
+    @abstractmethod
+    def get_largest_collections(self, limit: int = 10) -> Tuple[Union[List[Row], dict], int]:
+        """Returns the users with the largest collections."""
+        pass
+
+    @abstractmethod
+    def get_movies_per_year(self) -> Tuple[Union[List[Row], dict], int]:
+        """Returns the number of catalog movies per release year."""
+        pass
+
+    @abstractmethod
+    def get_collection_size(self, user_id: int) -> Tuple[Union[int, dict], int]:
+        """Returns the number of movies in a user's collection."""
+        pass
+
+    @abstractmethod
+    def rebuild_summaries(self) -> Tuple[dict, int]:
+        """Recomputes the summary tables and rating aggregates from scratch."""
+        pass
+
+    @abstractmethod
+    def update_movie_metadata(self, movie_id: int, rating: Optional[float] = None,
+                              poster: Optional[str] = None) -> Tuple[dict, int]:
+        """Updates the IMDb rating and poster of a movie with OMDb data, CLEAR removes a value."""
+        pass
+
+    @abstractmethod
+    def enqueue_job(self, kind: str, movie_id: Optional[int] = None, title: Optional[str] = None,
+                    batch: Optional[str] = None) -> Tuple[dict, int]:
+        """Queues a background job."""
+        pass
+
+    @abstractmethod
+    def enqueue_refresh(self, batch: str,
+                        older_than: Optional[timedelta] = None) -> Tuple[dict, int]:
+        """Queues refresh jobs for all movies not refreshed recently."""
+        pass
+
+    @abstractmethod
+    def claim_job(self, lease_seconds: int = 120,
+                  max_attempts: int = 3) -> Tuple[Union[Row, None, dict], int]:
+        """Claims the next due background job for a worker."""
+        pass
+
+    @abstractmethod
+    def finish_job(self, job_id: int, lease: datetime, error: Optional[str] = None,
+                   retry_in: Optional[float] = None) -> Tuple[Union[str, dict], int]:
+        """Marks a job claimed with the given lease as done, as failed or queues it again."""
+        pass
+
+    @abstractmethod
+    def get_job(self, job_id: int) -> Tuple[Union[Row, dict], int]:
+        """Gets a background job."""
+        pass
+
+    @abstractmethod
+    def get_job_progress(self, batch: str) -> Tuple[dict, int]:
+        """Counts the jobs of a batch per status."""
+        pass
+
+    @abstractmethod
+    def delete_finished_jobs(self, older_than: timedelta) -> Tuple[dict, int]:
+        """Deletes done and failed jobs finished before a cutoff."""
+        pass
+
+    @abstractmethod
+    def take_rate_token(self, name: str, rate: float,
+                        burst: float) -> Tuple[Union[float, dict], int]:
+        """Takes a token from a shared token bucket, returns the seconds to wait if none is left."""
+        pass
+
+    @abstractmethod
+    def get_data_version(self, key: str) -> Tuple[dict, int]:
+        """Returns the version counter and last change time of the user list or a collection."""
+        pass
+
     @abstractmethod
     def get_user_by_name(self, username: str) -> Tuple[Union[User, dict], int]:
         """Gets a user by name."""
@@ -0,0 +1,170 @@
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from concurrent.futures import Future
+import threading
+import queue
+import time
+
+ERROR_RESULT = ({'error': 'Sorry, something went wrong while processing your request. '
+                          'Please try again in a few moments.'}, 500)
+# Result of a write losing a race on a unique constraint against a concurrent write
+CONFLICT_RESULT = ({'error': 'The data was changed by another request at the same time. '
+                             'Please try again.'}, 409)
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread committing the writes of concurrent requests
+    together. Callers block until the transaction containing their write
+    is committed and get the result of their own operation, e.g. a 409 or
+    404 of a failed check, while the successful writes of the batch share
+    one commit. Every operation runs in its own savepoint, so a failing
+    operation only rolls back its own writes and only its caller gets the
+    error. If the commit fails, the batch is rolled back and every
+    operation is retried in its own transaction.
+    """
+
+    def __init__(self, app, db, max_batch=64, max_delay=0.002):
+        """
+        :param app: Flask app, every batch runs in its own app context.
+        :param db: Flask-SQLAlchemy extension of the data manager.
+        :param max_batch: Maximum number of operations per transaction.
+        :param max_delay: Seconds the writer waits for further operations
+                          after the first one of a batch arrived.
+        """
+        self.app = app
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {'operations': 0, 'batches': 0, 'fallbacks': 0}
+
+    def submit(self, operation, *args):
+        """
+        Queues a write operation and waits until it is committed.
+        :param operation: Callable running inside the writer's transaction
+                          without committing and returning (result, status).
+                          It has to return errors before writing anything.
+        :return: Tuple of the operation's result and status.
+        """
+        self._start()
+        future = Future()
+        self._queue.put((operation, args, future))
+        return future.result()
+
+    def stats(self):
+        """Returns the number of operations, batches and failed batches."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['operations_per_batch'] = (stats['operations'] / stats['batches']
+                                         if stats['batches'] else 0.0)
+        return stats
+
+    def _start(self):
+        """Starts the writer thread on first use."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Collects operations into batches until max_batch or max_delay is reached."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self.app.app_context():
+                # callers read their objects, e.g. the ID of a new user, after the commit
+                self.db.session().expire_on_commit = False
+                try:
+                    self._commit_batch(batch)
+                except Exception as error:
+                    for _operation, _args, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+
+    def _commit_batch(self, batch):
+        """Runs all operations of a batch in one transaction and resolves their futures."""
+        session = self.db.session
+        self._begin(session)
+        results = [self._run_savepoint(operation, args) for operation, args, _future in batch]
+        try:
+            session.commit()
+        except SQLAlchemyError:
+            session.rollback()
+            with self._lock:
+                self._counters['fallbacks'] += 1
+            results = [self._commit_one(operation, args) for operation, args, _future in batch]
+        with self._lock:
+            self._counters['operations'] += len(batch)
+            self._counters['batches'] += 1
+        for (_operation, _args, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _begin(session):
+        """
+        Opens the batch transaction with an explicit BEGIN. pysqlite only
+        begins a transaction before DML, so the first SAVEPOINT would
+        start it and its RELEASE would commit the operation on its own.
+        """
+        connection = session.connection()
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN')
+
+    def _run_savepoint(self, operation, args):
+        """
+        Runs a single operation in a savepoint of the batch transaction.
+        :return: (result, status) or the exception raised by the operation.
+        """
+        savepoint = self.db.session.begin_nested()
+        try:
+            result, status = operation(*args)
+        except IntegrityError:
+            savepoint.rollback()
+            return CONFLICT_RESULT
+        except SQLAlchemyError:
+            savepoint.rollback()
+            return ERROR_RESULT
+        except Exception as error:
+            savepoint.rollback()
+            return error
+        if status == 200:
+            savepoint.commit()
+        else:
+            savepoint.rollback()
+        return result, status
+
+    def _commit_one(self, operation, args):
+        """
+        Runs a single operation in its own transaction.
+        :return: (result, status) or the exception raised by the operation.
+        """
+        session = self.db.session
+        try:
+            result, status = operation(*args)
+            if status == 200:
+                session.commit()
+            else:
+                session.rollback()
+            return result, status
+        except IntegrityError:
+            session.rollback()
+            return CONFLICT_RESULT
+        except SQLAlchemyError:
+            session.rollback()
+            return ERROR_RESULT
+        except Exception as error:
+            session.rollback()
+            return error
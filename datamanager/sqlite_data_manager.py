@@ -1,15 +1,199 @@
-from datamanager.data_manager_interface import DataManagerInterface
-from data_models import db, User, Movie, UserMovies
-from sqlalchemy.exc import SQLAlchemyError
+from datamanager.data_manager_interface import DataManagerInterface, CLEAR
+from datamanager.group_commit import GroupCommitWriter, CONFLICT_RESULT
+from data_models import (db, User, Movie, UserMovies, DataVersion, MovieRating, MovieRatingBucket,
+                         MovieSummary, UserSummary, YearSummary, DirectorSummary, SUMMARY_REBUILD,
+                         Job, RateLimit)
+from sqlalchemy import (tuple_, func, select, delete, update, event, text, cast, literal,
+                        Integer)
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from datetime import datetime, timedelta, timezone
+import base64
+import binascii
+import json
+import time
+
+# Pragmas applied to every new SQLite connection, selected by app.config['SQLITE_PROFILE']
+SQLITE_PROFILES = {
+    'default': {},
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -20000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Pool settings for file databases, app.config['SQLALCHEMY_ENGINE_OPTIONS'] takes precedence
+SQLITE_POOL_OPTIONS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+}
+
+# Columns rendered by user_movies.html, loaded as plain rows instead of ORM objects
+USER_MOVIE_COLUMNS = (Movie.id, Movie.title, Movie.director, Movie.year,
+                      Movie.rating, Movie.poster, UserMovies.rating.label('user_rating'))
+
+# Mean user rating, written exactly like the expression of ix_movie_ratings_mean
+AVERAGE_RATING = MovieRating.rating_sum / MovieRating.rating_count
+
+# Catalog columns with the precomputed user rating aggregate, None for unrated movies
+CATALOG_COLUMNS = (Movie.id, Movie.title, Movie.director, Movie.year,
+                   Movie.rating, Movie.poster, MovieRating.rating_count,
+                   AVERAGE_RATING.label('average_rating'))
+
+# SQL counterpart of MovieRatingBucket.of for set-based histogram updates
+RATING_BUCKET = func.min(func.max(cast(UserMovies.rating, Integer), 0),
+                         MovieRatingBucket.BUCKETS - 1)
+
+# Supported sort orders for a user's collection, id breaks ties
+MOVIE_ORDERINGS = {
+    'added': (UserMovies.id,),
+    'title': (Movie.title, Movie.id),
+    'year': (Movie.year, Movie.id),
+}
+
+# Sort orders usable for keyset pagination, every key ends on the unique movie id
+# and matches an index, so a page seeks in it instead of sorting all rows
+PAGE_ORDERINGS = {
+    'title': (Movie.title, Movie.id),
+    'year': (Movie.year, Movie.id),
+}
+
+# Collection pages sort on the copies of title and year on the links,
+# or in the order the movies were added
+LINK_ID = UserMovies.id.label('link_id')
+USER_PAGE_ORDERINGS = {
+    'title': (UserMovies.title, UserMovies.movie_id),
+    'year': (UserMovies.year, UserMovies.movie_id),
+    'added': (LINK_ID,),
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Number of titles per IN (...) lookup during bulk imports
+BULK_CHUNK_SIZE = 500
+
+# Rows fetched per round trip while streaming exports
+EXPORT_BATCH_SIZE = 1000
+
+# Search results are ranked by bm25, a title match weighs ten times a director match
+SEARCH_MOVIES_SQL = text(
+    "SELECT movies.id, movies.title, movies.director, movies.year, movies.rating, movies.poster, "
+    "movie_ratings.rating_count, "
+    "movie_ratings.rating_sum / movie_ratings.rating_count AS average_rating "
+    "FROM movies_fts JOIN movies ON movies.id = movies_fts.rowid "
+    "LEFT JOIN movie_ratings ON movie_ratings.movie_id = movies.id "
+    "WHERE movies_fts MATCH :query "
+    "ORDER BY bm25(movies_fts, 10.0, 1.0), movies.title LIMIT :limit")
+MAX_SEARCH_RESULTS = 50
+
+MAX_USER_SUGGESTIONS = 50
+
+# Maximum number of rows returned by the top-N statistics
+MAX_STATS_LIMIT = 100
+
+# Background job kinds processed by jobs.JobWorker
+JOB_KINDS = ('lookup', 'enrich', 'refresh')
+JOB_COLUMNS = (Job.id, Job.kind, Job.movie_id, Job.title, Job.batch,
+               Job.status, Job.attempts, Job.error, Job.locked_until)
+
+EXPORT_COLUMNS = (User.name.label('user'), Movie.title, Movie.director,
+                  Movie.year, Movie.rating, Movie.poster,
+                  UserMovies.rating.label('user_rating'))
+
+
+def utc_now():
+    """Returns the current UTC time as naive datetime, as stored in the DateTime columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def build_search_query(search):
+    """
+    Builds an FTS5 prefix query from user input, every word has to match
+    the beginning of a word in the title or the director.
+    :param search: Search text as String.
+    :return: FTS5 MATCH expression or None if the text contains no words.
+    """
+    words = [word for word in search.replace('"', ' ').split() if word]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def encode_cursor(values):
+    """Encodes the sort key values of a row as an opaque URL safe cursor."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key_length):
+    """
+    Decodes a cursor created by encode_cursor.
+    :param cursor: Cursor string from the query parameters.
+    :param key_length: Number of sort key columns the cursor must contain.
+    :return: List of sort key values or None if the cursor is invalid.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != key_length:
+        return None
+    if not all(value is None or (isinstance(value, (str, int, float))
+                                 and not isinstance(value, bool)) for value in values):
+        return None
+    return values
 
 
 class SQLiteDataManager(DataManagerInterface):
     """Handles all database operations using SQLAlchemy."""
 
     def __init__(self, app):
-        """Initializes the database for the Flask app."""
+        """
+        Initializes the database for the Flask app and applies the SQLite
+        tuning profile named by app.config['SQLITE_PROFILE'] ('wal' by default).
+        app.config['SQLITE_PRAGMAS'] overrides single pragmas of the profile.
+        app.config['SQLITE_GROUP_COMMIT'] commits the writes of concurrent
+        requests together, batches are limited by SQLITE_GROUP_COMMIT_SIZE
+        operations and SQLITE_GROUP_COMMIT_DELAY seconds.
+        """
+        profile = app.config.get('SQLITE_PROFILE', 'wal')
+        if profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite profile '{profile}'.")
+        pragmas = {**SQLITE_PROFILES[profile], **app.config.get('SQLITE_PRAGMAS', {})}
+
+        database = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+        if database and database != ':memory:':
+            engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+            for option, value in SQLITE_POOL_OPTIONS.items():
+                engine_options.setdefault(option, value)
+
         db.init_app(app)
         self.db = db
+        with app.app_context():
+            event.listen(self.db.engine, 'connect',
+                         lambda connection, _record: self._apply_pragmas(connection, pragmas))
+
+        self.group_commit = None
+        if app.config.get('SQLITE_GROUP_COMMIT'):
+            self.group_commit = GroupCommitWriter(
+                app, self.db, max_batch=app.config.get('SQLITE_GROUP_COMMIT_SIZE', 64),
+                max_delay=app.config.get('SQLITE_GROUP_COMMIT_DELAY', 0.002))
+
+    @staticmethod
+    def _apply_pragmas(connection, pragmas):
+        """Runs the PRAGMA statements of the tuning profile on a new connection."""
+        cursor = connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        cursor.close()
 
     def commit_only(self):
         """Commits the current database session."""
@@ -21,6 +205,167 @@ class SQLiteDataManager(DataManagerInterface):
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
+    def _write(self, operation, *args):
+        """
+        Runs a write operation and commits it, or hands it to the group
+        commit writer which commits it together with concurrent writes.
+        Operations run inside the current transaction without committing
+        and return their errors before they write anything.
+        :param operation: Method taking args and returning (result, status).
+        :return: Tuple of the operation's result and status.
+        """
+        if self.group_commit is not None:
+            return self.group_commit.submit(operation, *args)
+        try:
+            result, status = operation(*args)
+        except IntegrityError:
+            self.db.session.rollback()
+            return CONFLICT_RESULT
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+        if status != 200:
+            self.db.session.rollback()
+            return result, status
+        message, status = self.commit_only()
+        if status != 200:
+            return message, status
+        return result, status
+
+    def _bump_versions(self, *keys):
+        """
+        Increments the version counters of the given views inside the
+        current transaction, the caller commits.
+        """
+        keys = list(dict.fromkeys(keys))
+        now = utc_now()
+        for start in range(0, len(keys), BULK_CHUNK_SIZE):
+            statement = insert(DataVersion).values(
+                [{'key': key, 'version': 1, 'updated_at': now}
+                 for key in keys[start:start + BULK_CHUNK_SIZE]])
+            statement = statement.on_conflict_do_update(
+                index_elements=['key'],
+                set_={'version': DataVersion.version + 1,
+                      'updated_at': statement.excluded.updated_at})
+            self.db.session.execute(statement)
+
+    def _change_rating(self, movie_id, old_rating, new_rating):
+        """
+        Applies the change of one user rating to the rating aggregate and
+        histogram of a movie inside the current transaction, the caller
+        commits. None stands for no rating.
+        """
+        if old_rating == new_rating:
+            return
+        bucket_changes = {}
+        if old_rating is not None:
+            bucket_changes[MovieRatingBucket.of(old_rating)] = -1
+        if new_rating is not None:
+            bucket = MovieRatingBucket.of(new_rating)
+            bucket_changes[bucket] = bucket_changes.get(bucket, 0) + 1
+
+        statement = insert(MovieRating).values(
+            movie_id=movie_id,
+            rating_count=(new_rating is not None) - (old_rating is not None),
+            rating_sum=(new_rating or 0.0) - (old_rating or 0.0))
+        statement = statement.on_conflict_do_update(
+            index_elements=['movie_id'],
+            set_={'rating_count': MovieRating.rating_count + statement.excluded.rating_count,
+                  'rating_sum': MovieRating.rating_sum + statement.excluded.rating_sum})
+        self.db.session.execute(statement)
+
+        buckets = [{'movie_id': movie_id, 'bucket': bucket, 'rating_count': change}
+                   for bucket, change in bucket_changes.items() if change]
+        if buckets:
+            statement = insert(MovieRatingBucket).values(buckets)
+            statement = statement.on_conflict_do_update(
+                index_elements=['movie_id', 'bucket'],
+                set_={'rating_count': (MovieRatingBucket.rating_count
+                                       + statement.excluded.rating_count)})
+            self.db.session.execute(statement)
+        if old_rating is not None:
+            self._drop_empty_ratings([movie_id])
+
+    def _add_ratings(self, ratings):
+        """
+        Adds new user ratings to the rating aggregates and histograms with
+        one upsert per chunk inside the current transaction, the caller commits.
+        :param ratings: List of (movie_id, rating) tuples.
+        """
+        aggregates = {}
+        buckets = {}
+        for movie_id, rating in ratings:
+            count, total = aggregates.get(movie_id, (0, 0.0))
+            aggregates[movie_id] = (count + 1, total + rating)
+            key = (movie_id, MovieRatingBucket.of(rating))
+            buckets[key] = buckets.get(key, 0) + 1
+
+        aggregates = [{'movie_id': movie_id, 'rating_count': count, 'rating_sum': total}
+                      for movie_id, (count, total) in aggregates.items()]
+        for start in range(0, len(aggregates), BULK_CHUNK_SIZE):
+            statement = insert(MovieRating).values(aggregates[start:start + BULK_CHUNK_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=['movie_id'],
+                set_={'rating_count': MovieRating.rating_count + statement.excluded.rating_count,
+                      'rating_sum': MovieRating.rating_sum + statement.excluded.rating_sum})
+            self.db.session.execute(statement)
+
+        buckets = [{'movie_id': movie_id, 'bucket': bucket, 'rating_count': count}
+                   for (movie_id, bucket), count in buckets.items()]
+        for start in range(0, len(buckets), BULK_CHUNK_SIZE):
+            statement = insert(MovieRatingBucket).values(buckets[start:start + BULK_CHUNK_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=['movie_id', 'bucket'],
+                set_={'rating_count': (MovieRatingBucket.rating_count
+                                       + statement.excluded.rating_count)})
+            self.db.session.execute(statement)
+
+    def _remove_user_ratings(self, user_id):
+        """
+        Subtracts all ratings of a user from the movie aggregates with
+        set-based updates inside the current transaction, the caller commits.
+        """
+        rated_links = (UserMovies.user_id == user_id, UserMovies.rating.is_not(None))
+        self.db.session.execute(
+            update(MovieRating)
+            .where(MovieRating.movie_id == UserMovies.movie_id, *rated_links)
+            .values(rating_count=MovieRating.rating_count - 1,
+                    rating_sum=MovieRating.rating_sum - UserMovies.rating),
+            execution_options={'synchronize_session': False})
+        self.db.session.execute(
+            update(MovieRatingBucket)
+            .where(MovieRatingBucket.movie_id == UserMovies.movie_id,
+                   MovieRatingBucket.bucket == RATING_BUCKET, *rated_links)
+            .values(rating_count=MovieRatingBucket.rating_count - 1),
+            execution_options={'synchronize_session': False})
+        self._drop_empty_ratings(select(UserMovies.movie_id).where(*rated_links))
+
+    def _drop_empty_ratings(self, movie_ids):
+        """Deletes the aggregate and histogram rows left without ratings for the given movies."""
+        self.db.session.execute(
+            delete(MovieRatingBucket).where(MovieRatingBucket.movie_id.in_(movie_ids),
+                                            MovieRatingBucket.rating_count <= 0),
+            execution_options={'synchronize_session': False})
+        self.db.session.execute(
+            delete(MovieRating).where(MovieRating.movie_id.in_(movie_ids),
+                                      MovieRating.rating_count <= 0),
+            execution_options={'synchronize_session': False})
+
+    def get_data_version(self, key):
+        """
+        Returns the version counter and last change time of a view.
+        Views which were never written have version 0.
+        """
+        try:
+            version = self.db.session.get(DataVersion, key)
+            if not version:
+                return {'version': 0, 'updated_at': None}, 200
+            return {'version': version.version, 'updated_at': version.updated_at}, 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
     def add_element(self, element):
         """Adds a generic element to the session and commits it."""
         try:
@@ -38,52 +383,291 @@ class SQLiteDataManager(DataManagerInterface):
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
-    def get_user_movies(self, user_id):
-        """Returns all movies associated with a given user ID."""
+    def search_users(self, prefix, limit=10):
+        """
+        Finds users whose name starts with a prefix, ignoring case, for
+        the autocomplete. The LIKE pattern is a range scan of
+        ix_user_name_nocase, so the cost does not grow with the number of users.
+        :param prefix: Beginning of the username as String.
+        :param limit: Maximum number of results.
+        :return: List of rows with id and name, ordered by name.
+        """
+        if not isinstance(limit, int) or not 0 < limit <= MAX_USER_SUGGESTIONS:
+            return {'error': f"Limit must be between 1 and {MAX_USER_SUGGESTIONS}."}, 400
+        prefix = (prefix or '').strip()
+        if not prefix:
+            return [], 200
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
         try:
-            user = self.db.session.get(User, user_id)
-            if not user:
+            return (self.db.session.query(User.id, User.name)
+                    .filter(User.name.like(pattern, escape='\\'))
+                    .order_by(User.name.collate('NOCASE'))
+                    .limit(limit)
+                    .all()), 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def get_user_movies(self, user_id, order_by='added'):
+        """
+        Returns all movies associated with a given user ID.
+        The user and the collection are loaded in one joined query,
+        the user row is outer joined so an empty collection can be
+        told apart from a missing user.
+        """
+        if order_by not in MOVIE_ORDERINGS:
+            return {'error': f"Invalid sort order '{order_by}'."}, 400
+        try:
+            rows = (self.db.session.query(*USER_MOVIE_COLUMNS)
+                    .select_from(User)
+                    .outerjoin(UserMovies, UserMovies.user_id == User.id)
+                    .outerjoin(Movie, Movie.id == UserMovies.movie_id)
+                    .filter(User.id == user_id)
+                    .order_by(*MOVIE_ORDERINGS[order_by])
+                    .all())
+            if not rows:
                 return {'error': "User does not exist."}, 404
-            return [entry.movies for entry in user.user_movies], 200
+            return [row for row in rows if row.id is not None], 200
         except SQLAlchemyError:
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
-    def add_user(self, user):
-        """Adds a new user object to the database."""
+    def get_user_movies_page(self, user_id, order_by='title', after=None,
+                             before=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns one page of a user's movies using keyset pagination.
+        :return: Dict with the page rows and the 'next' / 'prev' cursors.
+        """
+        query = (self.db.session.query(*USER_MOVIE_COLUMNS, UserMovies.movie_id, LINK_ID)
+                 .select_from(UserMovies)
+                 .join(Movie, Movie.id == UserMovies.movie_id)
+                 .filter(UserMovies.user_id == user_id))
+        try:
+            page, status = self._keyset_page(query, order_by, after, before, limit,
+                                             USER_PAGE_ORDERINGS)
+            if status == 200 and not page['movies'] and not self.db.session.get(User, user_id):
+                return {'error': "User does not exist."}, 404
+            return page, status
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def get_all_movies_page(self, order_by='title', after=None,
+                            before=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns one page of all movies with their average user rating
+        using keyset pagination.
+        :return: Dict with the page rows and the 'next' / 'prev' cursors.
+        """
+        query = (self.db.session.query(*CATALOG_COLUMNS)
+                 .select_from(Movie)
+                 .outerjoin(MovieRating, MovieRating.movie_id == Movie.id))
+        try:
+            return self._keyset_page(query, order_by, after, before, limit)
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    @staticmethod
+    def _keyset_page(query, order_by, after, before, limit, orderings=PAGE_ORDERINGS):
+        """
+        Seeks to the cursor position and fetches one page plus a single
+        look-ahead row, so the cost stays proportional to the page size
+        no matter how deep the page is.
+        :param orderings: Sort orders supported by the query.
+        """
+        if order_by not in orderings:
+            return {'error': f"Invalid sort order '{order_by}'."}, 400
+        if not isinstance(limit, int) or not 0 < limit <= MAX_PAGE_SIZE:
+            return {'error': f"Limit must be between 1 and {MAX_PAGE_SIZE}."}, 400
+        if after and before:
+            return {'error': "Use either 'after' or 'before', not both."}, 400
+
+        columns = orderings[order_by]
+        cursor = after or before
+        position = None
+        if cursor:
+            position = decode_cursor(cursor, len(columns))
+            if position is None:
+                return {'error': 'Invalid page cursor.'}, 400
+
+        if before:
+            query = (query.filter(tuple_(*columns) < tuple_(*position))
+                     .order_by(*(column.desc() for column in columns)))
+        else:
+            if after:
+                query = query.filter(tuple_(*columns) > tuple_(*position))
+            query = query.order_by(*columns)
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+
+        def row_cursor(row):
+            return encode_cursor(getattr(row, column.key) for column in columns)
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if has_more or before:
+                next_cursor = row_cursor(rows[-1])
+            if after or (before and has_more):
+                prev_cursor = row_cursor(rows[0])
+        return {'movies': rows, 'next': next_cursor, 'prev': prev_cursor}, 200
+
+    def search_movies(self, search, limit=20):
+        """
+        Searches the local movie catalog by title and director with prefix
+        matching, best matches first.
+        :param search: Search text as String.
+        :param limit: Maximum number of results.
+        :return: List of movie rows including rating_count and average_rating.
+        """
+        if not isinstance(limit, int) or not 0 < limit <= MAX_SEARCH_RESULTS:
+            return {'error': f"Limit must be between 1 and {MAX_SEARCH_RESULTS}."}, 400
+        query = build_search_query(search or '')
+        if query is None:
+            return [], 200
         try:
-            existing_user = self.db.session.query(User).filter_by(name=user.name).first()
-            if existing_user:
-                return {"error": f"User '{user.name}' already exists."}, 409
-            return self.add_element(user)
+            return self.db.session.execute(SEARCH_MOVIES_SQL,
+                                           {'query': query, 'limit': limit}).all(), 200
         except SQLAlchemyError:
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
+    def export_movies(self, user_id=None):
+        """
+        Streams the movies of one user or of all users for exports.
+        Rows are fetched in batches of EXPORT_BATCH_SIZE while the
+        iterator is consumed, so memory stays flat for any collection size.
+        :param user_id: ID of the user to export, None exports all users.
+        :return: Iterator over rows with the columns user, title, director,
+                 year, rating, poster and user_rating.
+        """
+        try:
+            if user_id is not None and not self.db.session.get(User, user_id):
+                return {'error': "User does not exist."}, 404
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+        statement = (select(*EXPORT_COLUMNS)
+                     .join(UserMovies, UserMovies.user_id == User.id)
+                     .join(Movie, Movie.id == UserMovies.movie_id)
+                     .order_by(UserMovies.user_id, UserMovies.id)
+                     .execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if user_id is not None:
+            statement = statement.where(UserMovies.user_id == user_id)
+
+        def rows():
+            yield from self.db.session.execute(statement)
+
+        return rows(), 200
+
+    def stream_users(self):
+        """
+        Streams the ID and name of all users ordered by ID. Rows are
+        fetched in batches of EXPORT_BATCH_SIZE while the iterator is consumed.
+        :return: Iterator over rows with the columns id and name.
+        """
+        statement = (select(User.id, User.name).order_by(User.id)
+                     .execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        def rows():
+            yield from self.db.session.execute(statement)
+
+        return rows(), 200
+
+    def stream_user_movies(self, user_id):
+        """
+        Streams the movies of a user ordered by title. Rows are fetched in
+        batches of EXPORT_BATCH_SIZE while the iterator is consumed.
+        :return: Iterator over rows with the columns of USER_MOVIE_COLUMNS.
+        """
+        try:
+            if not self.db.session.get(User, user_id):
+                return {'error': "User does not exist."}, 404
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+        statement = (select(*USER_MOVIE_COLUMNS)
+                     .select_from(Movie)
+                     .join(UserMovies, UserMovies.movie_id == Movie.id)
+                     .where(UserMovies.user_id == user_id)
+                     .order_by(*PAGE_ORDERINGS['title'])
+                     .execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        def rows():
+            yield from self.db.session.execute(statement)
+
+        return rows(), 200
+
+    def add_user(self, user):
+        """Adds a new user object to the database."""
+        return self._write(self._apply_add_user, user)
+
+    def _apply_add_user(self, user):
+        """Adds a user inside the current transaction, the caller commits."""
+        existing_user = self.db.session.query(User.id).filter_by(name=user.name).first()
+        if existing_user:
+            return {"error": f"User '{user.name}' already exists."}, 409
+        self.db.session.add(user)
+        self.db.session.flush()
+        return {'message': 'User added', 'user_id': user.id}, 200
+
     def delete_user(self, user_id):
-        """Deletes a user and all related user-movie associations."""
+        """
+        Deletes a user and all related user-movie associations.
+        The user's ratings are subtracted from the movie aggregates, then
+        movies only this user collected are deleted, then the links and
+        the user, each as set-based statements in one transaction.
+        """
+        return self._write(self._apply_delete_user, user_id)
+
+    def _apply_delete_user(self, user_id):
+        """Deletes a user inside the current transaction, the caller commits."""
+        if not self.db.session.query(User.id).filter_by(id=user_id).scalar():
+            return {'error': 'User not found'}, 404
+        other_links = (select(UserMovies.id)
+                       .where(UserMovies.movie_id == Movie.id,
+                              UserMovies.user_id != user_id)
+                       .exists())
+        user_movie_ids = select(UserMovies.movie_id).where(UserMovies.user_id == user_id)
+        self._remove_user_ratings(user_id)
+        self.db.session.execute(
+            delete(Movie).where(Movie.id.in_(user_movie_ids), ~other_links),
+            execution_options={'synchronize_session': False})
+        self.db.session.execute(
+            delete(UserMovies).where(UserMovies.user_id == user_id),
+            execution_options={'synchronize_session': False})
+        self.db.session.execute(
+            delete(User).where(User.id == user_id),
+            execution_options={'synchronize_session': False})
+        self._bump_versions(DataVersion.user(user_id))
+        return {'message': 'User deleted'}, 200
+
+    def delete_orphan_movies(self):
+        """
+        Deletes all movies which are not linked to any user anymore,
+        e.g. left behind by writes outside of this data manager.
+        :return: Dict with the number of deleted movies.
+        """
         try:
-            user = self.db.session.get(User, user_id)
-            if not user:
-                return {'error': 'User not found'}, 404
-            connection = self.db.session.query(UserMovies).filter_by(user_id=user_id).all()
-            if connection:
-                connected_movies = [movie_connection.movie_id for movie_connection in connection]
-                for link in connection:
-                    self.db.session.delete(link)
-                for movie_id in connected_movies:
-                    if not self.db.session.query(UserMovies).filter_by(movie_id=movie_id).first():
-                        movie = self.db.session.get(Movie, movie_id)
-                        if movie:
-                            self.db.session.delete(movie)
-            self.db.session.delete(user)
+            linked = select(UserMovies.id).where(UserMovies.movie_id == Movie.id).exists()
+            deleted = self.db.session.execute(
+                delete(Movie).where(~linked),
+                execution_options={'synchronize_session': False}).rowcount
             result, status = self.commit_only()
             if status == 200:
-                return {'message': 'User deleted'}, 200
+                return {'message': f'{deleted} orphaned movies deleted', 'deleted': deleted}, 200
             return result, status
         except SQLAlchemyError:
+            self.db.session.rollback()
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
+
     def get_all_movies(self):
         """Returns a list of all movie entries."""
         try:
@@ -93,54 +677,189 @@ class SQLiteDataManager(DataManagerInterface):
                              'Please try again in a few moments.'}, 500
 
     def add_movie(self, movie, user_id):
-        """Adds a movie to the database."""
+        """
+        Adds a movie to the database and links it to a user in one transaction.
+        :return: Dict with the ID of the new or existing movie, 404 if the user does not exist.
+        """
+        return self._write(self._apply_add_movie, movie, user_id)
+
+    def _apply_add_movie(self, movie, user_id):
+        """Adds a movie and its link inside the current transaction, the caller commits."""
+        if not self.db.session.get(User, user_id):
+            return {'error': "User does not exist."}, 404
+        existing_movie = (self.db.session.query(Movie.id)
+                          .filter_by(title=movie.title).first())
+        if existing_movie:
+            movie_id = existing_movie.id
+            connection = (self.db.session.query(UserMovies.id)
+                          .filter_by(user_id=user_id, movie_id=movie_id).first())
+            if connection:
+                return {"error": f"Movie '{movie.title}' already exists."}, 409
+        else:
+            self.db.session.add(movie)
+            self.db.session.flush()
+            movie_id = movie.id
+        self.db.session.add(UserMovies(user_id=user_id, movie_id=movie_id))
+        self.db.session.flush()
+        self._bump_versions(DataVersion.user(user_id))
+        return {'message': 'Movie added', 'movie_id': movie_id}, 200
+
+    def bulk_add_movies(self, user_id, movies):
+        """
+        Adds many movies to a user's collection in a single transaction.
+        Movies whose title already exists are linked instead of inserted,
+        movies already in the collection are skipped and keep their rating.
+        :param user_id: ID of the user the movies are added for.
+        :param movies: List of dicts with the keys title, director, year
+                       and the optional keys rating, poster and user_rating,
+                       the user's personal rating.
+        :return: Dict with the number of added and skipped movies.
+        """
+        rows = {}
+        user_ratings = {}
+        for number, movie in enumerate(movies, start=1):
+            if (not isinstance(movie, dict) or not movie.get('title')
+                    or not movie.get('director') or not isinstance(movie.get('year'), int)):
+                return {'error': f'Movie {number} needs a title, a director and a year.'}, 400
+            rating = movie.get('rating')
+            if rating is not None and not isinstance(rating, float):
+                return {'error': f'Rating of movie {number} has to be a float.'}, 400
+            user_rating = movie.get('user_rating')
+            if user_rating is not None and not isinstance(user_rating, float):
+                return {'error': f'User rating of movie {number} has to be a float.'}, 400
+            if movie['title'] not in rows:
+                rows[movie['title']] = {'title': movie['title'],
+                                        'director': movie['director'],
+                                        'year': movie['year'],
+                                        'rating': rating,
+                                        'poster': movie.get('poster')}
+                user_ratings[movie['title']] = user_rating
+
         try:
-            existing_movie = self.db.session.query(Movie).filter_by(title=movie.title).first()
-            if not existing_movie:
-                self.add_element(movie)
-                existing_movie = movie
-            else:
-                connection = (self.db.session.query(UserMovies)
-                              .filter_by(user_id=user_id, movie_id=existing_movie.id).first())
-                if connection:
-                    return {"error": f"Movie '{movie.title}' already exists."}, 409
-            new_connection = UserMovies(user_id=user_id, movie_id=existing_movie.id)
-            return self.add_element(new_connection)
+            if not self.db.session.get(User, user_id):
+                return {'error': "User does not exist."}, 404
+            count_links = (self.db.session.query(func.count(UserMovies.id))
+                           .filter(UserMovies.user_id == user_id))
+            links_before = count_links.scalar()
+
+            titles = list(rows)
+            if titles:
+                self.db.session.execute(
+                    insert(Movie).on_conflict_do_nothing(index_elements=['title']),
+                    list(rows.values()))
+                links = []
+                for start in range(0, len(titles), BULK_CHUNK_SIZE):
+                    chunk = titles[start:start + BULK_CHUNK_SIZE]
+                    movie_ids = (self.db.session.query(Movie.id, Movie.title)
+                                 .filter(Movie.title.in_(chunk)).all())
+                    links.extend({'user_id': user_id, 'movie_id': movie_id,
+                                  'rating': user_ratings[title]}
+                                 for movie_id, title in movie_ids)
+                # Only inserted links are returned, skipped ones keep their rating
+                inserted = self.db.session.execute(
+                    insert(UserMovies).on_conflict_do_nothing(
+                        index_elements=['user_id', 'movie_id'])
+                    .returning(UserMovies.movie_id, UserMovies.rating),
+                    links).all()
+                self._add_ratings([(movie_id, rating) for movie_id, rating in inserted
+                                   if rating is not None])
+
+            added = count_links.scalar() - links_before
+            if added:
+                self._bump_versions(DataVersion.user(user_id))
+            result, status = self.commit_only()
+            if status == 200:
+                return {'message': f'{added} movies imported',
+                        'added': added, 'skipped': len(movies) - added}, 200
+            return result, status
         except SQLAlchemyError:
+            self.db.session.rollback()
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
-    def update_movie(self, movie, rating):
-        """Updates the rating of an existing movie in the database."""
-        if not isinstance(movie, Movie):
-            return {'error': 'Movie has to be a Movie class instance.'}, 400
+    def update_movie(self, user_id, movie_id, rating):
+        """
+        Updates a user's personal rating of a movie in the collection.
+        The rating aggregate of the movie is updated in the same transaction.
+        """
         if not isinstance(rating, float):
             return {'error': 'Rating has to be a float.'}, 400
+        return self._write(self._apply_update_movie, user_id, movie_id, rating)
 
-        movie.rating = rating
-        message, status = self.commit_only()
-        return message, status
+    def _apply_update_movie(self, user_id, movie_id, rating):
+        """Updates a rating inside the current transaction, the caller commits."""
+        link = (self.db.session.query(UserMovies.id, UserMovies.rating)
+                .filter_by(user_id=user_id, movie_id=movie_id).first())
+        if not link:
+            return {'error': 'Movie not found'}, 404
+        self._change_rating(movie_id, link.rating, rating)
+        self.db.session.execute(
+            update(UserMovies).where(UserMovies.id == link.id).values(rating=rating),
+            execution_options={'synchronize_session': False})
+        self._bump_versions(DataVersion.user(user_id))
+        return {'message': 'Rating updated'}, 200
 
     def delete_movie(self, user_id, movie_id):
-        """Deletes a movie from the database for a user."""
-        movie, result = self.get_movie(movie_id)
-        if result != 200:
+        """
+        Deletes a movie from the database for a user.
+        The user's rating is removed from the movie aggregate and the movie
+        itself is deleted in the same transaction if no other user collected it.
+        """
+        return self._write(self._apply_delete_movie, user_id, movie_id)
+
+    def _apply_delete_movie(self, user_id, movie_id):
+        """Deletes a link and its orphaned movie inside the current transaction, the caller commits."""
+        removed = self.db.session.execute(
+            delete(UserMovies).where(UserMovies.user_id == user_id,
+                                     UserMovies.movie_id == movie_id)
+            .returning(UserMovies.rating),
+            execution_options={'synchronize_session': False}).first()
+        if not removed:
             return {'error': 'Movie not found'}, 404
+        self._change_rating(movie_id, removed.rating, None)
+        further_links = select(UserMovies.id).where(UserMovies.movie_id == movie_id).exists()
+        self.db.session.execute(
+            delete(Movie).where(Movie.id == movie_id, ~further_links),
+            execution_options={'synchronize_session': False})
+        self._bump_versions(DataVersion.user(user_id))
+        return {'message': 'Movie deleted'}, 200
 
+    def get_user_rating(self, user_id, movie_id):
+        """
+        Gets a user's personal rating of a movie in the collection.
+        :return: Rating as float or None if the user did not rate the movie yet.
+        """
         try:
-            connection = (self.db.session.query(UserMovies).filter_by(user_id=user_id,
-                                                                      movie_id=movie_id).first())
-            self.db.session.delete(connection)
-            further_connection = (self.db.session.query(UserMovies)
-                                  .filter_by(movie_id=movie_id).first())
-            if not further_connection:
-                self.db.session.delete(movie)
-            result, status = self.commit_only()
-            if status == 200:
-                return {'message': 'Movie deleted'}, 200
-            return result, status
+            link = (self.db.session.query(UserMovies.rating)
+                    .filter_by(user_id=user_id, movie_id=movie_id).first())
+            if not link:
+                return {'error': 'Movie not found'}, 404
+            return link.rating, 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def get_movie_rating(self, movie_id):
+        """
+        Gets the precomputed user rating aggregate of a movie.
+        :return: Dict with the number of ratings, the mean (None without
+                 ratings) and the histogram as list of counts per bucket.
+        """
+        try:
+            aggregate = self.db.session.get(MovieRating, movie_id)
+            if not aggregate and not self.db.session.get(Movie, movie_id):
+                return {'error': 'Movie not found'}, 404
+            histogram = [0] * MovieRatingBucket.BUCKETS
+            if aggregate:
+                buckets = (self.db.session.query(MovieRatingBucket.bucket,
+                                                 MovieRatingBucket.rating_count)
+                           .filter(MovieRatingBucket.movie_id == movie_id).all())
+                for bucket, count in buckets:
+                    histogram[bucket] = count
+            return {'count': aggregate.rating_count if aggregate else 0,
+                    'mean': aggregate.mean if aggregate else None,
+                    'histogram': histogram}, 200
         except SQLAlchemyError:
-            self.db.session.rollback()
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
@@ -155,6 +874,362 @@ class SQLiteDataManager(DataManagerInterface):
             return {'error': 'Sorry, something went wrong while processing your request. '
                              'Please try again in a few moments.'}, 500
 
+    def get_most_collected_movies(self, limit=10):
+        """
+        Returns the movies in the most collections, read from the summary
+        table index instead of counting the links.
+        :return: List of rows with id, title, director, year and collector_count.
+        """
+        return self._top_rows(
+            select(Movie.id, Movie.title, Movie.director, Movie.year,
+                   MovieSummary.collector_count)
+            .join(Movie, Movie.id == MovieSummary.movie_id)
+            .order_by(MovieSummary.collector_count.desc(), MovieSummary.movie_id), limit)
+
+    def get_top_rated_movies(self, limit=10, min_ratings=1):
+        """
+        Returns the movies with the best average user rating.
+        :param min_ratings: Movies with fewer ratings are left out.
+        :return: List of rows with id, title, director, year, rating_count
+                 and average_rating.
+        """
+        if not isinstance(min_ratings, int) or min_ratings < 1:
+            return {'error': 'Minimum number of ratings must be at least 1.'}, 400
+        return self._top_rows(
+            select(Movie.id, Movie.title, Movie.director, Movie.year,
+                   MovieRating.rating_count, AVERAGE_RATING.label('average_rating'))
+            .join(Movie, Movie.id == MovieRating.movie_id)
+            .where(MovieRating.rating_count >= min_ratings)
+            .order_by(AVERAGE_RATING.desc(), MovieRating.movie_id), limit)
+
+    def get_top_directors(self, limit=10):
+        """
+        Returns the directors with the most movies in the catalog.
+        :return: List of rows with director and movie_count.
+        """
+        return self._top_rows(
+            select(DirectorSummary.director, DirectorSummary.movie_count)
+            .order_by(DirectorSummary.movie_count.desc(), DirectorSummary.director), limit)
+
+    def get_largest_collections(self, limit=10):
+        """
+        Returns the users with the largest collections.
+        :return: List of rows with user_id, name and movie_count.
+        """
+        return self._top_rows(
+            select(UserSummary.user_id, User.name, UserSummary.movie_count)
+            .join(User, User.id == UserSummary.user_id)
+            .order_by(UserSummary.movie_count.desc(), UserSummary.user_id), limit)
+
+    def get_movies_per_year(self):
+        """
+        Returns the number of catalog movies per release year.
+        :return: List of rows with year and movie_count, oldest year first.
+        """
+        try:
+            return self.db.session.execute(
+                select(YearSummary.year, YearSummary.movie_count)
+                .order_by(YearSummary.year)).all(), 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def get_collection_size(self, user_id):
+        """Returns the number of movies in a user's collection."""
+        try:
+            summary = self.db.session.get(UserSummary, user_id)
+            if not summary and not self.db.session.get(User, user_id):
+                return {'error': 'User not found'}, 404
+            return summary.movie_count if summary else 0, 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def _top_rows(self, statement, limit):
+        """Runs a top-N statistics query after validating the limit."""
+        if not isinstance(limit, int) or not 0 < limit <= MAX_STATS_LIMIT:
+            return {'error': f"Limit must be between 1 and {MAX_STATS_LIMIT}."}, 400
+        try:
+            return self.db.session.execute(statement.limit(limit)).all(), 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def rebuild_summaries(self):
+        """
+        Recomputes the summary tables and the rating aggregates from the
+        movies and links in one transaction.
+        """
+        try:
+            for statement in SUMMARY_REBUILD:
+                self.db.session.execute(text(statement))
+            result, status = self.commit_only()
+            if status == 200:
+                return {'message': 'Statistics rebuilt'}, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def update_movie_metadata(self, movie_id, rating=None, poster=None):
+        """
+        Updates the IMDb rating and the poster of a movie with OMDb data and
+        marks it as refreshed. None values keep the stored value, CLEAR
+        removes it, e.g. a dead poster URL OMDb no longer knows.
+        :return: Dict with the IDs of the users collecting the movie.
+        """
+        values = {'refreshed_at': utc_now()}
+        for column, value in (('rating', rating), ('poster', poster)):
+            if value is CLEAR:
+                values[column] = None
+            elif value is not None:
+                values[column] = value
+        try:
+            updated = self.db.session.execute(
+                update(Movie).where(Movie.id == movie_id).values(**values),
+                execution_options={'synchronize_session': False}).rowcount
+            if not updated:
+                self.db.session.rollback()
+                return {'error': 'Movie not found'}, 404
+            user_ids = (self.db.session.query(UserMovies.user_id)
+                        .filter(UserMovies.movie_id == movie_id).all())
+            user_ids = [user_id for user_id, in user_ids]
+            self._bump_versions(*(DataVersion.user(user_id) for user_id in user_ids))
+            result, status = self.commit_only()
+            if status == 200:
+                return {'message': 'Movie refreshed', 'user_ids': user_ids}, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def enqueue_job(self, kind, movie_id=None, title=None, batch=None):
+        """
+        Queues a background job, unless an equal job is already queued or running.
+        :param kind: One of JOB_KINDS.
+        :param movie_id: Movie to enrich or refresh.
+        :param title: Title to look up.
+        :param batch: Optional name grouping jobs for get_job_progress.
+        :return: Dict with the ID of the new or the already queued job.
+        """
+        if kind not in JOB_KINDS:
+            return {'error': f"Unknown job kind '{kind}'."}, 400
+        try:
+            pending = (self.db.session.query(Job.id)
+                       .filter(Job.kind == kind, Job.movie_id == movie_id, Job.title == title,
+                               Job.status.in_((Job.QUEUED, Job.RUNNING)))
+                       .first())
+            if pending:
+                return {'job_id': pending.id}, 200
+            now = utc_now()
+            job = Job(kind=kind, movie_id=movie_id, title=title, batch=batch,
+                      status=Job.QUEUED, attempts=0, run_after=now, created_at=now)
+            self.db.session.add(job)
+            self.db.session.flush()
+            job_id = job.id
+            result, status = self.commit_only()
+            if status == 200:
+                return {'job_id': job_id}, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def enqueue_refresh(self, batch, older_than=None):
+        """
+        Queues refresh jobs for all movies never refreshed or refreshed
+        before a cutoff with one INSERT ... SELECT. Movies with a pending
+        job are skipped.
+        :param batch: Name of the batch for get_job_progress.
+        :param older_than: timedelta, movies refreshed more recently are
+                           skipped, None queues all movies.
+        :return: Dict with the batch name and the number of queued jobs.
+        """
+        now = utc_now()
+        pending = (select(Job.id)
+                   .where(Job.movie_id == Movie.id,
+                          Job.status.in_((Job.QUEUED, Job.RUNNING)))
+                   .exists())
+        movies = select(literal('refresh'), Movie.id, literal(batch), literal(Job.QUEUED),
+                        literal(0), literal(now), literal(now)).where(~pending)
+        if older_than is not None:
+            movies = movies.where(Movie.refreshed_at.is_(None)
+                                  | (Movie.refreshed_at < now - older_than))
+        try:
+            queued = self.db.session.execute(
+                insert(Job).from_select(['kind', 'movie_id', 'batch', 'status', 'attempts',
+                                         'run_after', 'created_at'], movies)).rowcount
+            result, status = self.commit_only()
+            if status == 200:
+                return {'batch': batch, 'queued': queued}, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def claim_job(self, lease_seconds=120, max_attempts=3):
+        """
+        Claims the next due job for a worker. Jobs whose lease expired,
+        e.g. of a crashed worker, are queued again first, or failed if
+        they used up max_attempts. The claim is a single UPDATE, so
+        concurrent workers in any number of processes never get the same job.
+        :param lease_seconds: Time the worker has to finish the job.
+        :param max_attempts: Claims of a job before an expired lease fails it.
+        :return: Job row with the columns of JOB_COLUMNS or None if no job
+                 is due. Its locked_until is the lease token for finish_job.
+        """
+        now = utc_now()
+        expired = (Job.status == Job.RUNNING, Job.locked_until < now)
+        try:
+            self.db.session.execute(
+                update(Job).where(*expired, Job.attempts >= max_attempts)
+                .values(status=Job.FAILED, locked_until=None, finished_at=now,
+                        error='Lease expired on the last attempt.'),
+                execution_options={'synchronize_session': False})
+            self.db.session.execute(
+                update(Job).where(*expired)
+                .values(status=Job.QUEUED, locked_until=None),
+                execution_options={'synchronize_session': False})
+            next_job = (select(Job.id)
+                        .where(Job.status == Job.QUEUED, Job.run_after <= now)
+                        .order_by(Job.run_after, Job.id)
+                        .limit(1)
+                        .scalar_subquery())
+            job = self.db.session.execute(
+                update(Job).where(Job.id == next_job, Job.status == Job.QUEUED)
+                .values(status=Job.RUNNING, attempts=Job.attempts + 1,
+                        locked_until=now + timedelta(seconds=lease_seconds))
+                .returning(*JOB_COLUMNS),
+                execution_options={'synchronize_session': False}).first()
+            result, status = self.commit_only()
+            if status == 200:
+                return job, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def finish_job(self, job_id, lease, error=None, retry_in=None):
+        """
+        Marks a claimed job as done, as failed or queues it again. Only
+        the worker holding the lease may finish the job, after its lease
+        expired and another worker claimed the job the call is rejected.
+        :param lease: locked_until of the job row returned by claim_job.
+        :param error: Error message, None marks the job as done.
+        :param retry_in: Seconds until a failed job is retried, None fails it for good.
+        """
+        now = utc_now()
+        if error is None:
+            values = {'status': Job.DONE, 'error': None, 'finished_at': now}
+        elif retry_in is None:
+            values = {'status': Job.FAILED, 'error': error[:300], 'finished_at': now}
+        else:
+            values = {'status': Job.QUEUED, 'error': error[:300],
+                      'run_after': now + timedelta(seconds=retry_in)}
+        try:
+            finished = self.db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == Job.RUNNING,
+                                  Job.locked_until == lease)
+                .values(locked_until=None, **values),
+                execution_options={'synchronize_session': False}).rowcount
+            if not finished:
+                self.db.session.rollback()
+                return {'error': 'The lease of the job expired.'}, 409
+            return self.commit_only()
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def get_job(self, job_id):
+        """Gets a job as row with the columns of JOB_COLUMNS."""
+        try:
+            job = self.db.session.query(*JOB_COLUMNS).filter(Job.id == job_id).first()
+            if not job:
+                return {'error': 'Job not found'}, 404
+            return job, 200
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def get_job_progress(self, batch):
+        """
+        Counts the jobs of a batch per status.
+        :return: Dict with the total and the number of queued, running,
+                 done and failed jobs.
+        """
+        try:
+            counts = dict(self.db.session.query(Job.status, func.count(Job.id))
+                          .filter(Job.batch == batch)
+                          .group_by(Job.status).all())
+        except SQLAlchemyError:
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+        if not counts:
+            return {'error': 'Batch not found'}, 404
+        progress = {status: counts.get(status, 0)
+                    for status in (Job.QUEUED, Job.RUNNING, Job.DONE, Job.FAILED)}
+        progress['total'] = sum(counts.values())
+        return progress, 200
+
+    def delete_finished_jobs(self, older_than):
+        """
+        Deletes done and failed jobs finished before a cutoff.
+        :param older_than: timedelta, more recently finished jobs are kept.
+        :return: Dict with the number of deleted jobs.
+        """
+        try:
+            deleted = self.db.session.execute(
+                delete(Job).where(Job.status.in_((Job.DONE, Job.FAILED)),
+                                  Job.finished_at < utc_now() - older_than),
+                execution_options={'synchronize_session': False}).rowcount
+            result, status = self.commit_only()
+            if status == 200:
+                return {'message': f'{deleted} finished jobs deleted', 'deleted': deleted}, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
+    def take_rate_token(self, name, rate, burst):
+        """
+        Takes one token from a token bucket stored in the database, so the
+        limit holds across all threads and processes using it.
+        :param name: Name of the bucket.
+        :param rate: Tokens added per second.
+        :param burst: Capacity of the bucket.
+        :return: 0.0 if a token was taken, otherwise the seconds until the next token.
+        """
+        now = time.time()
+        available = func.min(float(burst), RateLimit.tokens + (now - RateLimit.updated_at) * rate)
+        try:
+            self.db.session.execute(
+                insert(RateLimit).values(name=name, tokens=float(burst), updated_at=now)
+                .on_conflict_do_nothing(index_elements=['name']))
+            taken = self.db.session.execute(
+                update(RateLimit).where(RateLimit.name == name, available >= 1)
+                .values(tokens=available - 1, updated_at=now),
+                execution_options={'synchronize_session': False}).rowcount
+            wait = 0.0
+            if not taken:
+                tokens = (self.db.session.query(available)
+                          .filter(RateLimit.name == name).scalar())
+                wait = max((1 - tokens) / rate, 0.001)
+            result, status = self.commit_only()
+            if status == 200:
+                return wait, 200
+            return result, status
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            return {'error': 'Sorry, something went wrong while processing your request. '
+                             'Please try again in a few moments.'}, 500
+
     def get_user_by_name(self, username):
         """Gets a user by name."""
         try:
@@ -1,13 +1,13 @@
 import os
 from flask import Flask
 from data_models import db
+from db_validation import migrate_database
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
+DB_DIR = os.getenv('MOVIWEB_DB_PATH', os.path.join(DATA_DIR, 'movies.db'))
 
-os.makedirs(DATA_DIR, exist_ok=True)
-
-DB_DIR = os.path.join(DATA_DIR, 'movies.db')
+os.makedirs(os.path.dirname(DB_DIR), exist_ok=True)
 
 app = Flask(__name__)
 
@@ -18,4 +18,5 @@ db.init_app(app)
 
 with app.app_context():
     db.create_all()
-    print('Database and tables created successfully')
+migrate_database(app)
+print('Database and tables created successfully')
@@ -1,27 +1,125 @@
-from sqlalchemy import inspect
-from data_models import db
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.schema import CreateIndex
+from data_models import (db, MOVIE_SEARCH_TABLE, MOVIE_SEARCH_DDL, MovieSummary, UserMovies,
+                         SUMMARY_DDL, SUMMARY_REBUILD, LINK_SORT_DDL, LINK_SORT_BACKFILL)
 import sys
 import os
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
-DB_DIR = os.path.join(DATA_DIR, 'movies.db')
+
+def migrate_database(app):
+    """
+    Creates all tables and indexes declared on the models which are
+    missing in an existing database. db.create_all() only adds indexes
+    together with new tables, so databases created before an index was
+    declared need this step. Nullable columns declared after a table was
+    created are added with ALTER TABLE. The full-text search table, the
+    summary triggers and their tables are created here as well and filled
+    from the existing movies and links, like the sort columns of the links.
+    Exits the program if a unique index can not be created because of
+    duplicate rows. Indexes of missing tables or columns are skipped, the
+    schema check of validate_database reports them.
+    """
+    with app.app_context():
+        inspector = inspect(db.engine)
+        summary_tables_missing = not inspector.has_table(MovieSummary.__tablename__)
+        link_sort_missing = (inspector.has_table(UserMovies.__tablename__) and 'title' not in {
+            column['name'] for column in inspector.get_columns(UserMovies.__tablename__)})
+        db.create_all()
+        add_missing_columns()
+        search_table_missing = not inspect(db.engine).has_table(MOVIE_SEARCH_TABLE)
+        with db.engine.begin() as connection:
+            for statement in MOVIE_SEARCH_DDL + SUMMARY_DDL + LINK_SORT_DDL:
+                connection.execute(text(statement))
+            if link_sort_missing:
+                connection.execute(text(LINK_SORT_BACKFILL))
+            if search_table_missing:
+                connection.execute(text(f"INSERT INTO {MOVIE_SEARCH_TABLE}"
+                                        f"({MOVIE_SEARCH_TABLE}) VALUES ('rebuild')"))
+            if summary_tables_missing:
+                for statement in SUMMARY_REBUILD:
+                    connection.execute(text(statement))
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(CreateIndex(index, if_not_exists=True))
+                except IntegrityError:
+                    print(f"Index '{index.name}' can not be created, "
+                          f"table '{table.name}' contains duplicate entries.")
+                    print('Please remove the duplicates or delete the database and rerun db_creation.py')
+                    sys.exit(1)
+                except OperationalError:
+                    continue
+
+
+def add_missing_columns():
+    """Adds nullable model columns missing in existing tables, inside an app context."""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" '
+                                        f'ADD COLUMN "{column.name}" {column_type}'))
+
+
+def get_index_names(table):
+    """
+    Returns the index names of a table from sqlite_master, the SQLAlchemy
+    inspector skips expression indexes like ix_movie_ratings_mean.
+    """
+    with db.engine.connect() as connection:
+        return set(connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {'table': table}).scalars())
 
 
 def validate_database(app):
     """
     Validates the database by checking the file path and the file itself.
+    Missing tables and indexes are created before the schema is checked.
     Exits the program and links to the setup file if file path or
     database missing / corrupt.
     """
-    if not os.path.isfile(DB_DIR):
+    db_path = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+    if not db_path or not os.path.isfile(db_path):
         print('Database not found. Please run db_creation.py to create the database.')
         sys.exit(1)
+    migrate_database(app)
     with app.app_context():
         inspector = inspect(db.engine)
         expected_tables = {
             'user': {'id', 'name'},
-            'movies': {'id', 'title', 'director', 'year', 'rating', 'poster'}
+            'movies': {'id', 'title', 'director', 'year', 'rating', 'poster', 'refreshed_at'},
+            'user_movies': {'id', 'user_id', 'movie_id', 'rating', 'title', 'year'},
+            'movie_ratings': {'movie_id', 'rating_count', 'rating_sum'},
+            'movie_rating_buckets': {'movie_id', 'bucket', 'rating_count'},
+            'summary_movies': {'movie_id', 'collector_count'},
+            'summary_users': {'user_id', 'movie_count'},
+            'summary_years': {'year', 'movie_count'},
+            'summary_directors': {'director', 'movie_count'},
+            'data_versions': {'key', 'version', 'updated_at'},
+            'jobs': {'id', 'kind', 'movie_id', 'title', 'batch', 'status', 'attempts', 'error',
+                     'run_after', 'locked_until', 'created_at', 'finished_at'},
+            'rate_limits': {'name', 'tokens', 'updated_at'},
+            MOVIE_SEARCH_TABLE: {'title', 'director'}
+        }
+        expected_indexes = {
+            'user': {'ix_user_name', 'ix_user_name_nocase'},
+            'movies': {'ix_movies_year_id'},
+            'user_movies': {'ix_user_movies_user_movie', 'ix_user_movies_movie_id',
+                            'ix_user_movies_user_added', 'ix_user_movies_user_title',
+                            'ix_user_movies_user_year'},
+            'movie_ratings': {'ix_movie_ratings_mean'},
+            'jobs': {'ix_jobs_status_run_after', 'ix_jobs_movie_id', 'ix_jobs_batch_status'},
+            'summary_movies': {'ix_summary_movies_collectors'},
+            'summary_users': {'ix_summary_users_movies'},
+            'summary_directors': {'ix_summary_directors_movies'}
         }
         actual_tables = set(inspector.get_table_names())
         missing_tables = set(expected_tables.keys()) - actual_tables
@@ -38,4 +136,12 @@ def validate_database(app):
                 print(f"Found: {actual_cols}")
                 print('Please correct or delete the database and rerun db_creation.py')
                 sys.exit(1)
+
+        for table, index_names in expected_indexes.items():
+            actual_indexes = get_index_names(table)
+            missing_indexes = index_names - actual_indexes
+            if missing_indexes:
+                print(f"Table '{table}' is missing indexes: {', '.join(missing_indexes)}")
+                print('Please correct or delete the database and rerun db_creation.py')
+                sys.exit(1)
     print("Database validated successfully")
@@ -0,0 +1,232 @@
+from flask import (Response, abort, g, has_request_context, request, before_render_template,
+                   template_rendered)
+from sqlalchemy import event
+import ipaddress
+import threading
+import bisect
+import hmac
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the statements per request histogram buckets
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def escape_label(value):
+    """Escapes a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Formats a label dict in the Prometheus text format."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"'
+                          for name, value in sorted(labels.items())) + '}'
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets per label combination."""
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Records one observation."""
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """Returns the histogram in the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count)
+                      for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels({**labels, "le": bound})} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels({**labels, "le": "+Inf"})} {count}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines)
+
+
+class Metrics:
+    """Registry of the histograms and gauges exposed on /metrics."""
+
+    def __init__(self):
+        self.request_latency = Histogram('http_request_duration_seconds',
+                                         'Latency of HTTP requests by endpoint.')
+        self.request_statements = Histogram('db_statements_per_request',
+                                            'SQL statements executed per HTTP request.',
+                                            STATEMENT_BUCKETS)
+        self.request_db_time = Histogram('db_time_per_request_seconds',
+                                         'Time spent in SQL statements per HTTP request.')
+        self.query_latency = Histogram('db_query_duration_seconds',
+                                       'Latency of single SQL statements by endpoint or thread.')
+        self.render_latency = Histogram('template_render_duration_seconds',
+                                        'Time spent rendering templates.')
+        self.omdb_latency = Histogram('omdb_request_duration_seconds',
+                                      'Latency of HTTP requests to the OMDb API.')
+        self.histograms = [self.request_latency, self.request_statements, self.request_db_time,
+                           self.query_latency, self.render_latency, self.omdb_latency]
+        self._gauges = []
+
+    def add_gauges(self, prefix, description, callback):
+        """
+        Registers a callback returning a dict of numeric values, exposed
+        as one gauge per key, e.g. the hit ratio of a cache.
+        """
+        self._gauges.append((prefix, description, callback))
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format."""
+        parts = [histogram.render() for histogram in self.histograms]
+        for prefix, description, callback in self._gauges:
+            for key, value in sorted(callback().items()):
+                name = f'{prefix}_{key}'
+                parts.append(f'# HELP {name} {description}\n# TYPE {name} gauge\n{name} {value}')
+        return '\n'.join(parts) + '\n'
+
+
+def instrument_session(metrics, session):
+    """Records the latency of every response received by a requests session."""
+    def record(response, *_args, **_kwargs):
+        metrics.omdb_latency.observe(response.elapsed.total_seconds(), status=response.status_code)
+    session.hooks['response'].append(record)
+
+
+def instrument_fragment_cache(metrics, fragment_cache):
+    """
+    Records the render time of every fragment cache miss. Fragments are
+    rendered outside of render_template, so the template signals miss them.
+    """
+    def record(name, seconds):
+        metrics.render_latency.observe(seconds, template=name)
+    fragment_cache.render_hooks.append(record)
+
+
+def statement_source():
+    """
+    Returns the label of the code running a statement: the endpoint inside
+    requests, else the name of the thread, e.g. group-commit for the writer
+    thread which commits the writes of all requests. Thread numbers are
+    dropped, so every pool shares one label.
+    """
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return threading.current_thread().name.rstrip('0123456789-_') or 'unknown'
+
+
+def is_metrics_request_allowed(token):
+    """
+    Checks if the current request may read /metrics: with a token it has
+    to send 'Authorization: Bearer <token>', without one it has to come
+    from a loopback address.
+    """
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+def init_instrumentation(app, engine, slow_query_seconds=0.1, token=None):
+    """
+    Counts SQL statements and DB time per request through SQLAlchemy engine
+    events, times requests and template rendering and exposes everything on
+    /metrics. Statements slower than slow_query_seconds are logged.
+    Streamed responses are recorded when the server closes them, so their
+    latency and statements include the generated body.
+    Nothing is registered unless this is called, so disabled
+    instrumentation costs nothing.
+    :param token: Bearer token required by /metrics, without one only
+                  local clients may read it.
+    :return: The Metrics registry.
+    """
+    metrics = Metrics()
+
+    # The start time is kept on the execution context, so a failing
+    # statement leaves nothing behind on the pooled connection
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(_connection, _cursor, _statement, _parameters, context, _many):
+        if context is not None:
+            context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(_connection, _cursor, statement, _parameters, context, _many):
+        start = getattr(context, 'query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        source = statement_source()
+        metrics.query_latency.observe(elapsed, source=source)
+        if elapsed >= slow_query_seconds:
+            app.logger.warning('Slow query in %s (%.1f ms): %s', source, elapsed * 1000, statement)
+        if has_request_context():
+            g.db_statements = g.get('db_statements', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' not in g:
+            return response
+        request_globals = g._get_current_object()
+        labels = {'endpoint': request.endpoint or 'unknown', 'method': request.method,
+                  'status': response.status_code}
+
+        def record():
+            endpoint = labels['endpoint']
+            metrics.request_latency.observe(time.perf_counter() - request_globals.request_start,
+                                            **labels)
+            metrics.request_statements.observe(request_globals.get('db_statements', 0),
+                                               endpoint=endpoint)
+            metrics.request_db_time.observe(request_globals.get('db_time', 0.0),
+                                            endpoint=endpoint)
+
+        if response.is_streamed:
+            response.call_on_close(record)
+        else:
+            record()
+        return response
+
+    def start_render(_sender, **_extra):
+        g.setdefault('render_starts', []).append(time.perf_counter())
+
+    def record_render(_sender, template, **_extra):
+        starts = g.get('render_starts')
+        if starts:
+            metrics.render_latency.observe(time.perf_counter() - starts.pop(),
+                                           template=template.name)
+
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(record_render, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Exposes the collected metrics in the Prometheus text format."""
+        if not is_metrics_request_allowed(token):
+            abort(403)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -0,0 +1,239 @@
+from movie_data_api import get_movie_data, get_cached_movie_data, refresh_movie_data
+from datamanager.data_manager_interface import CLEAR
+from api import omdb_movie
+import multiprocessing
+import threading
+import os
+
+# Attempts of a job before it fails for good, retries wait RETRY_DELAY * 2 ** (attempt - 1)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+# Seconds a worker may run one job before other workers claim it again
+LEASE_SECONDS = 120
+# Name of the token bucket limiting the OMDb requests of all workers
+OMDB_RATE_LIMIT = 'omdb'
+
+
+class JobError(Exception):
+    """Failed job run, retried unless permanent is set."""
+
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class JobWorker:
+    """
+    Pool of worker threads processing the background jobs of the jobs
+    table: OMDb title lookups for /fetch_movie, enrichment of movies
+    saved without rating or poster and refreshes of stale movies.
+    Jobs are claimed through the data manager, so any number of workers
+    in any number of processes share one queue. OMDb requests of all
+    workers are limited by a token bucket in the database.
+    """
+
+    def __init__(self, app, data_manager, threads=2, rate=5.0, burst=10, idle_sleep=1.0):
+        """
+        :param app: Flask app, every job runs in its own app context.
+        :param data_manager: DataManagerInterface implementation.
+        :param threads: Number of worker threads.
+        :param rate: OMDb requests per second of all workers together, 0 disables the limit.
+        :param burst: OMDb requests allowed at once after an idle period.
+        :param idle_sleep: Seconds a thread waits when no job is due.
+        """
+        self.app = app
+        self.data_manager = data_manager
+        self.threads = threads
+        self.rate = rate
+        self.burst = burst
+        self.idle_sleep = idle_sleep
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._handlers = {'lookup': self._lookup, 'enrich': self._enrich,
+                          'refresh': self._refresh}
+
+    @classmethod
+    def from_env(cls, app, data_manager, **kwargs):
+        """Creates a worker configured by MOVIWEB_JOB_THREADS and OMDB_RATE_*."""
+        return cls(app, data_manager,
+                   threads=int(os.getenv('MOVIWEB_JOB_THREADS', 2)),
+                   rate=float(os.getenv('OMDB_RATE_LIMIT', 5)),
+                   burst=float(os.getenv('OMDB_RATE_BURST', 10)), **kwargs)
+
+    def start(self):
+        """Starts the worker threads in the background, unless they are running already."""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self.run, name=f'job-worker-{number}',
+                                              daemon=True)
+                             for number in range(self.threads)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the worker threads after their current job."""
+        self._stop.set()
+        with self._start_lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def run(self, until_empty=False):
+        """
+        Processes jobs until stop is called.
+        :param until_empty: Returns as soon as no job is due instead of waiting for new ones.
+        :return: Number of processed jobs.
+        """
+        processed = 0
+        while not self._stop.is_set():
+            if self.run_once():
+                processed += 1
+            elif until_empty:
+                break
+            else:
+                self._stop.wait(self.idle_sleep)
+        return processed
+
+    def run_threads(self, until_empty=False):
+        """
+        Processes jobs with all threads in the foreground until stop is
+        called or, with until_empty, until no job is due.
+        :return: Number of processed jobs.
+        """
+        counts = [0] * self.threads
+
+        def run(number):
+            counts[number] = self.run(until_empty)
+
+        threads = [threading.Thread(target=run, args=(number,), daemon=True)
+                   for number in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+        return sum(counts)
+
+    def run_once(self):
+        """
+        Claims and processes one job.
+        :return: True if a job was processed, False if none was due.
+        """
+        with self.app.app_context():
+            job, status = self.data_manager.claim_job(LEASE_SECONDS, MAX_ATTEMPTS)
+            if status != 200:
+                self.app.logger.error('Claiming a job failed: %s', job['error'])
+                return False
+            if job is None:
+                return False
+            try:
+                self._handlers[job.kind](job)
+            except JobError as error:
+                retry = not error.permanent and job.attempts < MAX_ATTEMPTS
+                finished, status = self.data_manager.finish_job(
+                    job.id, job.locked_until, str(error),
+                    RETRY_DELAY * 2 ** (job.attempts - 1) if retry else None)
+            except Exception as error:
+                self.app.logger.exception('Job %s failed', job.id)
+                finished, status = self.data_manager.finish_job(
+                    job.id, job.locked_until, f'Unexpected error: {error}')
+            else:
+                finished, status = self.data_manager.finish_job(job.id, job.locked_until)
+            if status != 200:
+                self.app.logger.error('Finishing job %s failed: %s', job.id, finished['error'])
+            return True
+
+    def _lookup(self, job):
+        """Looks a title up in OMDb, the result is served to /fetch_movie from the cache."""
+        self._omdb_data(job.title)
+
+    def _enrich(self, job):
+        """Fills in the IMDb rating and poster of a movie saved without them."""
+        self._update_movie(job.movie_id, self._omdb_data)
+
+    def _refresh(self, job):
+        """Reloads the IMDb rating and poster of a movie, bypassing the OMDb cache."""
+        self._update_movie(job.movie_id, self._fresh_omdb_data)
+
+    def _update_movie(self, movie_id, load):
+        """
+        Loads the OMDb data of a movie's title and stores its rating and
+        poster. A poster OMDb reports as 'N/A' is removed, so a dead URL
+        is not kept and enriched again.
+        """
+        movie, status = self.data_manager.get_movie(movie_id)
+        if status == 404:
+            raise JobError(movie['error'], permanent=True)
+        if status != 200:
+            raise JobError(movie['error'])
+        data = omdb_movie(load(movie.title))
+        poster = data['poster'] if data['poster'] is not None else CLEAR
+        result, status = self.data_manager.update_movie_metadata(movie_id, data['rating'],
+                                                                 poster)
+        if status != 200:
+            raise JobError(result['error'], permanent=status == 404)
+
+    def _omdb_data(self, title):
+        """Returns the OMDb data of a title, only cache misses take a rate limit token."""
+        data = get_cached_movie_data(title)
+        if data is None:
+            self._wait_for_token()
+            data = get_movie_data(title)
+        return self._checked(data)
+
+    def _fresh_omdb_data(self, title):
+        """Returns the OMDb data of a title loaded from the API."""
+        self._wait_for_token()
+        return self._checked(refresh_movie_data(title))
+
+    @staticmethod
+    def _checked(data):
+        """Raises a JobError for OMDb errors, 'Movie not found!' is not retried."""
+        if 'error' in data:
+            raise JobError(data['error'], permanent=data['error'] == 'Movie not found!')
+        return data
+
+    def _wait_for_token(self):
+        """Blocks until the shared OMDb token bucket grants a request."""
+        while self.rate > 0:
+            wait, status = self.data_manager.take_rate_token(OMDB_RATE_LIMIT, self.rate,
+                                                             self.burst)
+            if status != 200:
+                raise JobError(wait['error'])
+            if not wait:
+                return
+            if self._stop.wait(wait):
+                raise JobError('Worker stopped')
+
+
+def run_worker_process(threads, until_empty):
+    """
+    Entry point of a worker process: imports the app without its
+    in-process workers and processes jobs with a thread pool.
+    :return: Number of processed jobs.
+    """
+    os.environ['MOVIWEB_JOBS'] = 'external'
+    from app import app, data_manager
+    worker = JobWorker.from_env(app, data_manager)
+    worker.threads = threads
+    return worker.run_threads(until_empty)
+
+
+def run_worker_processes(processes, threads, until_empty=False):
+    """
+    Runs jobs in several worker processes. All workers share the OMDb
+    token bucket and the SQLite writer, so more processes only help while
+    OMDb latency dominates. When the token bucket updates are the limit,
+    two processes process fewer jobs per second than one.
+    :return: Number of processed jobs of all processes.
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes) as pool:
+        return sum(pool.starmap(run_worker_process, [(threads, until_empty)] * processes))
@@ -1,43 +1,175 @@
 from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from omdb_cache import OmdbCache, normalize_title
 from dotenv import load_dotenv
+import threading
 import requests
 import os
 
 load_dotenv()
 
 API_KEY = os.getenv('API_KEY')
+OMDB_URL = os.getenv('OMDB_BASE_URL', 'http://www.omdbapi.com/')
+
+_cache = None
+_client = None
+_lock = threading.Lock()
+
+
+class OmdbClient:
+    """
+    OMDb API client sharing one requests.Session, so connections are kept
+    alive and reused across lookups. Lookups are retried with exponential
+    backoff on 429 and 5xx answers.
+    """
+
+    def __init__(self, api_key=None, base_url=OMDB_URL, timeout=5, pool_size=10,
+                 retries=3, backoff_factor=0.3, transport=None):
+        """
+        :param api_key: OMDb API key, defaults to the API_KEY environment variable.
+        :param base_url: API endpoint, e.g. the URL of a local stub server.
+        :param timeout: Timeout per request in seconds.
+        :param pool_size: Maximum number of pooled connections, further
+                          requests wait for a free connection.
+        :param retries: Number of retries on connection errors, 429 and 5xx.
+        :param backoff_factor: Base of the exponential backoff between retries.
+        :param transport: Optional requests adapter replacing the pooled
+                          HTTP adapter, e.g. to answer requests in memory.
+        """
+        self.api_key = api_key or API_KEY
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        if transport is None:
+            retry = Retry(total=retries, backoff_factor=backoff_factor,
+                          status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset({'GET'}),
+                          respect_retry_after_header=True, raise_on_status=False)
+            transport = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                    pool_block=True, max_retries=retry)
+        self.session.mount('http://', transport)
+        self.session.mount('https://', transport)
+
+    def fetch(self, movie):
+        """
+        Retrieves selected movie data from the OMDb API by movie title.
+        :param movie: Title of the movie to search for as String.
+        :return: Tuple of the filtered movie data as dictionary and whether the
+                 movie was found, None if the result must not be cached.
+        """
+        if not self.api_key:
+            return {'error': 'API_KEY not found. Did you load the .env file and set it correctly?'}, None
+
+        try:
+            response = self.session.get(self.base_url, params={'apikey': self.api_key, 't': movie},
+                                        timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get('Response') == 'False':
+                error = data.get('Error', 'Movie not found')
+                return {'error': error}, False if error == 'Movie not found!' else None
+
+            return {
+                'Title': data.get('Title'),
+                'Director': data.get('Director'),
+                'Year': data.get('Year'),
+                'imdbRating': data.get('imdbRating'),
+                'Poster': data.get('Poster')
+            }, True
+        except ValueError:
+            return {'error': 'Response is not valid JSON'}, None
+        except RequestException as error:
+            return {'error': f'Network error: {str(error)}'}, None
+
+    def close(self):
+        """Closes all pooled connections."""
+        self.session.close()
+
+
+def get_cache():
+    """
+    Returns the shared OMDb cache, created on first use so that
+    importing this module does not touch the file system.
+    """
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = OmdbCache.from_env()
+        return _cache
+
+
+def get_client():
+    """Returns the shared OMDb client, created on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = OmdbClient()
+        return _client
+
+
+def fetch_movie_data(movie):
+    """
+    Retrieves selected movie data from the OMDb API by movie title, bypassing the cache.
+    :param movie: Title of the movie to search for as String.
+    :return: Tuple of the filtered movie data as dictionary and whether the
+             movie was found, None if the result must not be cached.
+    """
+    return get_client().fetch(movie)
 
 
 def get_movie_data(movie):
     """
     Retrieves selected movie data from the OMDb API by movie title.
+    Found movies and 'Movie not found!' answers are served from the cache.
     :param movie: Title of the movie to search for as String.
     :return: Filtered movie data as dictionary.
     """
-    if not API_KEY:
-        return {'error': 'API_KEY not found. Did you load the .env file and set it correctly?'}
-
-    try:
-        api_url = f"http://www.omdbapi.com/?apikey={API_KEY}&t={movie}"
-        response = requests.get(api_url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get('Response') == 'False':
-            return {'error': data.get('Error', 'Movie not found')}
-
-        return {
-            'Title': data.get('Title'),
-            'Director': data.get('Director'),
-            'Year': data.get('Year'),
-            'imdbRating': data.get('imdbRating'),
-            'Poster': data.get('Poster')
-        }
-    except ValueError:
-        return {'error': 'Response is not valid JSON'}
-    except RequestException as error:
-        return {'error': f'Network error: {str(error)}'}
-
-
-result = get_movie_data('Predator')
-print(result)
+    return get_cache().get_or_load(movie, fetch_movie_data)
+
+
+def get_cached_movie_data(movie):
+    """
+    Returns the cached movie data of a title without calling the OMDb API.
+    :param movie: Title of the movie as String.
+    :return: Filtered movie data as dictionary or None if the title is not cached.
+    """
+    return get_cache().peek(movie)
+
+
+def refresh_movie_data(movie):
+    """
+    Retrieves movie data from the OMDb API even if the title is cached
+    and replaces the cached entry.
+    :param movie: Title of the movie to search for as String.
+    :return: Filtered movie data as dictionary.
+    """
+    return get_cache().refresh(movie, fetch_movie_data)
+
+
+def get_movies_data(movies, max_workers=8):
+    """
+    Retrieves movie data for many titles concurrently. Titles which only
+    differ in case or whitespace are looked up once and cached results
+    are reused.
+    :param movies: List of movie titles as Strings.
+    :param max_workers: Maximum number of concurrent OMDb requests.
+    :return: List of movie data dictionaries in the order of the titles,
+             failed lookups contain an 'error' key.
+    """
+    unique_titles = {}
+    for movie in movies:
+        unique_titles.setdefault(normalize_title(movie), movie)
+    if not unique_titles:
+        return []
+
+    workers = max(1, min(max_workers, len(unique_titles)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(unique_titles, executor.map(get_movie_data, unique_titles.values())))
+    return [results[normalize_title(movie)] for movie in movies]
+
+
+if __name__ == '__main__':
+    print(get_movie_data('Predator'))
@@ -0,0 +1,234 @@
+from collections import OrderedDict
+from contextlib import closing
+import threading
+import logging
+import sqlite3
+import json
+import time
+import os
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, 'data', 'omdb_cache.db')
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_title(title):
+    """
+    Normalizes a movie title to a cache key, so 'The  Matrix ' and
+    'the matrix' share one entry.
+    :param title: Movie title as String.
+    :return: Lower cased title with collapsed whitespace.
+    """
+    return ' '.join(str(title).split()).casefold()
+
+
+class OmdbCache:
+    """
+    Two tier cache for OMDb lookups: an in-process LRU in front of a
+    persistent SQLite table. Found movies and 'not found' answers are
+    cached with separate TTLs, expired entries can optionally be served
+    while a background thread revalidates them. If the SQLite file can
+    not be read or written, e.g. while it is locked, only the in-process
+    tier is used.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size=1024, ttl=7 * 24 * 3600,
+                 negative_ttl=24 * 3600, stale_ttl=0):
+        """
+        :param path: SQLite file of the persistent tier, None disables it.
+        :param max_size: Maximum number of entries in the in-process LRU.
+        :param ttl: Seconds a found movie stays fresh.
+        :param negative_ttl: Seconds a 'not found' answer stays fresh.
+        :param stale_ttl: Seconds an expired entry may still be served
+                          while it is revalidated, 0 disables this.
+        """
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._table_ready = False
+        self._counters = {'hits': 0, 'misses': 0, 'stale_hits': 0,
+                          'negative_hits': 0, 'refreshes': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Creates a cache configured by the OMDB_CACHE_* environment variables."""
+        path = os.getenv('OMDB_CACHE_PATH', DEFAULT_CACHE_PATH)
+        return cls(path=path or None,
+                   max_size=int(os.getenv('OMDB_CACHE_SIZE', 1024)),
+                   ttl=float(os.getenv('OMDB_CACHE_TTL', 7 * 24 * 3600)),
+                   negative_ttl=float(os.getenv('OMDB_CACHE_NEGATIVE_TTL', 24 * 3600)),
+                   stale_ttl=float(os.getenv('OMDB_CACHE_STALE_TTL', 0)))
+
+    def get_or_load(self, title, loader):
+        """
+        Returns the cached result for a title or loads and caches it.
+        :param title: Movie title as String.
+        :param loader: Callable taking the title and returning a tuple of
+                       (result dict, found) where found is True for a movie,
+                       False for 'not found' and None for results that must
+                       not be cached, e.g. network errors.
+        :return: Result dict as returned by the loader.
+        """
+        key = normalize_title(title)
+        entry = self._lookup(key)
+        if entry is not None:
+            result, negative, fetched_at = entry
+            age = time.time() - fetched_at
+            ttl = self.negative_ttl if negative else self.ttl
+            if age < ttl:
+                self._count('negative_hits' if negative else 'hits')
+                return result
+            if age < ttl + self.stale_ttl:
+                self._count('stale_hits')
+                self._revalidate(key, title, loader)
+                return result
+
+        self._count('misses')
+        return self._load(key, title, loader)
+
+    def peek(self, title):
+        """
+        Returns the fresh cached result for a title without loading it.
+        :return: Result dict or None if the title is not cached or expired.
+        """
+        entry = self._lookup(normalize_title(title))
+        if entry is None:
+            return None
+        result, negative, fetched_at = entry
+        if time.time() - fetched_at >= (self.negative_ttl if negative else self.ttl):
+            return None
+        self._count('negative_hits' if negative else 'hits')
+        return result
+
+    def refresh(self, title, loader):
+        """Loads a title even if it is cached and stores the new result."""
+        self._count('refreshes')
+        return self._load(normalize_title(title), title, loader)
+
+    def stats(self):
+        """Returns the hit / miss counters and the hit ratio."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._memory)
+        served = stats['hits'] + stats['negative_hits'] + stats['stale_hits']
+        total = served + stats['misses']
+        stats['hit_ratio'] = served / total if total else 0.0
+        return stats
+
+    def clear(self):
+        """Removes all entries from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        connection = self._connect() if self.path else None
+        if connection is not None:
+            with closing(connection), connection:
+                connection.execute('DELETE FROM omdb_cache')
+
+    def _load(self, key, title, loader):
+        """Calls the loader and stores cacheable results."""
+        result, found = loader(title)
+        if found is not None:
+            self._store(key, result, not found)
+        return result
+
+    def _revalidate(self, key, title, loader):
+        """Reloads a stale entry in a background thread, once per key."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._count('refreshes')
+                self._load(key, title, loader)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _lookup(self, key):
+        """Returns (result, negative, fetched_at) from memory or disk, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        connection = self._connect() if self.path else None
+        if connection is None:
+            return None
+        try:
+            with closing(connection):
+                row = connection.execute(
+                    'SELECT payload, negative, fetched_at FROM omdb_cache WHERE key = ?',
+                    (key,)).fetchone()
+        except sqlite3.Error as error:
+            logger.warning('Reading the OMDb cache %s failed: %s', self.path, error)
+            return None
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), bool(row[1]), row[2])
+        self._remember(key, entry)
+        return entry
+
+    def _store(self, key, result, negative):
+        """Writes an entry to both tiers."""
+        entry = (result, negative, time.time())
+        self._remember(key, entry)
+        connection = self._connect() if self.path else None
+        if connection is None:
+            return
+        try:
+            with closing(connection), connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO omdb_cache (key, payload, negative, fetched_at) '
+                    'VALUES (?, ?, ?, ?)', (key, json.dumps(result), int(negative), entry[2]))
+        except sqlite3.Error as error:
+            logger.warning('Writing the OMDb cache %s failed: %s', self.path, error)
+
+    def _remember(self, key, entry):
+        """Puts an entry into the LRU and evicts the least recently used ones."""
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _connect(self):
+        """
+        Opens a connection to the persistent tier and creates its table once.
+        :return: SQLite connection or None if the database is not usable.
+        """
+        connection = None
+        try:
+            if not self._table_ready:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5)
+            # WAL lets worker processes write entries without blocking readers
+            connection.execute('PRAGMA synchronous = NORMAL')
+            if not self._table_ready:
+                connection.execute('PRAGMA journal_mode = WAL')
+                with connection:
+                    connection.execute(
+                        'CREATE TABLE IF NOT EXISTS omdb_cache ('
+                        'key TEXT PRIMARY KEY, payload TEXT NOT NULL, '
+                        'negative INTEGER NOT NULL, fetched_at REAL NOT NULL)')
+                self._table_ready = True
+            return connection
+        except (sqlite3.Error, OSError) as error:
+            if connection is not None:
+                connection.close()
+            logger.warning('Opening the OMDb cache %s failed: %s', self.path, error)
+            return None
+
+    def _count(self, counter):
+        """Increments one of the statistic counters."""
+        with self._lock:
+            self._counters[counter] += 1
@@ -0,0 +1,253 @@
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+import ipaddress
+import threading
+import tempfile
+import hashlib
+import requests
+import socket
+import io
+import os
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are stored unresized without Pillow
+    Image = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_POSTER_DIR = os.path.join(BASE_DIR, 'data', 'posters')
+
+# Without Pillow only JPEG files are stored, recognized by their first bytes
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+MAX_REDIRECTS = 3
+
+
+def url_digest(url):
+    """Returns the hex SHA-256 of a poster URL."""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class PosterCache:
+    """
+    On-disk cache of poster thumbnails. Every poster URL is downloaded
+    once, shrunk to a thumbnail and stored under the SHA-256 of the
+    thumbnail bytes, so identical images share one file. A small index
+    file per URL points to the thumbnail.
+    Poster URLs are user input, so only hosts with public addresses are
+    contacted and only bytes decoded as an image are stored. Downloads
+    connect to the address which was checked, a host resolving to another
+    address on a second lookup can not redirect them (DNS rebinding).
+    """
+
+    def __init__(self, directory=DEFAULT_POSTER_DIR, size=(300, 450), timeout=5,
+                 max_bytes=5 * 1024 * 1024, workers=2, allowed_hosts=None):
+        """
+        :param directory: Directory holding the thumbnails and the URL index.
+        :param size: Maximum thumbnail width and height in pixels.
+        :param timeout: Download timeout in seconds.
+        :param max_bytes: Posters larger than this are not downloaded.
+        :param workers: Threads used for background prefetching.
+        :param allowed_hosts: Host names posters may be downloaded from,
+                              None allows every host with public addresses.
+        """
+        self.directory = directory
+        self.size = size
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.allowed_hosts = ({host.lower() for host in allowed_hosts}
+                              if allowed_hosts is not None else None)
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='poster-prefetch')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def cached_path(self, url):
+        """Returns the path of the cached thumbnail of a URL or None."""
+        try:
+            with open(self._index_path(url), encoding='ascii') as file:
+                path = os.path.join(self.directory, 'thumbs', file.read().strip())
+        except OSError:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def is_allowed(self, url):
+        """
+        Checks if a poster URL may be downloaded: its host has to be
+        allowed and every address it resolves to has to be public, so
+        URLs can not reach private, loopback or link-local services.
+        """
+        return self._resolve(url) is not None
+
+    def _resolve(self, url):
+        """
+        Resolves the host of a poster URL once.
+        :return: Address to connect to or None if the URL is not allowed.
+        """
+        if not is_poster_url(url):
+            return None
+        try:
+            parts = urlsplit(url)
+            host = parts.hostname
+            if not host:
+                return None
+            if self.allowed_hosts is not None and host not in self.allowed_hosts:
+                return None
+            addresses = socket.getaddrinfo(
+                host, parts.port or (443 if parts.scheme == 'https' else 80),
+                type=socket.SOCK_STREAM)
+        except (OSError, UnicodeError, ValueError):
+            return None
+        if not addresses or not all(is_public_address(address[4][0])
+                                    for address in addresses):
+            return None
+        return addresses[0][4][0]
+
+    def prefetch(self, url):
+        """Downloads the thumbnail of a URL in the background, once per URL."""
+        if not is_poster_url(url) or self.cached_path(url):
+            return
+        with self._lock:
+            if url in self._pending:
+                return
+            self._pending.add(url)
+        self._executor.submit(self._prefetch, url)
+
+    def _prefetch(self, url):
+        try:
+            self._download(url)
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+    def _download(self, url):
+        """Downloads, shrinks and stores a poster, returns the thumbnail path or None."""
+        content = self._fetch(url)
+        if content is None:
+            return None
+        thumbnail = self._shrink(content)
+        if thumbnail is None:
+            return None
+        name = hashlib.sha256(thumbnail).hexdigest() + '.jpg'
+        path = os.path.join(self.directory, 'thumbs', name)
+        if not os.path.isfile(path):
+            self._write_atomic(path, thumbnail)
+        self._write_atomic(self._index_path(url), name.encode('ascii'))
+        return path
+
+    def _fetch(self, url):
+        """
+        Downloads the bytes of a poster. Redirects are followed here
+        instead of by requests, so every hop is checked and pinned to
+        the address it was checked with.
+        :return: Image bytes or None if the poster could not be loaded.
+        """
+        try:
+            for _hop in range(MAX_REDIRECTS + 1):
+                address = self._resolve(url)
+                if address is None:
+                    return None
+                parts = urlsplit(url)
+                with pinned_session(parts.scheme, parts.hostname) as session, \
+                        session.get(pinned_url(parts, address), timeout=self.timeout,
+                                    stream=True, allow_redirects=False,
+                                    headers={'Host': host_header(parts)}) as response:
+                    if response.is_redirect:
+                        url = urljoin(url, response.headers['Location'])
+                        continue
+                    response.raise_for_status()
+                    if not response.headers.get('Content-Type', '').startswith('image/'):
+                        return None
+                    content = response.raw.read(self.max_bytes + 1, decode_content=True)
+                return content if len(content) <= self.max_bytes else None
+        except RequestException:
+            return None
+        return None
+
+    def _shrink(self, content):
+        """
+        Returns the poster as JPEG thumbnail. Without Pillow JPEG files
+        are returned unchanged.
+        :return: JPEG bytes or None if the content is no image Pillow can
+                 decode, or no JPEG file without Pillow.
+        """
+        if Image is None:
+            return content if content.startswith(JPEG_SIGNATURE) else None
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                image.thumbnail(self.size)
+                output = io.BytesIO()
+                image.convert('RGB').save(output, 'JPEG', quality=85, optimize=True)
+                return output.getvalue()
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+
+    def _index_path(self, url):
+        return os.path.join(self.directory, 'urls', url_digest(url))
+
+    @staticmethod
+    def _write_atomic(path, data):
+        """Writes a file via a temporary file, concurrent readers never see partial files."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+
+class PinnedHostAdapter(HTTPAdapter):
+    """
+    Transport adapter for URLs whose host was replaced by a checked
+    address. TLS connections still send the host name for SNI and
+    verify the certificate against it.
+    """
+
+    def __init__(self, hostname, **kwargs):
+        """:param hostname: Host name of the original URL."""
+        self.hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['server_hostname'] = self.hostname
+        kwargs['assert_hostname'] = self.hostname
+        super().init_poolmanager(*args, **kwargs)
+
+
+def pinned_session(scheme, hostname):
+    """Returns a session sending every request of a scheme through a PinnedHostAdapter."""
+    session = requests.Session()
+    session.trust_env = False  # a proxy would resolve the host name again
+    session.mount(f'{scheme}://', PinnedHostAdapter(hostname))
+    return session
+
+
+def pinned_url(parts, address):
+    """Returns the URL with its host replaced by an IP address."""
+    host = f'[{address}]' if ':' in address else address
+    netloc = f'{host}:{parts.port}' if parts.port else host
+    return parts._replace(netloc=netloc).geturl()
+
+
+def host_header(parts):
+    """Returns the Host header of a URL, without credentials."""
+    return parts.netloc.rpartition('@')[2]
+
+
+def is_poster_url(url):
+    """Checks if a poster value is a downloadable URL, OMDb uses 'N/A' for missing posters."""
+    return isinstance(url, str) and url.startswith(('http://', 'https://'))
+
+
+def is_public_address(address):
+    """
+    Checks if an IP address is globally reachable, private, loopback,
+    link-local, reserved and multicast addresses are not.
+    """
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
@@ -0,0 +1,113 @@
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from collections import OrderedDict
+import threading
+import hashlib
+import time
+import os
+
+
+class FragmentCache:
+    """
+    In-process LRU of rendered template fragments, e.g. the movie cards
+    of user_movies.html. The key contains every value a fragment is
+    rendered from, so changed data gets a new key and old fragments
+    simply age out; nothing has to be invalidated.
+    """
+
+    def __init__(self, max_size=10000):
+        """:param max_size: Maximum number of fragments, 0 disables the cache."""
+        self.max_size = max_size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0}
+        # Callables receiving the fragment name and render seconds of every miss
+        self.render_hooks = []
+
+    @classmethod
+    def from_env(cls):
+        """Creates a cache sized by the MOVIWEB_FRAGMENT_CACHE_SIZE environment variable."""
+        return cls(max_size=int(os.getenv('MOVIWEB_FRAGMENT_CACHE_SIZE', 10000)))
+
+    def get_or_render(self, key, render, name='fragment'):
+        """
+        Returns the cached fragment of a key or renders and caches it.
+        :param key: Hashable key containing all inputs of the fragment.
+        :param render: Callable without arguments returning the fragment HTML.
+        :param name: Name of the fragment passed to the render hooks.
+        :return: Fragment HTML as Markup.
+        """
+        if not self.max_size:
+            return self._render(render, name)
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self._counters['hits'] += 1
+                return fragment
+            self._counters['misses'] += 1
+        fragment = self._render(render, name)
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def _render(self, render, name):
+        """Renders a fragment, timed only if render hooks are registered."""
+        if not self.render_hooks:
+            return Markup(render())
+        start = time.perf_counter()
+        fragment = Markup(render())
+        elapsed = time.perf_counter() - start
+        for hook in self.render_hooks:
+            hook(name, elapsed)
+        return fragment
+
+    def stats(self):
+        """Returns the hit / miss counters and the hit ratio."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._fragments)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+        return stats
+
+    def clear(self):
+        """Removes all fragments."""
+        with self._lock:
+            self._fragments.clear()
+
+
+def precompile_templates(app, directory=None):
+    """
+    Compiles all templates of an app once at startup, so no request pays
+    for it. With a directory the compiled bytecode is stored there and
+    further worker processes load it instead of compiling again.
+    Must run before the first template is loaded.
+    :param app: Flask app.
+    :param directory: Bytecode cache directory, None keeps the templates in memory only.
+    :return: Number of compiled templates.
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def template_digest(app):
+    """
+    Returns a digest of all template sources of an app. Page ETags
+    include it, so a deploy changing the markup invalidates the pages
+    browsers cached before.
+    :param app: Flask app.
+    :return: Hex digest as String.
+    """
+    digest = hashlib.sha1()
+    for name in sorted(app.jinja_env.list_templates(extensions=['html'])):
+        source, _filename, _uptodate = app.jinja_env.loader.get_source(app.jinja_env, name)
+        digest.update(name.encode('utf-8') + b'\0' + source.encode('utf-8') + b'\0')
+    return digest.hexdigest()
@@ -0,0 +1,58 @@
+from flask import Flask
+from datamanager.sqlite_data_manager import SQLiteDataManager
+from db_validation import migrate_database
+import pytest
+import os
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Returns a factory of Flask apps with a fresh SQLite database file each."""
+    def make(**config):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / f'movies{id(app)}.db'}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config.update(config)
+        app.data_manager = SQLiteDataManager(app)
+        migrate_database(app)
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    """Flask app with a fresh SQLite database file in the temporary directory."""
+    return make_app()
+
+
+@pytest.fixture
+def data_manager(app):
+    """SQLiteDataManager of the app, used inside an app context."""
+    with app.app_context():
+        yield app.data_manager
+
+
+@pytest.fixture(scope='session')
+def web(tmp_path_factory):
+    """
+    The app module, imported once against an empty database in a temporary
+    directory. Its tests share the database and use distinct names.
+    """
+    directory = tmp_path_factory.mktemp('web')
+    path = directory / 'movies.db'
+    path.touch()
+    os.environ.update({
+        'MOVIWEB_DB_PATH': str(path),
+        'MOVIWEB_POSTER_DIR': str(directory / 'posters'),
+        'MOVIWEB_TEMPLATE_CACHE_DIR': '',
+        'OMDB_CACHE_PATH': '',
+        'API_KEY': 'test',
+    })
+    import app as web
+    return web
+
+
+@pytest.fixture
+def client(web):
+    """Test client of the app module."""
+    return web.app.test_client()
@@ -0,0 +1,112 @@
+from data_models import Movie, UserMovies
+import itertools
+import pytest
+
+USER_NAMES = itertools.count()
+
+
+@pytest.fixture
+def user_id(client):
+    """Creates a user through the API and returns the ID."""
+    response = client.post('/api/v1/users', json={'name': f'api user {next(USER_NAMES)}'})
+    assert response.status_code == 201, response.json
+    return response.json['id']
+
+
+def add_movie(client, user_id, title, **fields):
+    return client.post(f'/api/v1/users/{user_id}/movies',
+                       json={'title': title, 'director': 'API Director', 'year': 2005,
+                             **fields})
+
+
+def test_create_user(client):
+    name = f'api user {next(USER_NAMES)}'
+    response = client.post('/api/v1/users', json={'name': f'  {name} '})
+    assert response.status_code == 201 and response.json['name'] == name
+    assert client.post('/api/v1/users', json={'name': name}).status_code == 409
+    assert client.post('/api/v1/users', json={'name': ' '}).status_code == 400
+    response = client.post('/api/v1/users', data='name', content_type='text/plain')
+    assert response.status_code == 400 and 'JSON object' in response.json['error']
+
+
+def test_add_movie(client, user_id):
+    response = add_movie(client, user_id, 'API Movie', rating=7)
+    assert response.status_code == 201
+    movie_id = response.json['movie_id']
+    assert add_movie(client, user_id, 'API Movie').status_code == 409
+    assert add_movie(client, user_id, 'API Movie', year='2005').status_code == 400
+    assert add_movie(client, user_id, 'API Movie', year=True).status_code == 400
+    assert add_movie(client, user_id, 'API Movie', rating='7').status_code == 400
+    assert add_movie(client, user_id, 'API Movie', poster=1).status_code == 400
+
+    movies = client.get(f'/api/v1/users/{user_id}/movies').json['movies']
+    assert movies == [{'id': movie_id, 'title': 'API Movie', 'director': 'API Director',
+                       'year': 2005, 'rating': 7.0, 'poster': None, 'user_rating': None}]
+
+
+def test_add_movie_for_unknown_user(web, client):
+    response = add_movie(client, 99999, 'API Orphan')
+    assert response.status_code == 404 and response.json == {'error': 'User does not exist.'}
+    with web.app.app_context():
+        assert Movie.query.filter_by(title='API Orphan').count() == 0
+        assert UserMovies.query.filter_by(user_id=99999).count() == 0
+
+
+def test_rate_and_delete_movie(client, user_id):
+    movie_id = add_movie(client, user_id, 'API Rated').json['movie_id']
+    url = f'/api/v1/users/{user_id}/movies/{movie_id}'
+    response = client.patch(url, json={'rating': 8})
+    assert response.status_code == 200 and response.json == {'movie_id': movie_id,
+                                                             'user_rating': 8.0}
+    for rating in (None, 0, 10, '8', True):
+        assert client.patch(url, json={'rating': rating}).status_code == 400
+    assert client.patch(f'{url}0', json={'rating': 8}).status_code == 404
+    assert client.get(f'/api/v1/movies/{movie_id}/ratings').json['count'] == 1
+
+    assert client.delete(url).status_code == 200
+    assert client.delete(url).status_code == 404
+    assert client.get(f'/api/v1/movies/{movie_id}/ratings').status_code == 404
+    assert client.delete(f'/api/v1/users/{user_id}').status_code == 200
+    assert client.delete(f'/api/v1/users/{user_id}').status_code == 404
+
+
+def test_field_selection(client, user_id):
+    for number in range(3):
+        add_movie(client, user_id, f'API Fields {number}')
+    response = client.get(f'/api/v1/users/{user_id}/movies?fields=title, year,title')
+    assert response.json['movies'][0] == {'title': 'API Fields 0', 'year': 2005}
+
+    response = client.get(f'/api/v1/users/{user_id}/movies?fields=title&limit=2')
+    assert response.json['movies'] == [{'title': 'API Fields 0'}, {'title': 'API Fields 1'}]
+    assert response.json['next'] and response.json['prev'] is None
+    response = client.get(f"/api/v1/users/{user_id}/movies?fields=title&limit=2"
+                          f"&after={response.json['next']}")
+    assert response.json['movies'] == [{'title': 'API Fields 2'}]
+
+    response = client.get('/api/v1/movies/search?q=api+fields&fields=title,average_rating')
+    assert response.json['movies'][0].keys() == {'title', 'average_rating'}
+    users = client.get('/api/v1/users?fields=name').json['users']
+    assert users and all(user.keys() == {'name'} for user in users)
+
+
+@pytest.mark.parametrize('fields, message', [
+    ('title,secret,other', 'Unknown fields: secret, other. Available fields: id, title,'),
+    (',', 'No fields requested. Available fields: id, title,'),
+])
+def test_unknown_fields(client, user_id, fields, message):
+    response = client.get(f'/api/v1/users/{user_id}/movies?fields={fields}')
+    assert response.status_code == 400 and response.json['error'].startswith(message)
+
+
+def test_paging_errors(client, user_id):
+    assert client.get(f'/api/v1/users/{user_id}/movies?sort=rating').status_code == 400
+    assert client.get(f'/api/v1/users/{user_id}/movies?after=garbage').status_code == 400
+    assert client.get('/api/v1/movies?limit=0').status_code == 400
+
+
+def test_unknown_urls_return_json(client):
+    for url in ('/api/v1/unknown', '/api/v1', '/api/v1/users/abc/movies'):
+        response = client.get(url)
+        assert response.status_code == 404 and 'error' in response.json
+    response = client.get('/unknown')
+    assert 'Not Found - 404' in response.text
@@ -0,0 +1,32 @@
+from datamanager.cached_data_manager import CachedDataManager, MemoryCacheBackend
+from data_models import User, Movie
+
+
+def add_movie(data_manager, user_id, title):
+    movie = Movie(title=title, director='Director', year=2000)
+    result, status = data_manager.add_movie(movie, user_id)
+    assert status == 200, result
+
+
+def test_collections_follow_writes_of_other_processes(data_manager):
+    cached = CachedDataManager(data_manager)
+    user_id = cached.add_user(User(name='cached'))[0]['user_id']
+    add_movie(cached, user_id, 'First')
+    assert [movie.title for movie in cached.get_user_movies(user_id)[0]] == ['First']
+    assert len(cached.get_user_movies_page(user_id)[0]['movies']) == 1
+
+    # Writes through the wrapped manager never bump the generations of this cache
+    add_movie(data_manager, user_id, 'Second')
+    assert [movie.title for movie in cached.get_user_movies(user_id)[0]] == ['First', 'Second']
+    assert len(cached.get_user_movies_page(user_id)[0]['movies']) == 2
+
+    cached.get_user_movies(user_id)
+    assert cached.stats()['hits'] == 1
+
+
+def test_memory_entries_expire(data_manager):
+    cached = CachedDataManager(data_manager, MemoryCacheBackend(ttl=0))
+    assert cached.get_all_users()[0] == []
+    data_manager.add_user(User(name='other process'))
+    assert cached.get_all_users()[0] == [('other process',)]
+    assert cached.stats()['hits'] == 0
@@ -0,0 +1,93 @@
+from data_models import db, User, Movie
+from concurrent.futures import Future
+from collections import Counter
+import threading
+import pytest
+
+THREADS = 12
+
+
+@pytest.fixture(params=[False, True], ids=['per_call', 'group_commit'])
+def writer_app(request, make_app):
+    """App committing every write on its own or through the group commit writer."""
+    return make_app(SQLITE_GROUP_COMMIT=request.param, SQLITE_GROUP_COMMIT_DELAY=0.01)
+
+
+def run_concurrently(app, calls):
+    """Runs the calls at the same time in their own threads and app contexts."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(number):
+        with app.app_context():
+            barrier.wait()
+            results[number] = calls[number]()
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(len(calls))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_duplicate_users(writer_app):
+    data_manager = writer_app.data_manager
+    calls = [lambda: data_manager.add_user(User(name='duplicate')) for _ in range(THREADS)]
+    calls += [lambda number=number: data_manager.add_user(User(name=f'unique {number}'))
+              for number in range(THREADS)]
+    statuses = [status for _result, status in run_concurrently(writer_app, calls)]
+
+    assert Counter(statuses[:THREADS]) == {200: 1, 409: THREADS - 1}
+    assert statuses[THREADS:] == [200] * THREADS
+    with writer_app.app_context():
+        assert db.session.query(User).filter_by(name='duplicate').count() == 1
+        assert db.session.query(User).count() == THREADS + 1
+
+
+def test_concurrent_duplicate_movies(writer_app):
+    data_manager = writer_app.data_manager
+    with writer_app.app_context():
+        user_id = data_manager.add_user(User(name='collector'))[0]['user_id']
+    calls = [lambda: data_manager.add_movie(Movie(title='Duplicate', director='Director',
+                                                  year=2000), user_id)
+             for _ in range(THREADS)]
+    statuses = [status for _result, status in run_concurrently(writer_app, calls)]
+
+    assert Counter(statuses) == {200: 1, 409: THREADS - 1}
+    with writer_app.app_context():
+        assert db.session.query(Movie).filter_by(title='Duplicate').count() == 1
+        assert data_manager.get_collection_size(user_id)[0] == 1
+
+
+def test_failing_operation_only_fails_its_caller(make_app):
+    app = make_app(SQLITE_GROUP_COMMIT=True)
+    data_manager = app.data_manager
+    writer = data_manager.group_commit
+
+    def insert_duplicate():
+        db.session.add(User(name='taken'))
+        db.session.flush()
+        return {'message': 'User added'}, 200
+
+    def fail():
+        raise RuntimeError('broken operation')
+
+    with app.app_context():
+        data_manager.add_user(User(name='taken'))
+        db.session().expire_on_commit = False
+        batch = [(data_manager._apply_add_user, (User(name='first'),), Future()),
+                 (insert_duplicate, (), Future()),
+                 (fail, (), Future()),
+                 (data_manager._apply_add_user, (User(name='second'),), Future())]
+        writer._commit_batch(batch)
+
+        futures = [future for _operation, _args, future in batch]
+        assert futures[0].result()[1] == 200
+        assert futures[1].result()[1] == 409
+        with pytest.raises(RuntimeError):
+            futures[2].result()
+        assert futures[3].result()[1] == 200
+        assert writer.stats()['fallbacks'] == 0
+        names = {name for name, in db.session.query(User.name)}
+    assert names == {'taken', 'first', 'second'}
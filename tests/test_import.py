@@ -0,0 +1,150 @@
+from data_models import User
+import json
+import io
+import itertools
+import pytest
+
+
+USER_NAMES = itertools.count()
+
+
+def upload(client, user_id, content, filename):
+    """Posts a file to the import form of a user."""
+    return client.post(f'/users/{user_id}/import_movies',
+                       data={'file': (io.BytesIO(content.encode('utf-8')), filename)},
+                       content_type='multipart/form-data')
+
+
+def collection_titles(web, user_id):
+    with web.app.app_context():
+        movies, _ = web.data_manager.get_user_movies(user_id, 'title')
+    return [movie.title for movie in movies]
+
+
+@pytest.fixture
+def importer(web):
+    """Creates a user with a unique name and returns the ID."""
+    def create(prefix):
+        with web.app.app_context():
+            added, status = web.data_manager.add_user(User(name=f'{prefix} {next(USER_NAMES)}'))
+        assert status == 200, added
+        return added['user_id']
+    return create
+
+
+def test_bulk_add_movies_links_existing_titles_and_skips_duplicates(data_manager):
+    user_id = data_manager.add_user(User(name='importer'))[0]['user_id']
+    other_id = data_manager.add_user(User(name='other'))[0]['user_id']
+    data_manager.bulk_add_movies(other_id, [{'title': 'Shared', 'director': 'A', 'year': 1999}])
+    movies = [{'title': 'Shared', 'director': 'A', 'year': 1999},
+              {'title': 'New', 'director': 'B', 'year': 2001, 'rating': 7.5},
+              {'title': 'New', 'director': 'B', 'year': 2001}]
+
+    summary, status = data_manager.bulk_add_movies(user_id, movies)
+    assert status == 200 and (summary['added'], summary['skipped']) == (2, 1)
+    summary, status = data_manager.bulk_add_movies(user_id, movies[:2])
+    assert status == 200 and (summary['added'], summary['skipped']) == (0, 2)
+    assert len(data_manager.get_all_movies()[0]) == 2
+
+
+@pytest.mark.parametrize('movie', [{'title': 'No year', 'director': 'A'},
+                                   {'title': '', 'director': 'A', 'year': 2000},
+                                   {'title': 'Int rating', 'director': 'A', 'year': 2000,
+                                    'rating': 7},
+                                   'not a movie'])
+def test_bulk_add_movies_rejects_bad_rows(data_manager, movie):
+    user_id = data_manager.add_user(User(name='importer'))[0]['user_id']
+    valid = {'title': 'Valid', 'director': 'A', 'year': 2000}
+    result, status = data_manager.bulk_add_movies(user_id, [valid, movie])
+    assert status == 400 and 'movie 2' in result['error'].lower()
+    assert data_manager.get_user_movies(user_id)[0] == []
+
+
+def test_bulk_add_movies_of_unknown_user(data_manager):
+    result, status = data_manager.bulk_add_movies(999, [{'title': 'T', 'director': 'D',
+                                                         'year': 2000}])
+    assert status == 404
+    assert data_manager.get_all_movies()[0] == []
+
+
+def test_import_csv(web, client, importer):
+    user_id = importer('csv')
+    content = ('title,director,year,rating\n'
+               'CSV Alpha,Director A,1999,"7,5"\n'
+               'CSV Beta,Director B,2004,N/A\n'
+               'CSV Alpha,Director A,1999,\n')
+    response = upload(client, user_id, content, 'movies.csv')
+    assert '2 movies imported, 1 skipped.' in response.text
+    assert collection_titles(web, user_id) == ['CSV Alpha', 'CSV Beta']
+
+
+def test_import_json(web, client, importer):
+    user_id = importer('json')
+    content = json.dumps({'movies': [{'title': 'JSON Alpha', 'director': 'A', 'year': 2010,
+                                      'rating': 8}]})
+    response = upload(client, user_id, content, 'movies.json')
+    assert '1 movies imported, 0 skipped.' in response.text
+    assert collection_titles(web, user_id) == ['JSON Alpha']
+
+
+@pytest.mark.parametrize('content, filename, message', [
+    ('title,director,year\nBad Year,A,soon\n', 'movies.csv', 'movie 1'),
+    (json.dumps([{'title': 'Bad Rating', 'director': 'A', 'year': 2000, 'rating': [7]}]),
+     'movies.json', 'movie 1'),
+    (json.dumps([{'title': 'Bool Rating', 'director': 'A', 'year': 2000, 'rating': True}]),
+     'movies.json', 'movie 1'),
+    (json.dumps({'title': 'Not a list'}), 'movies.json', 'list of movies'),
+    ('[{"title": ', 'movies.json', 'Expecting value'),
+])
+def test_import_rejects_bad_files(web, client, importer, content, filename, message):
+    user_id = importer('bad')
+    response = upload(client, user_id, content, filename)
+    assert 'Bad Request - 400' in response.text and message in response.text
+    assert collection_titles(web, user_id) == []
+
+
+def test_import_for_unknown_user(client):
+    response = upload(client, 99999, 'title,director,year\nOrphan,A,2000\n', 'movies.csv')
+    assert 'Not Found - 404' in response.text
+
+
+def test_bulk_add_movies_keeps_user_ratings(data_manager):
+    user_id = data_manager.add_user(User(name='rater'))[0]['user_id']
+    other_id = data_manager.add_user(User(name='other rater'))[0]['user_id']
+    movies = [{'title': 'Rated', 'director': 'A', 'year': 2000, 'user_rating': 8.5},
+              {'title': 'Unrated', 'director': 'B', 'year': 2001}]
+    data_manager.bulk_add_movies(user_id, movies)
+    summary, status = data_manager.bulk_add_movies(
+        user_id, [dict(movies[0], user_rating=2.0)])
+    assert status == 200 and summary['skipped'] == 1
+    data_manager.bulk_add_movies(other_id, [dict(movies[0], user_rating=6.5)])
+
+    rated_id = next(movie.id for movie in data_manager.get_user_movies(user_id)[0]
+                    if movie.title == 'Rated')
+    assert data_manager.get_user_rating(user_id, rated_id) == (8.5, 200)
+    rating = data_manager.get_movie_rating(rated_id)[0]
+    assert (rating['count'], rating['mean']) == (2, 7.5)
+    assert rating['histogram'][8] == rating['histogram'][6] == 1
+    assert data_manager.bulk_add_movies(user_id, [dict(movies[1], user_rating=7)])[1] == 400
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson'])
+def test_exports_can_be_imported_again(web, client, importer, export_format):
+    source_id = importer('export')
+    movies = [{'title': f'Round Trip {export_format} {number}', 'director': 'Director, Jr.',
+               'year': 1990 + number, 'rating': 7.1, 'user_rating': float(number)}
+              for number in range(3)]
+    movies[0].update(rating=None, user_rating=None, poster='https://img.example/p.jpg')
+    with web.app.app_context():
+        assert web.data_manager.bulk_add_movies(source_id, movies)[1] == 200
+    export = client.get(f'/users/{source_id}/export?format={export_format}').get_data(as_text=True)
+
+    target_id = importer('import')
+    response = upload(client, target_id, export, f'movies.{export_format}')
+    assert '3 movies imported, 0 skipped.' in response.text
+    with web.app.app_context():
+        imported, _ = web.data_manager.get_user_movies(target_id, 'title')
+    assert [(movie.title, movie.director, movie.year, movie.rating, movie.poster,
+             movie.user_rating) for movie in imported] == [
+        (movie['title'], movie['director'], movie['year'], movie['rating'],
+         movie.get('poster'), movie['user_rating']) for movie in movies]
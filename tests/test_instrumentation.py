@@ -0,0 +1,59 @@
+from flask import Response, stream_with_context
+from instrumentation import init_instrumentation, instrument_fragment_cache
+from render_cache import FragmentCache
+from data_models import db, User
+from sqlalchemy import text
+import pytest
+
+
+def series(histogram):
+    """Returns the observation counts of a histogram by label dict items."""
+    return {key: count for key, (_counts, _total, count) in histogram._series.items()}
+
+
+@pytest.fixture
+def instrumented(make_app):
+    """Returns an app with instrumentation and a streaming route, and its metrics."""
+    def make(**config):
+        app = make_app(**config)
+        with app.app_context():
+            metrics = init_instrumentation(app, db.engine)
+
+        @app.route('/stream')
+        def stream():
+            def rows():
+                for number in range(3):
+                    yield str(db.session.execute(text('SELECT :number'),
+                                                 {'number': number}).scalar())
+            return Response(stream_with_context(rows()))
+        return app, metrics
+    return make
+
+
+def test_streamed_responses_are_recorded_when_closed(instrumented):
+    app, metrics = instrumented()
+    response = app.test_client().get('/stream', buffered=False)
+    assert series(metrics.request_latency) == {}
+    assert response.get_data() == b'012'
+    response.close()
+    labels = (('endpoint', 'stream'), ('method', 'GET'), ('status', 200))
+    assert series(metrics.request_latency) == {labels: 1}
+    statements = metrics.request_statements._series[(('endpoint', 'stream'),)]
+    assert statements[1] == 3
+
+
+def test_statements_of_the_group_commit_writer_are_labeled(instrumented):
+    app, metrics = instrumented(SQLITE_GROUP_COMMIT=True, SQLITE_GROUP_COMMIT_DELAY=0.001)
+    with app.app_context():
+        assert app.data_manager.add_user(User(name='labeled'))[1] == 200
+    sources = {dict(key)['source'] for key in series(metrics.query_latency)}
+    assert 'group-commit' in sources
+
+
+def test_fragment_renders_are_timed(instrumented):
+    _app, metrics = instrumented()
+    cache = FragmentCache(max_size=10)
+    instrument_fragment_cache(metrics, cache)
+    for _ in range(3):
+        cache.get_or_render('key', lambda: '<li>card</li>', 'movie_card.html')
+    assert series(metrics.render_latency) == {(('template', 'movie_card.html'),): 1}
@@ -0,0 +1,62 @@
+from data_models import db, Job, User, Movie
+from jobs import JobWorker
+from sqlalchemy import update
+from datetime import timedelta
+import jobs
+import pytest
+
+
+def expire_lease(job_id):
+    """Moves the lease of a running job into the past, as if its worker crashed."""
+    db.session.execute(update(Job).where(Job.id == job_id)
+                       .values(locked_until=Job.locked_until - timedelta(hours=1)))
+    db.session.commit()
+
+
+def test_finish_job_requires_the_current_lease(data_manager):
+    queued, status = data_manager.enqueue_job('lookup', title='Alien')
+    assert status == 200, queued
+    first, _ = data_manager.claim_job(lease_seconds=60)
+    expire_lease(first.id)
+    second, _ = data_manager.claim_job(lease_seconds=60)
+    assert second.id == first.id and second.locked_until != first.locked_until
+
+    assert data_manager.finish_job(first.id, first.locked_until)[1] == 409
+    assert data_manager.get_job(first.id)[0].status == Job.RUNNING
+    assert data_manager.finish_job(second.id, second.locked_until)[1] == 200
+    assert data_manager.get_job(second.id)[0].status == Job.DONE
+    assert data_manager.finish_job(second.id, second.locked_until)[1] == 409
+
+
+def test_expired_lease_fails_the_job_after_max_attempts(data_manager):
+    data_manager.enqueue_job('lookup', title='Alien')
+    for attempt in range(1, 3):
+        job, _ = data_manager.claim_job(max_attempts=2)
+        assert job.attempts == attempt
+        expire_lease(job.id)
+
+    assert data_manager.claim_job(max_attempts=2) == (None, 200)
+    job, _ = data_manager.get_job(job.id)
+    assert job.status == Job.FAILED and job.attempts == 2
+
+
+@pytest.mark.parametrize('omdb_poster, expected', [
+    ('N/A', None),
+    ('https://img.example/new.jpg', 'https://img.example/new.jpg'),
+])
+def test_enrichment_replaces_or_clears_the_poster(app, data_manager, monkeypatch,
+                                                  omdb_poster, expected):
+    user_id = data_manager.add_user(User(name='collector'))[0]['user_id']
+    movie = Movie(title='Alien', director='Ridley Scott', year=1979, rating=8.5,
+                  poster='https://img.example/dead.jpg')
+    movie_id = data_manager.add_movie(movie, user_id)[0]['movie_id']
+    monkeypatch.setattr(jobs, 'get_cached_movie_data', lambda title: {
+        'Title': title, 'Director': 'Ridley Scott', 'Year': '1979', 'imdbRating': 'N/A',
+        'Poster': omdb_poster})
+    data_manager.enqueue_job('enrich', movie_id=movie_id)
+
+    assert JobWorker(app, data_manager, rate=0).run(until_empty=True) == 1
+    db.session.expire_all()
+    movie, _ = data_manager.get_movie(movie_id)
+    assert (movie.poster, movie.rating) == (expected, 8.5)
+    assert movie.refreshed_at is not None
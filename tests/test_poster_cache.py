@@ -0,0 +1,117 @@
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from poster_cache import PosterCache, PinnedHostAdapter, JPEG_SIGNATURE
+import poster_cache
+import threading
+import socket
+import pytest
+
+POSTER = JPEG_SIGNATURE + b'\xe0poster'
+
+
+class PosterHandler(BaseHTTPRequestHandler):
+    """Serves a JPEG at /poster.jpg and redirects from /redirect/<target>."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers['Host']))
+        if self.path.startswith('/redirect/'):
+            self.send_response(302)
+            self.send_header('Location', self.path[len('/redirect/'):].replace('~', '/'))
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(POSTER)))
+        self.end_headers()
+        self.wfile.write(POSTER)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(('127.0.0.1', 0), PosterHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """
+    Resolves host names from a dict of address lists, a list is consumed
+    one address per lookup. The loopback test server counts as public.
+    """
+    hosts = {}
+    lookups = []
+    system_getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host == '127.0.0.1':  # connections of the download itself
+            return system_getaddrinfo(host, port, *args, **kwargs)
+        lookups.append(host)
+        addresses = hosts.get(host)
+        if addresses is None:
+            raise socket.gaierror(host)
+        address = addresses.pop(0) if len(addresses) > 1 else addresses[0]
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port))]
+
+    is_public_address = poster_cache.is_public_address
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    monkeypatch.setattr(poster_cache, 'is_public_address',
+                        lambda address: address == '127.0.0.1' or is_public_address(address))
+    resolver.hosts, resolver.lookups = hosts, lookups
+    return resolver
+
+
+@pytest.mark.parametrize('url', ['http://127.0.0.1/poster.jpg',
+                                 'http://10.0.0.1/poster.jpg',
+                                 'http://169.254.169.254/latest/meta-data',
+                                 'http://[::1]/poster.jpg',
+                                 'http://[::ffff:127.0.0.1]/poster.jpg',
+                                 'http://0.0.0.0/poster.jpg',
+                                 'ftp://example.com/poster.jpg',
+                                 'N/A'])
+def test_private_targets_are_not_allowed(tmp_path, url):
+    assert not PosterCache(str(tmp_path)).is_allowed(url)
+
+
+def test_allowed_hosts(tmp_path, resolver):
+    resolver.hosts['img.example'] = ['93.184.216.34']
+    resolver.hosts['other.example'] = ['93.184.216.35']
+    cache = PosterCache(str(tmp_path), allowed_hosts=['IMG.example'])
+    assert cache.is_allowed('https://img.example/poster.jpg')
+    assert not cache.is_allowed('https://other.example/poster.jpg')
+
+
+def test_download_connects_to_the_checked_address(tmp_path, server, resolver):
+    # The second lookup would answer with a private address
+    resolver.hosts['poster.example'] = ['127.0.0.1', '10.0.0.1']
+    cache = PosterCache(str(tmp_path))
+    url = f'http://poster.example:{server.server_port}/poster.jpg'
+    path = cache._download(url)
+    assert path is not None and cache.cached_path(url) == path
+    assert resolver.lookups == ['poster.example']
+    assert server.requests == [('/poster.jpg', f'poster.example:{server.server_port}')]
+
+
+def test_redirects_to_private_targets_are_not_followed(tmp_path, server, resolver):
+    resolver.hosts['poster.example'] = ['127.0.0.1']
+    cache = PosterCache(str(tmp_path))
+    base = f'http://poster.example:{server.server_port}'
+    assert cache._download(f'{base}/redirect/http:~~10.1.2.3~poster.jpg') is None
+    assert cache._download(f'{base}/redirect/http:~~unknown.example~poster.jpg') is None
+    assert [path for path, _host in server.requests] == [
+        '/redirect/http:~~10.1.2.3~poster.jpg', '/redirect/http:~~unknown.example~poster.jpg']
+
+    assert cache._download(f'{base}/redirect/~poster.jpg') is not None
+    assert server.requests[-1] == ('/poster.jpg', f'poster.example:{server.server_port}')
+
+
+def test_tls_connections_verify_the_host_name():
+    adapter = PinnedHostAdapter('img.example')
+    assert adapter.poolmanager.connection_pool_kw['server_hostname'] == 'img.example'
+    assert adapter.poolmanager.connection_pool_kw['assert_hostname'] == 'img.example'
@@ -0,0 +1,120 @@
+from data_models import db, User, Movie, UserMovies, MovieRating, MovieRatingBucket
+from test_user_movies import count_statements, add_collection
+import pytest
+
+
+def add_user(data_manager, name):
+    added, status = data_manager.add_user(User(name=name))
+    assert status == 200, added
+    return added['user_id']
+
+
+def add_movie(data_manager, user_id, title):
+    added, status = data_manager.add_movie(Movie(title=title, director='Director',
+                                                 year=2000), user_id)
+    assert status == 200, added
+    return added['movie_id']
+
+
+def rate(data_manager, user_id, movie_id, rating):
+    result, status = data_manager.update_movie(user_id, movie_id, rating)
+    assert status == 200, result
+
+
+def rating_of(data_manager, movie_id):
+    rating, status = data_manager.get_movie_rating(movie_id)
+    assert status == 200, rating
+    return rating['count'], rating['mean'], rating['histogram']
+
+
+def histogram(**counts):
+    """Builds a histogram from bucket counts given as b<bucket>=<count>."""
+    buckets = [0] * MovieRatingBucket.BUCKETS
+    for bucket, count in counts.items():
+        buckets[int(bucket[1:])] = count
+    return buckets
+
+
+@pytest.fixture
+def shared_movie(data_manager):
+    """Adds a movie collected and rated by two users, returns the user and movie IDs."""
+    first = add_user(data_manager, 'first')
+    second = add_user(data_manager, 'second')
+    movie_id = add_movie(data_manager, first, 'Shared')
+    add_movie(data_manager, second, 'Shared')
+    rate(data_manager, first, movie_id, 8.5)
+    rate(data_manager, second, movie_id, 6.0)
+    return first, second, movie_id
+
+
+def test_rating_updates_keep_the_aggregate(data_manager, shared_movie):
+    first, second, movie_id = shared_movie
+    assert rating_of(data_manager, movie_id) == (2, 7.25, histogram(b8=1, b6=1))
+    rate(data_manager, first, movie_id, 9.0)
+    assert rating_of(data_manager, movie_id) == (2, 7.5, histogram(b9=1, b6=1))
+    rate(data_manager, second, movie_id, 9.5)
+    assert rating_of(data_manager, movie_id) == (2, 9.25, histogram(b9=2))
+    assert data_manager.get_user_rating(second, movie_id) == (9.5, 200)
+
+
+def test_rating_has_to_be_a_float(data_manager, shared_movie):
+    first, _, movie_id = shared_movie
+    for rating in (None, 7, '7.0', True):
+        assert data_manager.update_movie(first, movie_id, rating)[1] == 400
+    assert data_manager.get_user_rating(first, movie_id) == (8.5, 200)
+
+
+def test_rating_an_unknown_link(data_manager, shared_movie):
+    first, _, movie_id = shared_movie
+    assert data_manager.update_movie(first, movie_id + 1, 5.0)[1] == 404
+    assert rating_of(data_manager, movie_id)[0] == 2
+
+
+def test_delete_movie_removes_the_rating_and_keeps_shared_movies(data_manager, shared_movie):
+    first, second, movie_id = shared_movie
+    assert data_manager.delete_movie(first, movie_id)[1] == 200
+    assert rating_of(data_manager, movie_id) == (1, 6.0, histogram(b6=1))
+    assert data_manager.delete_movie(first, movie_id)[1] == 404
+
+    assert data_manager.delete_movie(second, movie_id)[1] == 200
+    assert data_manager.get_movie(movie_id)[1] == 404
+    assert db.session.query(MovieRating).count() == 0
+    assert db.session.query(MovieRatingBucket).count() == 0
+
+
+def test_delete_user_removes_ratings_and_orphaned_movies(data_manager, shared_movie):
+    first, second, movie_id = shared_movie
+    own_movie_id = add_movie(data_manager, first, 'Own')
+    rate(data_manager, first, own_movie_id, 3.0)
+
+    assert data_manager.delete_user(first)[1] == 200
+    assert rating_of(data_manager, movie_id) == (1, 6.0, histogram(b6=1))
+    assert data_manager.get_movie(own_movie_id)[1] == 404
+    assert db.session.get(MovieRating, own_movie_id) is None
+    assert db.session.query(UserMovies).filter_by(user_id=first).count() == 0
+    assert data_manager.delete_user(first)[1] == 404
+
+
+def test_delete_user_statement_count_is_constant(data_manager):
+    counts = {}
+    for size in (1, 10, 100):
+        user_id = add_collection(data_manager, size)
+        movie_ids = [link.movie_id for link in
+                     db.session.query(UserMovies.movie_id).filter_by(user_id=user_id)]
+        for movie_id in movie_ids:
+            rate(data_manager, user_id, movie_id, 7.0)
+        db.session.expunge_all()
+        with count_statements() as statements:
+            assert data_manager.delete_user(user_id)[1] == 200
+        counts[size] = len(statements)
+        assert db.session.query(Movie).filter(Movie.id.in_(movie_ids)).count() == 0
+    assert len(set(counts.values())) == 1, counts
+    assert db.session.query(MovieRating).count() == 0
+
+
+def test_delete_orphan_movies(data_manager, shared_movie):
+    db.session.add(Movie(title='Orphan', director='Director', year=2000))
+    db.session.commit()
+    assert data_manager.delete_orphan_movies()[0]['deleted'] == 1
+    assert data_manager.delete_orphan_movies()[0]['deleted'] == 0
+    assert len(data_manager.get_all_movies()[0]) == 1
@@ -0,0 +1,98 @@
+from data_models import db, User, Movie
+import itertools
+import pytest
+
+USER_NAMES = itertools.count()
+
+
+def add_movies(data_manager, *movies):
+    """Adds (title, director) pairs for a new user, returns the user ID."""
+    user_id = data_manager.add_user(User(name=f'searcher {next(USER_NAMES)}'))[0]['user_id']
+    for title, director in movies:
+        result, status = data_manager.add_movie(Movie(title=title, director=director,
+                                                      year=2000), user_id)
+        assert status == 200, result
+    return user_id
+
+
+def titles(data_manager, search, limit=20):
+    movies, status = data_manager.search_movies(search, limit)
+    assert status == 200, movies
+    return [movie.title for movie in movies]
+
+
+@pytest.fixture
+def catalog(data_manager):
+    add_movies(data_manager, ('The Matrix', 'Lana Wachowski'),
+               ('Matrix Reloaded', 'Lana Wachowski'),
+               ('Speed Racer', 'Lana Wachowski'),
+               ('Lost in Translation', 'Sofia Coppola'))
+    return data_manager
+
+
+def test_search_matches_word_prefixes_of_titles_and_directors(catalog):
+    assert titles(catalog, 'matr') == ['Matrix Reloaded', 'The Matrix']
+    assert titles(catalog, 'MATRIX rel') == ['Matrix Reloaded']
+    assert titles(catalog, 'coppola') == ['Lost in Translation']
+    assert titles(catalog, 'atrix') == []
+
+
+def test_search_ranks_title_matches_first(catalog):
+    add_movies(catalog, ('Lana', 'Someone Else'))
+    assert titles(catalog, 'lana')[0] == 'Lana'
+    assert titles(catalog, 'lana', limit=2) == ['Lana', 'Matrix Reloaded']
+
+
+def test_search_ignores_query_syntax(catalog):
+    assert titles(catalog, '"matrix') == ['Matrix Reloaded', 'The Matrix']
+    assert titles(catalog, 'matrix OR speed') == []
+    assert titles(catalog, '  ') == []
+    assert titles(catalog, 'NEAR(matrix') == []
+
+
+@pytest.mark.parametrize('limit', [0, 51, '5', None])
+def test_search_limit_is_validated(catalog, limit):
+    assert catalog.search_movies('matrix', limit)[1] == 400
+
+
+def test_search_follows_title_changes_and_deletes(catalog):
+    movie = db.session.query(Movie).filter_by(title='Speed Racer').one()
+    movie.title = 'Racer X'
+    db.session.commit()
+    assert titles(catalog, 'speed') == []
+    assert titles(catalog, 'racer') == ['Racer X']
+    user_id = db.session.query(User.id).filter(User.name.like('searcher %')).scalar()
+    assert catalog.delete_movie(user_id, movie.id)[1] == 200
+    assert titles(catalog, 'racer') == []
+
+
+def test_search_returns_rating_aggregates(catalog):
+    movie = db.session.query(Movie).filter_by(title='The Matrix').one()
+    user_id = db.session.query(User.id).filter(User.name.like('searcher %')).scalar()
+    catalog.update_movie(user_id, movie.id, 8.0)
+    found = catalog.search_movies('the matrix')[0][0]
+    assert (found.rating_count, found.average_rating) == (1, 8.0)
+
+
+def test_fetch_movie_answers_catalog_titles_without_omdb(web, client, monkeypatch):
+    with web.app.app_context():
+        add_movies(web.data_manager, ('Catalog Only Movie', 'Local Director'))
+
+    def get_movie_data(title):
+        raise AssertionError(f'OMDb was asked for {title!r}')
+    monkeypatch.setattr(web, 'get_movie_data', get_movie_data)
+    response = client.post('/fetch_movie', data={'title': ' catalog  only MOVIE ', 'user_id': 1})
+    assert 'Local Director' in response.text
+
+
+def test_fetch_movie_asks_omdb_for_unknown_titles(web, client, monkeypatch):
+    requested = []
+
+    def get_movie_data(title):
+        requested.append(title)
+        return {'Title': 'Remote Movie', 'Director': 'Remote Director', 'Year': '1999',
+                'imdbRating': '7.1', 'Poster': 'N/A'}
+    monkeypatch.setattr(web, 'get_movie_data', get_movie_data)
+    response = client.post('/fetch_movie', data={'title': 'Remote Movie', 'user_id': 1})
+    assert 'Remote Director' in response.text
+    assert requested == ['Remote Movie']
@@ -0,0 +1,85 @@
+from data_models import (db, User, Movie, MovieSummary, UserSummary, YearSummary,
+                         DirectorSummary, MovieRating, MovieRatingBucket)
+import pytest
+
+SUMMARY_MODELS = (MovieSummary, UserSummary, YearSummary, DirectorSummary,
+                  MovieRating, MovieRatingBucket)
+
+
+def snapshot():
+    """Returns the rows of all summary tables and rating aggregates."""
+    tables = {}
+    for model in SUMMARY_MODELS:
+        columns = [column for column in model.__table__.columns]
+        rows = db.session.execute(db.select(*columns)).all()
+        tables[model.__tablename__] = sorted(tuple(row) for row in rows)
+    return tables
+
+
+def assert_summaries_match_rebuild(data_manager):
+    """Checks that the summaries kept by the triggers equal a rebuild from scratch."""
+    db.session.expire_all()
+    maintained = snapshot()
+    assert data_manager.rebuild_summaries()[1] == 200
+    db.session.expire_all()
+    assert maintained == snapshot()
+
+
+def add_user(data_manager, name):
+    return data_manager.add_user(User(name=name))[0]['user_id']
+
+
+@pytest.fixture
+def collections(data_manager):
+    """Adds three users with overlapping, partly rated collections, returns the user IDs."""
+    users = [add_user(data_manager, name) for name in ('ann', 'bob', 'cat')]
+    for number, user_id in enumerate(users):
+        movies = [{'title': f'Movie {index}', 'director': f'Director {index % 3}',
+                   'year': 2000 + index % 4,
+                   'user_rating': float(index + number) if index % 2 else None}
+                  for index in range(number, number + 6)]
+        assert data_manager.bulk_add_movies(user_id, movies)[1] == 200
+    data_manager.add_movie(Movie(title='Single', director='Director 9', year=1999), users[0])
+    return users
+
+
+def test_summaries_after_inserts(data_manager, collections):
+    assert all(snapshot().values())
+    assert_summaries_match_rebuild(data_manager)
+    assert db.session.get(UserSummary, collections[0]).movie_count == 7
+
+
+def test_summaries_after_rating_changes(data_manager, collections):
+    user_id = collections[1]
+    for movie in data_manager.get_user_movies(user_id)[0]:
+        assert data_manager.update_movie(user_id, movie.id, 9.5)[1] == 200
+    assert_summaries_match_rebuild(data_manager)
+
+
+def test_summaries_after_movie_changes(data_manager, collections):
+    for movie in db.session.query(Movie).filter(Movie.title.in_(['Movie 1', 'Single'])):
+        movie.year = 1980
+        movie.director = 'Director 1'
+    db.session.commit()
+    assert_summaries_match_rebuild(data_manager)
+    assert db.session.get(YearSummary, 1999) is None
+
+
+def test_summaries_after_deletes(data_manager, collections):
+    first, second, _ = collections
+    shared = db.session.query(Movie).filter_by(title='Movie 2').one()
+    assert data_manager.delete_movie(first, shared.id)[1] == 200
+    assert data_manager.delete_user(second)[1] == 200
+    single = db.session.query(Movie).filter_by(title='Single').one()
+    assert data_manager.delete_movie(first, single.id)[1] == 200
+    assert_summaries_match_rebuild(data_manager)
+    assert db.session.get(UserSummary, second) is None
+    assert db.session.get(DirectorSummary, 'Director 9') is None
+
+
+def test_summaries_after_orphan_cleanup(data_manager, collections):
+    db.session.add(Movie(title='Orphan', director='Director 7', year=1970))
+    db.session.commit()
+    assert db.session.get(DirectorSummary, 'Director 7').movie_count == 1
+    assert data_manager.delete_orphan_movies()[0]['deleted'] == 1
+    assert_summaries_match_rebuild(data_manager)
@@ -0,0 +1,130 @@
+from datamanager.sqlite_data_manager import encode_cursor
+from data_models import db, User, Movie
+from sqlalchemy import event
+from contextlib import contextmanager
+import pytest
+
+COLLECTION_SIZES = (1, 10, 100)
+
+
+@contextmanager
+def count_statements():
+    """Collects the statements sent to the database inside the block with their parameters."""
+    statements = []
+
+    def before_cursor_execute(_connection, _cursor, statement, parameters, *_args):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def add_collection(data_manager, size):
+    """Adds a user with size movies and returns the user ID."""
+    added, status = data_manager.add_user(User(name=f'collector {size}'))
+    assert status == 200, added
+    movies = [{'title': f'Movie {size}-{number}', 'director': 'Director', 'year': 2000}
+              for number in range(size)]
+    imported, status = data_manager.bulk_add_movies(added['user_id'], movies)
+    assert status == 200 and imported['added'] == size, imported
+    return added['user_id']
+
+
+@pytest.mark.parametrize('order_by', ['added', 'title', 'year'])
+def test_get_user_movies_statement_count_is_constant(data_manager, order_by):
+    counts = {}
+    for size in COLLECTION_SIZES:
+        user_id = add_collection(data_manager, size)
+        db.session.expunge_all()
+        with count_statements() as statements:
+            movies, status = data_manager.get_user_movies(user_id, order_by)
+        assert status == 200 and len(movies) == size
+        counts[size] = len(statements)
+    assert set(counts.values()) == {1}, counts
+
+
+def test_get_user_movies_page_statement_count_is_constant(data_manager):
+    counts = {}
+    for size in COLLECTION_SIZES:
+        user_id = add_collection(data_manager, size)
+        db.session.expunge_all()
+        with count_statements() as statements:
+            page, status = data_manager.get_user_movies_page(user_id, limit=100)
+        assert status == 200 and len(page['movies']) == size
+        counts[size] = len(statements)
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_get_user_movies_of_missing_user(data_manager):
+    assert data_manager.get_user_movies(12345)[1] == 404
+
+
+def test_get_user_movies_page_sorted_by_added(data_manager):
+    user_id = add_collection(data_manager, 10)
+    expected = [movie.id for movie in data_manager.get_user_movies(user_id, 'added')[0]]
+    page, status = data_manager.get_user_movies_page(user_id, 'added', limit=3)
+    seen = []
+    while status == 200:
+        seen.extend(movie.id for movie in page['movies'])
+        if not page['next']:
+            break
+        page, status = data_manager.get_user_movies_page(user_id, 'added', after=page['next'],
+                                                         limit=3)
+    assert status == 200 and seen == expected
+
+
+@pytest.mark.parametrize('values', [[{'title': 'x'}, 1], [['x'], 1], ['x', True], ['x']])
+def test_get_user_movies_page_rejects_malformed_cursors(data_manager, values):
+    user_id = add_collection(data_manager, 1)
+    page, status = data_manager.get_user_movies_page(user_id, after=encode_cursor(values))
+    assert status == 400, page
+
+
+def page_query_plans(call):
+    """Runs call and returns the query plans of its LIMIT statements as strings."""
+    with count_statements() as statements:
+        call()
+    plans = []
+    connection = db.session.connection().connection.dbapi_connection
+    for statement, values in statements:
+        if 'LIMIT' in statement:
+            rows = connection.execute('EXPLAIN QUERY PLAN ' + statement, values).fetchall()
+            plans.append(' / '.join(row[3] for row in rows))
+    return plans
+
+
+@pytest.mark.parametrize('order_by', ['added', 'title', 'year'])
+def test_user_movies_pages_seek_in_an_index(data_manager, order_by):
+    user_id = add_collection(data_manager, 30)
+    first, _ = data_manager.get_user_movies_page(user_id, order_by, limit=10)
+    calls = [lambda: data_manager.get_user_movies_page(user_id, order_by, limit=10),
+             lambda: data_manager.get_user_movies_page(user_id, order_by, after=first['next']),
+             lambda: data_manager.get_user_movies_page(user_id, order_by, before=first['next'])]
+    for call in calls:
+        plans = page_query_plans(call)
+        assert plans and all('USING INDEX ix_user_movies_user_' in plan for plan in plans), plans
+        assert not any('TEMP B-TREE' in plan for plan in plans), plans
+
+
+@pytest.mark.parametrize('order_by', ['title', 'year'])
+def test_catalog_pages_seek_in_an_index(data_manager, order_by):
+    add_collection(data_manager, 30)
+    first, _ = data_manager.get_all_movies_page(order_by, limit=10)
+    for call in (lambda: data_manager.get_all_movies_page(order_by, limit=10),
+                 lambda: data_manager.get_all_movies_page(order_by, after=first['next'])):
+        plans = page_query_plans(call)
+        assert plans and not any('TEMP B-TREE' in plan for plan in plans), plans
+
+
+def test_links_follow_title_and_year_changes(data_manager):
+    user_id = add_collection(data_manager, 3)
+    movie = db.session.query(Movie).filter_by(title='Movie 3-1').one()
+    movie.title, movie.year = 'AAA Renamed', 1950
+    db.session.commit()
+    page, _ = data_manager.get_user_movies_page(user_id, 'title')
+    assert [row.title for row in page['movies']][0] == 'AAA Renamed'
+    page, _ = data_manager.get_user_movies_page(user_id, 'year')
+    assert page['movies'][0].year == 1950